@@ -0,0 +1,46 @@
+"""
+Сравнение двух прогонов нагрузочного теста.
+
+    python backend/benchmarks/compare.py results/old.json results/new.json
+
+Для каждого шага выводит p50/p95/p99, RPS и число запросов к БД
+в обоих прогонах и изменение в процентах.
+"""
+import argparse
+import json
+
+METRICS = ('p50_ms', 'p95_ms', 'p99_ms', 'rps', 'queries_mean')
+
+
+def change(old, new):
+    if old in (None, 0) or new is None:
+        return '    -'
+    return f'{(new - old) / old * 100:+6.1f}%'
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('baseline')
+    parser.add_argument('candidate')
+    args = parser.parse_args()
+    with open(args.baseline, encoding='utf-8') as file:
+        baseline = json.load(file)['results']
+    with open(args.candidate, encoding='utf-8') as file:
+        candidate = json.load(file)['results']
+    print(f'{"шаг":32} ' + ' '.join(f'{metric:>22}' for metric in METRICS))
+    for label in sorted(set(baseline) | set(candidate)):
+        old = baseline.get(label, {})
+        new = candidate.get(label, {})
+        cells = []
+        for metric in METRICS:
+            before, after = old.get(metric), new.get(metric)
+            cells.append(
+                f'{"-" if before is None else f"{before:.1f}":>7}'
+                f'→{"-" if after is None else f"{after:.1f}":>7}'
+                f' {change(before, after)}'
+            )
+        print(f'{label:32} ' + ' '.join(cells))
+
+
+if __name__ == '__main__':
+    main()
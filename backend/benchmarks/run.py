@@ -0,0 +1,263 @@
+"""
+Нагрузочный тест API Foodgram.
+
+Запуск против работающего сервера (например, gunicorn с
+QUERY_COUNT_HEADER=True, чтобы получать число SQL-запросов):
+
+    python backend/benchmarks/run.py --data benchmark_data.json \\
+        --base-url http://127.0.0.1:8000 --concurrency 8 --requests 200
+
+Результат - JSON в backend/benchmarks/results/ с задержками p50/p95/p99,
+числом запросов к БД и RPS по каждому шагу сценариев.
+"""
+import argparse
+import json
+import platform
+import random
+import socket
+import subprocess
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from pathlib import Path
+from urllib.parse import urlsplit
+
+import requests
+
+from scenarios import SCENARIOS
+
+RESULTS_DIR = Path(__file__).resolve().parent / 'results'
+
+_local = threading.local()
+
+
+def percentile(values, share):
+    """Перцентиль по методу ближайшего ранга."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(0, min(len(ordered) - 1, round(share * len(ordered)) - 1))
+    return ordered[rank]
+
+
+def session():
+    if not hasattr(_local, 'session'):
+        _local.session = requests.Session()
+    return _local.session
+
+
+def execute(base_url, step):
+    headers = {}
+    if step.user:
+        headers['Authorization'] = f'Token {step.user["token"]}'
+    start = time.perf_counter()
+    try:
+        response = session().request(
+            step.method,
+            base_url + step.path,
+            json=step.json,
+            headers=headers,
+            allow_redirects=False,
+            timeout=30
+        )
+    except requests.RequestException as error:
+        # Таймауты и обрывы соединения - ошибки шага, а не всего прогона.
+        return None, {
+            'label': step.label,
+            'ms': (time.perf_counter() - start) * 1000,
+            'ok': False,
+            'status': type(error).__name__,
+            'queries': None,
+        }
+    elapsed = (time.perf_counter() - start) * 1000
+    queries = response.headers.get('X-Query-Count')
+    return response, {
+        'label': step.label,
+        'ms': elapsed,
+        'ok': response.status_code in step.expect,
+        'status': response.status_code,
+        'queries': int(queries) if queries is not None else None,
+    }
+
+
+def slow_client(base_url, stop):
+    """
+    Медленный клиент: заголовки запроса передаются по байту в секунду.
+
+    Пока заголовки не дочитаны, синхронный воркер занят этим клиентом,
+    так же как долгим опросом или медленной мобильной сетью.
+    """
+    url = urlsplit(base_url)
+    request = (
+        f'GET /api/ingredients/ HTTP/1.1\r\nHost: {url.hostname}\r\n'
+        'User-Agent: slow-client\r\n\r\n'
+    ).encode()
+    while not stop.is_set():
+        try:
+            with socket.create_connection(
+                (url.hostname, url.port or 80), timeout=60
+            ) as sock:
+                for position in range(len(request)):
+                    if stop.wait(1):
+                        return
+                    sock.sendall(request[position:position + 1])
+                sock.recv(65536)
+        except OSError:
+            stop.wait(1)
+
+
+def run_iteration(base_url, scenario, data, seed):
+    rng = random.Random(seed)
+    steps = scenario.build(data, rng)
+    samples = []
+    while steps:
+        step = steps.pop(0)
+        response, sample = execute(base_url, step)
+        samples.append(sample)
+        if step.then and sample['ok']:
+            steps = step.then(response) + steps
+    return samples
+
+
+def summarize(samples, wall_time):
+    latencies = [sample['ms'] for sample in samples]
+    queries = [
+        sample['queries'] for sample in samples
+        if sample['queries'] is not None
+    ]
+    errors = {}
+    for sample in samples:
+        if not sample['ok']:
+            status = str(sample['status'])
+            errors[status] = errors.get(status, 0) + 1
+    return {
+        'count': len(samples),
+        'errors': errors,
+        'p50_ms': percentile(latencies, 0.50),
+        'p95_ms': percentile(latencies, 0.95),
+        'p99_ms': percentile(latencies, 0.99),
+        'mean_ms': sum(latencies) / len(latencies),
+        'max_ms': max(latencies),
+        'rps': len(samples) / wall_time if wall_time else None,
+        'queries_mean': sum(queries) / len(queries) if queries else None,
+        'queries_max': max(queries) if queries else None,
+    }
+
+
+def run_scenario(base_url, scenario, data, args):
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        list(pool.map(
+            lambda seed: run_iteration(base_url, scenario, data, seed),
+            range(args.warmup)
+        ))
+        start = time.perf_counter()
+        iterations = list(pool.map(
+            lambda seed: run_iteration(base_url, scenario, data, seed),
+            range(args.seed, args.seed + args.requests)
+        ))
+        wall_time = time.perf_counter() - start
+    by_label = {}
+    for samples in iterations:
+        for sample in samples:
+            by_label.setdefault(sample['label'], []).append(sample)
+    # RPS шага считается по общему времени сценария.
+    return {
+        label: summarize(samples, wall_time)
+        for label, samples in by_label.items()
+    }
+
+
+def format_stats(label, stats):
+    queries = stats['queries_mean']
+    line = (
+        f'{label:32} p50 {stats["p50_ms"]:8.2f} '
+        f'p95 {stats["p95_ms"]:8.2f} p99 {stats["p99_ms"]:8.2f} мс '
+        f'{stats["rps"]:8.1f} rps запросов к БД '
+        + ('-' if queries is None else f'{queries:.1f}')
+    )
+    if stats['errors']:
+        line += f' ошибки {stats["errors"]}'
+    return line
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', 'HEAD'], text=True,
+            cwd=Path(__file__).resolve().parent
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--base-url', default='http://127.0.0.1:8000')
+    parser.add_argument('--data', default='benchmark_data.json')
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--requests', type=int, default=200,
+                        help='Итераций на сценарий.')
+    parser.add_argument('--warmup', type=int, default=20)
+    parser.add_argument('--seed', type=int, default=1000)
+    parser.add_argument('--tags', nargs='*', default=['read', 'write'])
+    parser.add_argument('--only', nargs='*',
+                        help='Имена сценариев, по умолчанию все.')
+    parser.add_argument('--slow-clients', type=int, default=0,
+                        help='Медленных клиентов в фоне на время прогона.')
+    parser.add_argument('--label', default='',
+                        help='Метка прогона, попадает в имя файла.')
+    parser.add_argument('--output', help='Путь к файлу результата.')
+    args = parser.parse_args()
+
+    with open(args.data, encoding='utf-8') as file:
+        data = json.load(file)
+    stop = threading.Event()
+    for _ in range(args.slow_clients):
+        threading.Thread(
+            target=slow_client, args=(args.base_url, stop), daemon=True
+        ).start()
+    if args.slow_clients:
+        time.sleep(2)
+    results = {}
+    try:
+        for scenario in SCENARIOS:
+            if args.only and scenario.name not in args.only:
+                continue
+            if not set(scenario.tags) & set(args.tags):
+                continue
+            steps = run_scenario(args.base_url, scenario, data, args)
+            results.update(steps)
+            for label, stats in steps.items():
+                print(format_stats(label, stats))
+    finally:
+        stop.set()
+    started = datetime.now(timezone.utc)
+    report = {
+        'meta': {
+            'timestamp': started.isoformat(),
+            'label': args.label,
+            'git_commit': git_commit(),
+            'base_url': args.base_url,
+            'concurrency': args.concurrency,
+            'slow_clients': args.slow_clients,
+            'requests': args.requests,
+            'warmup': args.warmup,
+            'seed': args.seed,
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+        },
+        'results': results,
+    }
+    output = Path(args.output) if args.output else RESULTS_DIR / (
+        started.strftime('%Y%m%d-%H%M%S')
+        + (f'-{args.label}' if args.label else '') + '.json'
+    )
+    output.parent.mkdir(parents=True, exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as file:
+        json.dump(report, file, ensure_ascii=False, indent=2)
+    print(f'Результат: {output}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,208 @@
+"""
+Сценарии нагрузочного теста по маршрутам api/urls.py.
+
+Каждый сценарий по данным генератора (generate_benchmark_data) и
+генератору случайных чисел строит список шагов - запросов, которые
+выполняются по очереди и замеряются по отдельности. Изменяющие
+сценарии возвращают данные в исходное состояние (добавить - удалить).
+"""
+from dataclasses import dataclass, field
+from typing import Callable, List, Optional
+
+PNG_1X1 = (
+    'iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAYAAAAfFcSJAAAADUlEQVR42mNk+M9QDwADhgGAW'
+    'jR9awAAAABJRU5ErkJggg=='
+)
+IMAGE = 'data:image/png;base64,' + PNG_1X1
+BASE62 = (
+    '0123456789abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ'
+)
+
+
+@dataclass
+class Step:
+    label: str
+    method: str
+    path: str
+    user: Optional[dict] = None
+    json: Optional[dict] = None
+    expect: tuple = (200,)
+    # Путь следующего шага может зависеть от ответа этого (id рецепта).
+    then: Optional[Callable] = None
+
+
+@dataclass
+class Scenario:
+    name: str
+    build: Callable
+    tags: List[str] = field(default_factory=list)
+
+
+def _user(data, rng):
+    return rng.choice(data['users'])
+
+
+def _recipe(data, rng):
+    # Первые рецепты в списке генератора - самые популярные.
+    recipes = data['recipes']
+    return recipes[min(int(rng.expovariate(1 / 50)), len(recipes) - 1)]
+
+
+def _base62(number):
+    code = ''
+    while True:
+        number, digit = divmod(number, 62)
+        code = BASE62[digit] + code
+        if not number:
+            return code
+
+
+def _recipe_payload(data, rng):
+    return {
+        'name': 'Нагрузочный рецепт',
+        'text': 'Создан сценарием нагрузочного теста.',
+        'cooking_time': rng.randint(5, 60),
+        'ingredients': [
+            {'id': ingredient, 'amount': rng.randint(1, 300)}
+            for ingredient in rng.sample(data['ingredients'], 5)
+        ],
+    }
+
+
+def recipe_lifecycle(data, rng):
+    user = _user(data, rng)
+    payload = _recipe_payload(data, rng)
+
+    def update(response):
+        recipe_id = response.json()['id']
+        changed = dict(payload, cooking_time=payload['cooking_time'] + 1)
+        return [
+            Step(
+                'recipe: update', 'PATCH', f'/api/recipes/{recipe_id}/',
+                user, changed
+            ),
+            Step(
+                'recipe: delete', 'DELETE', f'/api/recipes/{recipe_id}/',
+                user, expect=(204,)
+            ),
+        ]
+
+    return [Step(
+        'recipe: create', 'POST', '/api/recipes/', user,
+        dict(payload, image=IMAGE), expect=(201,), then=update
+    )]
+
+
+def toggle(name, path):
+    def build(data, rng):
+        user = _user(data, rng)
+        recipe = _recipe(data, rng)
+        url = f'/api/recipes/{recipe}/{path}/'
+        # Отказ 400 возможен, если генератор уже добавил этот рецепт.
+        return [
+            Step(f'{name}: add', 'POST', url, user, expect=(201, 400)),
+            Step(f'{name}: remove', 'DELETE', url, user, expect=(204, 400)),
+        ]
+    return build
+
+
+def subscribe(data, rng):
+    user = _user(data, rng)
+    author = rng.choice(data['authors'])
+    url = f'/api/users/{author}/subscribe/'
+    return [
+        Step('subscribe: add', 'POST', url, user, expect=(201, 400)),
+        Step('subscribe: remove', 'DELETE', url, user, expect=(204, 400)),
+    ]
+
+
+def single(label, path, auth=False, expect=(200,)):
+    def build(data, rng):
+        return [Step(
+            label, 'GET', path.format(
+                recipe=_recipe(data, rng),
+                recipe_hex=f'{_recipe(data, rng):x}',
+                recipe_code=_base62(_recipe(data, rng)),
+                junk_code=''.join(rng.choices(BASE62, k=rng.randint(3, 8))),
+                author=rng.choice(data['authors']),
+                ingredient=rng.choice(data['ingredients']),
+                page=rng.randint(1, 50),
+            ),
+            _user(data, rng) if auth else None,
+            expect=expect
+        )]
+    return build
+
+
+def login(data, rng):
+    user = _user(data, rng)
+    return [Step(
+        'auth: token login', 'POST', '/api/auth/token/login/',
+        json={'email': user['email'], 'password': data['password']}
+    )]
+
+
+SCENARIOS = [
+    Scenario('ingredients: list', single(
+        'ingredients: list', '/api/ingredients/'), ['read']),
+    Scenario('ingredients: autocomplete', single(
+        'ingredients: autocomplete', '/api/ingredients/?name=мол'), ['read']),
+    Scenario('ingredients: detail', single(
+        'ingredients: detail', '/api/ingredients/{ingredient}/'), ['read']),
+    Scenario('recipes: list', single(
+        'recipes: list', '/api/recipes/'), ['read']),
+    Scenario('recipes: list (auth)', single(
+        'recipes: list (auth)', '/api/recipes/', auth=True), ['read']),
+    Scenario('recipes: deep page', single(
+        'recipes: deep page', '/api/recipes/?page={page}'), ['read']),
+    Scenario('recipes: cursor', single(
+        'recipes: cursor', '/api/recipes/?cursor='), ['read']),
+    Scenario('recipes: by author', single(
+        'recipes: by author', '/api/recipes/?author={author}'), ['read']),
+    Scenario('recipes: favorited', single(
+        'recipes: favorited', '/api/recipes/?is_favorited=1',
+        auth=True), ['read']),
+    Scenario('recipes: in cart', single(
+        'recipes: in cart', '/api/recipes/?is_in_shopping_cart=1',
+        auth=True), ['read']),
+    Scenario('recipes: popular', single(
+        'recipes: popular', '/api/recipes/?ordering=popular'), ['read']),
+    Scenario('recipes: trending', single(
+        'recipes: trending', '/api/recipes/?ordering=trending'), ['read']),
+    Scenario('recipes: search', single(
+        'recipes: search', '/api/recipes/?search=суп'), ['read']),
+    Scenario('recipes: have ingredients', single(
+        'recipes: have ingredients',
+        '/api/recipes/?have_ingredients={ingredient}&max_missing=5'),
+        ['read']),
+    Scenario('recipes: detail', single(
+        'recipes: detail', '/api/recipes/{recipe}/'), ['read']),
+    Scenario('recipes: get-link', single(
+        'recipes: get-link', '/api/recipes/{recipe}/get-link/'), ['read']),
+    Scenario('recipes: short link', single(
+        'recipes: short link', '/r/{recipe_code}', expect=(302,)), ['read']),
+    Scenario('recipes: short link (hex)', single(
+        'recipes: short link (hex)', '/s/{recipe_hex}', expect=(302,)),
+        ['read']),
+    Scenario('recipes: short link (junk)', single(
+        'recipes: short link (junk)', '/r/{junk_code}', expect=(302,)),
+        ['read']),
+    Scenario('recipes: download cart', single(
+        'recipes: download cart', '/api/recipes/download_shopping_cart/',
+        auth=True), ['read']),
+    Scenario('users: list', single(
+        'users: list', '/api/users/'), ['read']),
+    Scenario('users: detail', single(
+        'users: detail', '/api/users/{author}/'), ['read']),
+    Scenario('users: me', single(
+        'users: me', '/api/users/me/', auth=True), ['read']),
+    Scenario('users: subscriptions', single(
+        'users: subscriptions', '/api/users/subscriptions/?recipes_limit=3',
+        auth=True), ['read']),
+    Scenario('favorite', toggle('favorite', 'favorite'), ['write']),
+    Scenario('shopping_cart', toggle('shopping_cart', 'shopping_cart'),
+             ['write']),
+    Scenario('subscribe', subscribe, ['write']),
+    Scenario('recipe lifecycle', recipe_lifecycle, ['write']),
+    Scenario('auth: token login', login, ['write']),
+]
@@ -0,0 +1,95 @@
+import asyncio
+import contextvars
+import functools
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections, connection
+from django.urls import URLPattern
+
+# Методы, которые выполняются в пуле потоков: только чтение.
+READ_METHODS = ('GET', 'HEAD')
+
+_executor = None
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=settings.ASYNC_VIEW_THREADS,
+            thread_name_prefix='async-views'
+        )
+    return _executor
+
+
+def _render(response, metrics):
+    if callable(getattr(response, 'render', None)) and not (
+        response.is_rendered
+    ):
+        if metrics is not None:
+            metrics.render_started = time.perf_counter()
+        response.render()
+    return response
+
+
+def _run(view, request, args, kwargs):
+    """
+    Вызов представления в потоке пула как отдельного запроса.
+
+    Соединения потока проверяются и закрываются так же, как сигналами
+    начала и конца запроса. Ответ рендерится здесь же, иначе Django
+    отдал бы рендеринг единственному потоку синхронного кода.
+    """
+    close_old_connections()
+    metrics = getattr(request, 'metrics', None)
+    try:
+        if metrics is None:
+            return _render(view(request, *args, **kwargs), None)
+        metrics.db_tracked = True
+        with connection.execute_wrapper(metrics):
+            return _render(view(request, *args, **kwargs), metrics)
+    finally:
+        close_old_connections()
+
+
+def async_view(view, methods=READ_METHODS):
+    """
+    Асинхронная обёртка синхронного представления для режима ASGI.
+
+    В Django 3.2 под ASGI все синхронные представления процесса
+    выполняются по очереди в одном потоке. Запросы методов methods
+    выполняются в ограниченном пуле из ASYNC_VIEW_THREADS потоков,
+    а медленные клиенты и ожидание ответа не занимают потоки вовсе.
+    Остальные методы выполняются так же, как необёрнутое синхронное
+    представление: в общем потоке синхронного кода.
+    """
+    sync_view = sync_to_async(view, thread_sensitive=True)
+
+    async def wrapper(request, *args, **kwargs):
+        if request.method not in methods:
+            return await sync_view(request, *args, **kwargs)
+        loop = asyncio.get_running_loop()
+        context = contextvars.copy_context()
+        return await loop.run_in_executor(
+            _get_executor(),
+            functools.partial(context.run, _run, view, request, args, kwargs)
+        )
+    return functools.wraps(view)(wrapper)
+
+
+def async_urlpatterns(urlpatterns, names):
+    """
+    Маршруты с указанными именами с асинхронными представлениями.
+
+    В пуле выполняются только запросы на чтение, изменения идут
+    обычным синхронным путём.
+    """
+    return [
+        URLPattern(
+            url.pattern, async_view(url.callback), url.default_args, url.name
+        ) if url.name in names else url
+        for url in urlpatterns
+    ]
@@ -0,0 +1,146 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.utils import timezone
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+from rest_framework.exceptions import AuthenticationFailed
+
+from core.models import User
+
+# Пароль и денормализованные счётчики в снимок не входят: они
+# загружаются из БД при первом обращении, как отложенные поля.
+SNAPSHOT_FIELDS = [
+    field.attname for field in User._meta.concrete_fields
+    if field.editable and field.name != 'password'
+]
+TOKEN_FIELDS = ['key', 'user_id', 'created']
+
+
+def _key(token_key):
+    digest = hashlib.sha256(token_key.encode()).hexdigest()
+    return f'auth-token:{digest}'
+
+
+class LocalTokenCache:
+    """
+    Токены в памяти процесса: LRU ограниченного размера с временем жизни.
+
+    Запись живёт AUTH_TOKEN_LOCAL_TIMEOUT секунд, поэтому выход, смена
+    пароля и блокировка в другом процессе доходят до этого процесса не
+    позже, чем через это время.
+    """
+
+    def __init__(self, size, timeout):
+        self.size = size
+        self.timeout = timeout
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            item = self.entries.get(key)
+            if item is None:
+                return None
+            expires, entry = item
+            if expires < time.monotonic():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return entry
+
+    def set(self, key, entry):
+        if not self.size or self.timeout <= 0:
+            return
+        with self.lock:
+            self.entries[key] = (time.monotonic() + self.timeout, entry)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.size:
+                self.entries.popitem(last=False)
+
+    def delete(self, key):
+        with self.lock:
+            self.entries.pop(key, None)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+local_tokens = LocalTokenCache(
+    settings.AUTH_TOKEN_LOCAL_SIZE, settings.AUTH_TOKEN_LOCAL_TIMEOUT
+)
+
+
+def expired_before():
+    """Токены, выданные раньше этого момента, просрочены."""
+    return timezone.now() - timedelta(
+        seconds=settings.AUTH_TOKEN_EXPIRES_AFTER
+    )
+
+
+def invalidate_tokens(token_keys):
+    """Сброс кэша токенов после фиксации транзакции."""
+    token_keys = list(token_keys)
+
+    def invalidate():
+        cache.delete_many([_key(token_key) for token_key in token_keys])
+        for token_key in token_keys:
+            local_tokens.delete(token_key)
+
+    transaction.on_commit(invalidate)
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """
+    Авторизация по токену без запроса к БД на каждый запрос.
+
+    Токен и снимок пользователя хранятся в общем кэше и в памяти
+    процесса (LocalTokenCache). БД читается только при промахе обоих
+    кэшей. Сигналы сбрасывают записи при удалении токена и изменении
+    пользователя. Токены старше AUTH_TOKEN_EXPIRES_AFTER секунд
+    удаляются и не принимаются.
+    """
+
+    def authenticate_credentials(self, key):
+        entry = local_tokens.get(key)
+        if entry is None:
+            entry = cache.get(_key(key))
+            if entry is None:
+                entry = self.load_entry(key)
+            local_tokens.set(key, entry)
+        created, user_values = entry
+        if created < expired_before():
+            Token.objects.filter(key=key).delete()
+            raise AuthenticationFailed('Срок действия токена истёк.')
+        user = User.from_db(
+            DEFAULT_DB_ALIAS, list(user_values), list(user_values.values())
+        )
+        if not user.is_active:
+            raise AuthenticationFailed('Пользователь неактивен или удалён.')
+        token = Token.from_db(
+            DEFAULT_DB_ALIAS, TOKEN_FIELDS, [key, user.pk, created]
+        )
+        return user, token
+
+    def load_entry(self, key):
+        row = next(iter(
+            Token.objects.filter(key=key).values_list(
+                'created', *(f'user__{name}' for name in SNAPSHOT_FIELDS)
+            )
+        ), None)
+        if row is None:
+            raise AuthenticationFailed('Недействительный токен.')
+        created, *user_values = row
+        entry = (created, dict(zip(SNAPSHOT_FIELDS, user_values)))
+        remaining = (created - expired_before()).total_seconds()
+        timeout = min(settings.CACHE_TIMEOUT, int(remaining))
+        if timeout > 0:
+            cache.set(_key(key), entry, timeout)
+        return entry
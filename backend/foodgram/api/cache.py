@@ -0,0 +1,185 @@
+import copy
+import hashlib
+import time
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.utils.cache import (
+    get_conditional_response,
+    patch_cache_control,
+    patch_vary_headers
+)
+from django.utils.http import http_date, quote_etag
+from rest_framework.response import Response
+
+from core import versions
+from core.personal import EMPTY, get_personal_ids
+
+
+class CachedResponseMixin:
+    """
+    Кэширование ответов на чтение.
+
+    Ключ строится из хоста, пути, всех параметров запроса (включая
+    пагинацию) и версий данных из cache_namespaces. Сигналы увеличивают
+    версии при изменении данных, поэтому старые ответы просто перестают
+    читаться.
+
+    В кэше хранится ответ без персональных полей. Если у вьюсета есть
+    такие поля, они выставляются методом personalize() из множеств id
+    текущего пользователя, поэтому авторизованные пользователи
+    пользуются тем же кэшем, что и анонимные.
+
+    Ответы получают ETag, вычисляемый без построения ответа. Если он
+    совпадает с If-None-Match, возвращается 304 без обращения к кэшу
+    ответов и сериализатора.
+    """
+
+    cache_actions = ('list', 'retrieve')
+    cache_namespaces = ()
+    personalized = False
+    # Время жизни публичного ответа в браузере и nginx, 0 - проверять
+    # ETag при каждом запросе.
+    cache_max_age = 0
+    # Ответ из кэша может отставать от данных до CACHE_TIMEOUT секунд,
+    # поэтому ETag меняется и по истечении этого интервала.
+    etag_interval = settings.CACHE_TIMEOUT
+
+    def is_response_cacheable(self, request):
+        return request.method == 'GET' and self.action in self.cache_actions
+
+    def get_response_cache_key(self, request):
+        data_versions = ':'.join(
+            str(versions.get_version(namespace))
+            for namespace in self.cache_namespaces
+        )
+        query = urlencode(sorted(request.query_params.lists()), doseq=True)
+        url = f'{request.get_host()}{request.path}?{query}'
+        digest = hashlib.md5(url.encode()).hexdigest()
+        return f'response:{self.basename}:{data_versions}:{digest}'
+
+    def get_personal_etag(self, personal):
+        """Часть ETag, зависящая от множеств id пользователя."""
+        if personal is EMPTY:
+            return ''
+        return ';'.join(
+            ','.join(map(str, sorted(ids))) for ids in personal
+        )
+
+    def make_etag(self, *parts):
+        """ETag из частей и номера интервала etag_interval."""
+        if self.etag_interval:
+            parts += (int(time.time() // self.etag_interval),)
+        digest = hashlib.md5('|'.join(map(str, parts)).encode()).hexdigest()
+        return quote_etag(digest)
+
+    def get_validators(self, request, personal):
+        """
+        ETag и время последнего изменения ответа (или None).
+
+        По умолчанию ETag строится из ключа кэша ответов и персональных
+        множеств id.
+        """
+        return self.make_etag(
+            self.get_response_cache_key(request),
+            self.get_personal_etag(personal)
+        ), None
+
+    def set_cache_headers(self, response, etag, last_modified):
+        """
+        ETag, Last-Modified и Cache-Control ответа.
+
+        Персональные ответы авторизованным пользователям не сохраняются
+        общими кэшами и всегда перепроверяются.
+        """
+        response['ETag'] = etag
+        if last_modified is not None:
+            response['Last-Modified'] = http_date(last_modified.timestamp())
+        if self.personalized:
+            patch_vary_headers(response, ['Authorization'])
+        if self.personalized and self.request.user.is_authenticated:
+            patch_cache_control(response, private=True, no_cache=True)
+        elif self.cache_max_age:
+            patch_cache_control(
+                response, public=True, max_age=self.cache_max_age
+            )
+        else:
+            patch_cache_control(response, public=True, no_cache=True)
+        return response
+
+    def conditional_response(self, handler, request, *args, **kwargs):
+        """
+        Ответ handler или 304, если у клиента актуальная версия.
+
+        handler вызывается с аргументами запроса и множествами id
+        пользователя.
+        """
+        personal = (
+            get_personal_ids(request.user) if self.personalized else EMPTY
+        )
+        if request.method not in ('GET', 'HEAD'):
+            return handler(request, *args, personal=personal, **kwargs)
+        etag, last_modified = self.get_validators(request, personal)
+        if etag is None:
+            return handler(request, *args, personal=personal, **kwargs)
+        headers = self.set_cache_headers(HttpResponse(), etag, last_modified)
+        not_modified = get_conditional_response(
+            request,
+            etag=etag,
+            last_modified=last_modified and int(last_modified.timestamp()),
+            response=headers
+        )
+        if not_modified is not headers:
+            return not_modified
+        response = handler(request, *args, personal=personal, **kwargs)
+        if response.status_code != 200:
+            return response
+        return self.set_cache_headers(response, etag, last_modified)
+
+    def personalize(self, item, personal):
+        """Выставление персональных полей одного объекта ответа."""
+
+    def personalize_data(self, data, personal):
+        if not self.personalized:
+            return data
+        if isinstance(data, dict) and 'results' in data:
+            items = data['results']
+        elif isinstance(data, list):
+            items = data
+        else:
+            items = [data]
+        for item in items:
+            self.personalize(item, personal)
+        return data
+
+    def cached_response(self, handler, request, *args, **kwargs):
+        if not self.is_response_cacheable(request):
+            return handler(request, *args, **kwargs)
+        return self.conditional_response(
+            self._cached_response, request, handler, *args, **kwargs
+        )
+
+    def _cached_response(self, request, handler, *args, personal, **kwargs):
+        key = self.get_response_cache_key(request)
+        data = cache.get(key)
+        if data is None:
+            response = handler(request, *args, **kwargs)
+            if response.status_code != 200:
+                return response
+            data = response.data
+            cache.set(
+                key,
+                self.personalize_data(copy.deepcopy(data), EMPTY),
+                settings.CACHE_TIMEOUT
+            )
+        return Response(self.personalize_data(data, personal))
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_response(
+            super().retrieve, request, *args, **kwargs
+        )
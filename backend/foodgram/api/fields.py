@@ -0,0 +1,108 @@
+import base64
+import binascii
+from tempfile import SpooledTemporaryFile
+
+from django.conf import settings
+from django.core.files import File
+from drf_extra_fields import fields as drf_fields
+from PIL import Image, UnidentifiedImageError
+from rest_framework import serializers
+
+from core.images import variant_urls
+
+DECODE_CHUNK_SIZE = 64 * 1024
+SPOOL_MAX_SIZE = 1024 * 1024
+
+
+class StreamingBase64ImageField(drf_fields.Base64ImageField):
+    """
+    Картинка в base64 с потоковым декодированием.
+
+    Размер файла оценивается по длине строки до декодирования, сама строка
+    декодируется порциями во временный файл, поэтому воркер не держит
+    в памяти полную копию картинки. Размер и тип ограничены настройками
+    MAX_IMAGE_SIZE и ALLOWED_IMAGE_TYPES.
+    """
+
+    default_error_messages = {
+        'invalid_base64': 'Некорректная строка base64.',
+        'invalid_image': 'Загрузите корректное изображение.',
+        'invalid_type': 'Допустимые форматы: {types}.',
+        'too_large': 'Размер изображения не должен превышать {size} байт.',
+    }
+
+    def to_internal_value(self, base64_data):
+        if base64_data in self.EMPTY_VALUES:
+            return None
+        if not isinstance(base64_data, str):
+            self.fail('invalid_base64')
+        header, _, payload = base64_data.rpartition(';base64,')
+        if header and header.replace('data:', '') not in (
+            settings.ALLOWED_IMAGE_TYPES
+        ):
+            self.fail_invalid_type()
+        padding = len(payload) - len(payload.rstrip('='))
+        if len(payload) * 3 // 4 - padding > settings.MAX_IMAGE_SIZE:
+            self.fail('too_large', size=settings.MAX_IMAGE_SIZE)
+        buffer = SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE)
+        try:
+            for start in range(0, len(payload), DECODE_CHUNK_SIZE):
+                buffer.write(base64.b64decode(
+                    payload[start:start + DECODE_CHUNK_SIZE], validate=True
+                ))
+        except (binascii.Error, ValueError):
+            buffer.close()
+            self.fail('invalid_base64')
+        size = buffer.tell()
+        extension = self.get_image_extension(buffer)
+        buffer.seek(0)
+        image_file = File(
+            buffer, name=f'{self.get_file_name(None)}.{extension}'
+        )
+        image_file.size = size
+        return serializers.FileField.to_internal_value(self, image_file)
+
+    def get_image_extension(self, buffer):
+        buffer.seek(0)
+        try:
+            with Image.open(buffer) as image:
+                image_format = image.format
+                image.verify()
+        except (UnidentifiedImageError, OSError, SyntaxError):
+            self.fail('invalid_image')
+        if Image.MIME.get(image_format) not in settings.ALLOWED_IMAGE_TYPES:
+            self.fail_invalid_type()
+        return 'jpg' if image_format == 'JPEG' else image_format.lower()
+
+    def fail_invalid_type(self):
+        self.fail(
+            'invalid_type', types=', '.join(settings.ALLOWED_IMAGE_TYPES)
+        )
+
+
+class ImageVariantsField(serializers.Field):
+    """Ссылки на уменьшенные копии картинки: thumb, card и full."""
+
+    def __init__(self, **kwargs):
+        kwargs['read_only'] = True
+        super().__init__(**kwargs)
+
+    def to_representation(self, value):
+        return variant_urls(value, self.context.get('request'))
+
+
+class IdListField(serializers.ListField):
+    """
+    Список id объектов для пакетных действий.
+
+    Повторы отбрасываются, длина ограничена настройкой BULK_ACTION_LIMIT.
+    """
+
+    def __init__(self, **kwargs):
+        kwargs['child'] = serializers.IntegerField(min_value=1)
+        kwargs.setdefault('allow_empty', False)
+        kwargs.setdefault('max_length', settings.BULK_ACTION_LIMIT)
+        super().__init__(**kwargs)
+
+    def to_internal_value(self, data):
+        return list(dict.fromkeys(super().to_internal_value(data)))
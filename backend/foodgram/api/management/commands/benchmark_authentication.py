@@ -0,0 +1,103 @@
+import statistics
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient, APIRequestFactory
+from rest_framework.views import APIView
+
+from api import authentication
+from api.authentication import CachedTokenAuthentication, local_tokens
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнение авторизации по токену DRF и CachedTokenAuthentication: '
+        'время и число запросов к БД на запрос. Нужны токены в БД, '
+        'например из generate_benchmark_data.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tokens', type=int, default=100)
+        parser.add_argument('--repeat', type=int, default=20)
+        parser.add_argument('--path', default='/api/users/me/')
+
+    def handle(self, *args, **options):
+        keys = list(
+            Token.objects.filter(
+                created__gte=authentication.expired_before()
+            ).values_list('key', flat=True)[:options['tokens']]
+        )
+        if not keys:
+            raise CommandError('Нет действующих токенов.')
+        requests = [
+            APIRequestFactory().get('/', HTTP_AUTHORIZATION=f'Token {key}')
+            for key in keys
+        ] * options['repeat']
+        self.stdout.write(
+            f'{connection.vendor}, {len(keys)} токенов, '
+            f'{len(requests)} вызовов authenticate()'
+        )
+        cached = CachedTokenAuthentication()
+        self._measure('DRF TokenAuthentication', TokenAuthentication(), [
+            requests
+        ])
+        local_tokens.clear()
+        local_size = local_tokens.size
+        local_tokens.size = 0
+        self._measure('общий кэш', cached, [requests[:len(keys)], requests])
+        local_tokens.size = local_size
+        self._measure(
+            'память процесса', cached, [requests[:len(keys)], requests]
+        )
+        client = APIClient()
+        default_classes = APIView.authentication_classes
+        try:
+            for name, backend_class in (
+                ('DRF', TokenAuthentication),
+                ('кэш', CachedTokenAuthentication)
+            ):
+                APIView.authentication_classes = [backend_class]
+                self._measure_client(name, client, keys, options)
+        finally:
+            APIView.authentication_classes = default_classes
+
+    def _measure(self, name, backend, rounds):
+        """Последний из rounds замеряется, остальные прогревают кэш."""
+        *warmup, requests = rounds
+        for warmup_requests in warmup:
+            for request in warmup_requests:
+                backend.authenticate(request)
+        with CaptureQueriesContext(connection) as queries:
+            start = time.perf_counter()
+            for request in requests:
+                backend.authenticate(request)
+            elapsed = time.perf_counter() - start
+        self.stdout.write(
+            f'{name:24} {elapsed / len(requests) * 1e6:8.1f} мкс, '
+            f'запросов к БД на вызов {len(queries) / len(requests):.2f}'
+        )
+
+    def _measure_client(self, name, client, keys, options):
+        timings = []
+        queries = 0
+        for _ in range(options['repeat']):
+            for key in keys:
+                client.credentials(HTTP_AUTHORIZATION=f'Token {key}')
+                with CaptureQueriesContext(connection) as captured:
+                    start = time.perf_counter()
+                    response = client.get(options['path'])
+                    timings.append((time.perf_counter() - start) * 1000)
+                if response.status_code != 200:
+                    raise CommandError(
+                        f'{options["path"]}: ответ {response.status_code}'
+                    )
+                queries += len(captured)
+        self.stdout.write(
+            f'GET {options["path"]} ({name}): '
+            f'p50 {statistics.median(timings):.2f} мс, '
+            f'запросов к БД {queries / len(timings):.2f}'
+        )
@@ -0,0 +1,230 @@
+import os
+import socket
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework import serializers
+
+DURATION_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0
+)
+METRICS = {
+    'request_duration_seconds': (
+        'Время обработки запроса.', DURATION_BUCKETS
+    ),
+    'db_duration_seconds': (
+        'Время SQL-запросов за запрос.', DURATION_BUCKETS
+    ),
+    'view_duration_seconds': (
+        'Время кода представления без сериализаторов и SQL.',
+        DURATION_BUCKETS
+    ),
+    'serialize_duration_seconds': (
+        'Время сериализаторов (serializer.data) без учёта SQL.',
+        DURATION_BUCKETS
+    ),
+    'render_duration_seconds': (
+        'Время рендеринга ответа в байты (JSON).', DURATION_BUCKETS
+    ),
+    'db_queries': (
+        'Число SQL-запросов за запрос.', (1, 2, 3, 5, 10, 20, 50, 100, 200)
+    ),
+    'response_size_bytes': (
+        'Размер тела ответа.',
+        (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+    ),
+}
+PREFIX = 'foodgram_'
+# Процессы публикуют метрики в слотах общего кэша, эндпоинт метрик
+# читает все слоты одним запросом.
+WORKER_SLOTS = 256
+
+
+def _slot_key(slot):
+    return f'metrics:slot:{slot}'
+
+
+class MetricsRegistry:
+    """
+    Гистограммы текущего процесса.
+
+    Набор меток ограничен именами представлений, границы корзин
+    фиксированы, поэтому память не растёт с числом запросов. Накопленные
+    значения процесса периодически целиком записываются в свой слот
+    общего кэша, эндпоинт метрик суммирует слоты всех процессов.
+    Свободный слот занимается через cache.add, поэтому два процесса
+    не запишут метрики в один слот.
+    """
+
+    def __init__(self, worker=None):
+        self.worker = worker or f'{socket.gethostname()}:{os.getpid()}'
+        self.histograms = {}
+        self.requests = {}
+        self.lock = threading.Lock()
+        self.flush_lock = threading.Lock()
+        self.flushed_at = time.monotonic()
+        self.slot = None
+
+    def observe(self, view, status, values):
+        with self.lock:
+            key = (view, f'{status // 100}xx')
+            self.requests[key] = self.requests.get(key, 0) + 1
+            for metric, value in values.items():
+                if value is None:
+                    continue
+                buckets = METRICS[metric][1]
+                histogram = self.histograms.get((metric, view))
+                if histogram is None:
+                    histogram = [0] * (len(buckets) + 1) + [0.0]
+                    self.histograms[(metric, view)] = histogram
+                position = len(buckets)
+                for index, bound in enumerate(buckets):
+                    if value <= bound:
+                        position = index
+                        break
+                histogram[position] += 1
+                histogram[-1] += value
+        elapsed = time.monotonic() - self.flushed_at
+        if elapsed >= settings.METRICS_FLUSH_INTERVAL:
+            self.flush()
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                'histograms': {
+                    key: list(value) for key, value in self.histograms.items()
+                },
+                'requests': dict(self.requests),
+            }
+
+    def flush(self):
+        with self.flush_lock:
+            self.flushed_at = time.monotonic()
+            value = {'worker': self.worker, **self.snapshot()}
+            timeout = settings.METRICS_WORKER_TIMEOUT
+            if self.slot is not None:
+                key = _slot_key(self.slot)
+                owner = cache.get(key)
+                if owner is not None and owner['worker'] == self.worker:
+                    cache.set(key, value, timeout)
+                    return
+                if owner is None and cache.add(key, value, timeout):
+                    return
+            # Слот истёк и занят другим процессом или ещё не выбран.
+            self.slot = None
+            for slot in range(WORKER_SLOTS):
+                if cache.add(_slot_key(slot), value, timeout):
+                    self.slot = slot
+                    return
+
+
+registry = MetricsRegistry()
+
+
+class TimedDataMixin:
+    """
+    Свойство data, учитывающее время сериализатора в метриках запроса.
+
+    Время вложенных вызовов и SQL-запросов (ленивые связи) не
+    учитывается повторно. Сериализаторы без запроса в контексте
+    не замеряются.
+    """
+
+    @property
+    def data(self):
+        request = getattr(self.context.get('request'), '_request', None)
+        metrics = getattr(request, 'metrics', None)
+        if metrics is None or metrics.serializing:
+            return super().data
+        metrics.serializing = True
+        db_time = metrics.db_time
+        start = time.perf_counter()
+        try:
+            return super().data
+        finally:
+            metrics.serializing = False
+            metrics.serialize_time += (
+                time.perf_counter() - start - (metrics.db_time - db_time)
+            )
+
+
+class TimedListSerializer(TimedDataMixin, serializers.ListSerializer):
+    pass
+
+
+class TimedSerializerMixin(TimedDataMixin):
+    """
+    Замер времени сериализаторов ответов проекта, в том числе с
+    many=True. Сериализаторы DRF и сторонних пакетов не меняются.
+    """
+
+    @classmethod
+    def many_init(cls, *args, **kwargs):
+        serializer = super().many_init(*args, **kwargs)
+        if type(serializer) is serializers.ListSerializer:
+            serializer.__class__ = TimedListSerializer
+        return serializer
+
+
+def collect():
+    """Сумма значений всех процессов из общего кэша."""
+    registry.flush()
+    slots = cache.get_many(
+        [_slot_key(slot) for slot in range(WORKER_SLOTS)]
+    )
+    # Значения процесса накопительные, при гонке за слот процесс
+    # учитывается один раз.
+    snapshots = {value['worker']: value for value in slots.values()}
+    histograms = {}
+    requests = {}
+    for snapshot in snapshots.values():
+        for key, values in snapshot['histograms'].items():
+            total = histograms.setdefault(key, [0] * len(values))
+            for index, value in enumerate(values):
+                total[index] += value
+        for key, count in snapshot['requests'].items():
+            requests[key] = requests.get(key, 0) + count
+    return histograms, requests
+
+
+def _labels(**labels):
+    return ','.join(
+        f'{name}="{value}"' for name, value in labels.items()
+    )
+
+
+def render_prometheus():
+    """Метрики в текстовом формате Prometheus 0.0.4."""
+    histograms, requests = collect()
+    lines = [
+        f'# HELP {PREFIX}requests_total Число обработанных запросов.',
+        f'# TYPE {PREFIX}requests_total counter',
+    ]
+    for (view, status), count in sorted(requests.items()):
+        lines.append(
+            f'{PREFIX}requests_total{{{_labels(view=view, status=status)}}} '
+            f'{count}'
+        )
+    for metric, (description, buckets) in METRICS.items():
+        name = PREFIX + metric
+        lines.append(f'# HELP {name} {description}')
+        lines.append(f'# TYPE {name} histogram')
+        for (histogram_metric, view), values in sorted(histograms.items()):
+            if histogram_metric != metric:
+                continue
+            cumulative = 0
+            for bound, count in zip(buckets, values):
+                cumulative += count
+                lines.append(
+                    f'{name}_bucket{{{_labels(view=view, le=bound)}}} '
+                    f'{cumulative}'
+                )
+            count = cumulative + values[len(buckets)]
+            lines.append(
+                f'{name}_bucket{{{_labels(view=view, le="+Inf")}}} {count}'
+            )
+            lines.append(f'{name}_sum{{{_labels(view=view)}}} {values[-1]}')
+            lines.append(f'{name}_count{{{_labels(view=view)}}} {count}')
+    return '\n'.join(lines) + '\n'
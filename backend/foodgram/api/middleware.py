@@ -0,0 +1,141 @@
+import asyncio
+import logging
+import time
+
+from django.conf import settings
+from django.db import connection
+
+from .metrics import registry
+
+logger = logging.getLogger('foodgram.slow_queries')
+
+
+def view_name(view_func, method):
+    """Имя представления для меток: <basename>.<action> у вьюсетов."""
+    actions = getattr(view_func, 'actions', None)
+    initkwargs = getattr(view_func, 'initkwargs', {})
+    if actions and initkwargs.get('basename'):
+        action = actions.get(method.lower(), method.lower())
+        return f'{initkwargs["basename"]}.{action}'
+    view_class = getattr(view_func, 'cls', None) or getattr(
+        view_func, 'view_class', None
+    )
+    return view_class.__name__ if view_class else view_func.__name__
+
+
+class RequestMetrics:
+    """Счётчики одного запроса, заполняются обёрткой execute_wrapper."""
+
+    def __init__(self, db_tracked=True):
+        self.view = 'unresolved'
+        self.db_tracked = db_tracked
+        self.queries = 0
+        self.db_time = 0.0
+        self.serialize_time = 0.0
+        self.serializing = False
+        self.render_started = None
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = time.perf_counter() - start
+            self.queries += 1
+            self.db_time += duration
+            if (
+                settings.SLOW_QUERY_MS is not None
+                and duration * 1000 >= settings.SLOW_QUERY_MS
+            ):
+                logger.warning(
+                    'Медленный запрос %.1f мс в %s: %s',
+                    duration * 1000, self.view, sql[:2000]
+                )
+
+
+class MetricsMiddleware:
+    """
+    Метрики запросов по представлениям.
+
+    Для каждого запроса считаются число SQL-запросов и их время, время
+    сериализаторов, рендеринга ответа, остального кода представления
+    и размер ответа. Значения попадают в гистограммы
+    api.metrics, доступные на /api/metrics. С QUERY_COUNT_HEADER число
+    запросов также возвращается заголовком X-Query-Count.
+
+    Под ASGI SQL выполняется не в потоке цикла событий, поэтому
+    запросы к БД считаются только у представлений api.async_views.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if asyncio.iscoroutinefunction(get_response):
+            # Так Django определяет, что экземпляр вызывается как корутина.
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    @staticmethod
+    def enabled():
+        return settings.METRICS_ENABLED or settings.QUERY_COUNT_HEADER
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not self.enabled():
+            return self.get_response(request)
+        metrics = request.metrics = RequestMetrics()
+        start = time.perf_counter()
+        with connection.execute_wrapper(metrics):
+            response = self.get_response(request)
+        return self.finish(metrics, response, start)
+
+    async def __acall__(self, request):
+        if not self.enabled():
+            return await self.get_response(request)
+        metrics = request.metrics = RequestMetrics(db_tracked=False)
+        start = time.perf_counter()
+        response = await self.get_response(request)
+        return self.finish(metrics, response, start)
+
+    def finish(self, metrics, response, start):
+        finished = time.perf_counter()
+        db_time = metrics.db_time if metrics.db_tracked else None
+        if settings.QUERY_COUNT_HEADER and metrics.db_tracked:
+            response['X-Query-Count'] = metrics.queries
+        if settings.METRICS_ENABLED:
+            render = (
+                finished - metrics.render_started
+                if metrics.render_started is not None else None
+            )
+            total = finished - start
+            serialize = metrics.serialize_time or None
+            registry.observe(metrics.view, response.status_code, {
+                'request_duration_seconds': total,
+                'db_duration_seconds': db_time,
+                'view_duration_seconds': max(
+                    total - (db_time or 0) - (serialize or 0) - (render or 0),
+                    0
+                ),
+                'serialize_duration_seconds': serialize,
+                'render_duration_seconds': render,
+                'db_queries': metrics.queries if metrics.db_tracked else None,
+                'response_size_bytes': (
+                    None if response.streaming else len(response.content)
+                ),
+            })
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        metrics = getattr(request, 'metrics', None)
+        if metrics is not None:
+            metrics.view = view_name(view_func, request.method)
+
+    def process_template_response(self, request, response):
+        # Ответы DRF рендерятся после всех process_template_response,
+        # остаток времени до возврата из get_response - рендеринг.
+        metrics = getattr(request, 'metrics', None)
+        if metrics is not None and not response.is_rendered:
+            metrics.render_started = time.perf_counter()
+        return response
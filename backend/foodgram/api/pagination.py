@@ -1,8 +1,202 @@
+import base64
+import binascii
+import hashlib
+import json
+from collections import OrderedDict
+from functools import cached_property, partial
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.core.paginator import Paginator
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
 from rest_framework.pagination import PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+from core import versions
+
+
+class CachedCountPaginator(Paginator):
+    """
+    Пагинатор, кэширующий COUNT(*) запроса.
+
+    Ключ включает текст SQL и версии данных, от которых зависит выборка,
+    поэтому страницы одного списка используют одно значение count.
+    """
+
+    def __init__(self, *args, count_namespaces=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.count_namespaces = count_namespaces
+
+    @cached_property
+    def count(self):
+        query = getattr(self.object_list, 'query', None)
+        if self.count_namespaces is None or query is None:
+            return super().count
+        data_versions = ':'.join(
+            str(versions.get_version(namespace))
+            for namespace in self.count_namespaces
+        )
+        digest = hashlib.md5(str(query).encode()).hexdigest()
+        key = f'count:{data_versions}:{digest}'
+        count = cache.get(key)
+        if count is None:
+            count = super().count
+            cache.set(key, count, settings.PAGINATION_COUNT_TIMEOUT)
+        return count
+
+
+class KeysetPagination:
+    """
+    Пагинация по курсору (keyset) для бесконечной прокрутки.
+
+    Курсор хранит значения полей сортировки последнего объекта страницы,
+    следующая страница выбирается условием WHERE (created, id) < (...),
+    поэтому глубокие страницы стоят столько же, сколько первая, и COUNT(*)
+    не нужен.
+    """
+
+    cursor_query_param = 'cursor'
+
+    def __init__(self, page_size):
+        self.page_size = page_size
+
+    @staticmethod
+    def get_ordering(queryset):
+        ordering = list(
+            queryset.query.order_by or queryset.model._meta.ordering
+        )
+        if not all(
+            isinstance(field, str) and '__' not in field
+            for field in ordering
+        ):
+            return None
+        if not any(field.lstrip('-') in ('id', 'pk') for field in ordering):
+            descending = ordering and ordering[-1].startswith('-')
+            ordering.append('-id' if descending else 'id')
+        return ordering
+
+    def encode_cursor(self, position):
+        values = [
+            value.isoformat() if hasattr(value, 'isoformat') else value
+            for value in position
+        ]
+        return base64.urlsafe_b64encode(
+            json.dumps(values).encode()
+        ).decode()
+
+    def decode_cursor(self, queryset, ordering, cursor):
+        """
+        Значения полей сортировки из курсора.
+
+        Подделанный или устаревший курсор (не тот формат, число или тип
+        значений) даёт 404, а не ошибку сервера.
+        """
+        try:
+            values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+            if not isinstance(values, list) or len(values) != len(ordering):
+                raise ValueError
+            position = []
+            for field, value in zip(ordering, values):
+                if not isinstance(value, (str, int, float)):
+                    raise ValueError
+                try:
+                    model_field = queryset.model._meta.get_field(
+                        field.lstrip('-')
+                    )
+                except FieldDoesNotExist:
+                    position.append(value)
+                    continue
+                position.append(model_field.to_python(value))
+        except (
+            binascii.Error, OverflowError, TypeError, ValidationError,
+            ValueError
+        ):
+            raise NotFound('Некорректный курсор.')
+        return position
+
+    @staticmethod
+    def build_filter(ordering, position):
+        condition = Q()
+        for index, field in enumerate(ordering):
+            name = field.lstrip('-')
+            lookup = 'lt' if field.startswith('-') else 'gt'
+            step = Q(**{f'{name}__{lookup}': position[index]})
+            for previous, value in zip(ordering[:index], position):
+                step &= Q(**{previous.lstrip('-'): value})
+            condition |= step
+        return condition
+
+    def paginate_queryset(self, queryset, request, ordering):
+        self.request = request
+        queryset = queryset.order_by(*ordering)
+        cursor = request.query_params.get(self.cursor_query_param)
+        if cursor:
+            position = self.decode_cursor(queryset, ordering, cursor)
+            queryset = queryset.filter(self.build_filter(ordering, position))
+        page = list(queryset[:self.page_size + 1])
+        self.next_position = None
+        if len(page) > self.page_size:
+            page = page[:self.page_size]
+            self.next_position = [
+                getattr(page[-1], field.lstrip('-')) for field in ordering
+            ]
+        return page
+
+    def get_next_link(self):
+        if self.next_position is None:
+            return None
+        return replace_query_param(
+            self.request.build_absolute_uri(),
+            self.cursor_query_param,
+            self.encode_cursor(self.next_position)
+        )
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('results', data)
+        ]))
 
 
 class CustomPageNumberPagination(PageNumberPagination):
-    """Кастомная пагинация для API-эндпоинтов."""
+    """
+    Кастомная пагинация для API-эндпоинтов.
+
+    По умолчанию - постраничная с полем count, значение которого кэшируется.
+    С параметром ?cursor= (пустым для первой страницы) включается
+    пагинация по курсору без COUNT(*) и OFFSET.
+    """
 
     page_size = 10
     page_size_query_param = 'limit'
+    keyset = None
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.keyset = None
+        if (
+            KeysetPagination.cursor_query_param in request.query_params
+            and hasattr(queryset, 'query')
+        ):
+            ordering = KeysetPagination.get_ordering(queryset)
+            if ordering is not None:
+                self.keyset = KeysetPagination(self.get_page_size(request))
+                return self.keyset.paginate_queryset(
+                    queryset, request, ordering
+                )
+        count_namespaces = None
+        if getattr(view, 'is_response_cacheable', None) and (
+            view.is_response_cacheable(request)
+        ):
+            count_namespaces = view.cache_namespaces
+        self.django_paginator_class = partial(
+            CachedCountPaginator, count_namespaces=count_namespaces
+        )
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.keyset is not None:
+            return self.keyset.get_paginated_response(data)
+        return super().get_paginated_response(data)
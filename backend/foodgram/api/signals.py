@@ -0,0 +1,28 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from core.models import User
+
+from .authentication import invalidate_tokens
+
+
+@receiver(post_delete, sender=Token)
+def invalidate_deleted_token(instance, **kwargs):
+    invalidate_tokens([instance.key])
+
+
+@receiver(post_save, sender=User)
+def invalidate_user_tokens(instance, update_fields=None, **kwargs):
+    if update_fields is not None and set(update_fields) == {'last_login'}:
+        return
+    # set_password() запоминает новый пароль до сохранения. После смены
+    # пароля старые токены отзываются, удаление токенов сбрасывает кэш.
+    if getattr(instance, '_password', None) is not None:
+        Token.objects.filter(user_id=instance.pk).delete()
+        return
+    invalidate_tokens(
+        Token.objects.filter(user_id=instance.pk).values_list(
+            'key', flat=True
+        )
+    )
@@ -0,0 +1,411 @@
+import asyncio
+import base64
+import json
+import threading
+import time
+from datetime import timedelta
+from unittest import mock
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.handlers.asgi import ASGIHandler
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase
+from django.test import TransactionTestCase, override_settings
+from rest_framework import serializers
+from rest_framework.authtoken.models import Token
+from rest_framework.request import Request
+from rest_framework.test import APIClient
+
+from api_recipes.tests import TEST_CACHES, create_recipe, create_user
+from core import relations, short_links
+from core.models import Ingredient
+from . import metrics as metrics_module
+from .async_views import async_view
+from .authentication import (
+    CachedTokenAuthentication,
+    LocalTokenCache,
+    expired_before,
+    local_tokens
+)
+from .metrics import MetricsRegistry, TimedSerializerMixin
+from .middleware import RequestMetrics
+
+
+def encode(values):
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode()
+
+
+@override_settings(CACHES=TEST_CACHES)
+class KeysetPaginationTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        author = create_user('author')
+        cls.recipes = [
+            create_recipe(author, f'Рецепт {number}') for number in range(3)
+        ]
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+
+    def test_pages(self):
+        response = self.client.get('/api/recipes/?cursor=&limit=2')
+        self.assertEqual(response.status_code, 200)
+        ids = [recipe['id'] for recipe in response.json()['results']]
+        response = self.client.get(response.json()['next'])
+        self.assertEqual(response.status_code, 200)
+        ids += [recipe['id'] for recipe in response.json()['results']]
+        self.assertIsNone(response.json()['next'])
+        self.assertEqual(
+            ids, sorted((recipe.id for recipe in self.recipes), reverse=True)
+        )
+
+    def test_malformed_cursor(self):
+        for cursor in (
+            'не base64',
+            'e30',
+            encode({'created': 1}),
+            encode(['2026-01-01T00:00:00']),
+            encode(['вчера', 1]),
+            encode(['2026-01-01T00:00:00', 'один']),
+            encode([{'created': 1}, [1]]),
+            encode([1e400, 1e400]),
+        ):
+            with self.subTest(cursor=cursor):
+                response = self.client.get(
+                    '/api/recipes/', {'cursor': cursor}
+                )
+                self.assertEqual(response.status_code, 404)
+
+
+@override_settings(CACHES=TEST_CACHES)
+class ShortLinkTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        # Версии повторяются после отката теста, карту id сбрасываем.
+        short_links._recipe_ids = None
+        self.addCleanup(setattr, short_links, '_recipe_ids', None)
+        self.author = create_user('author')
+        self.recipe = create_recipe(self.author, 'Рецепт')
+
+    def assertRedirect(self, url, location, queries=0):
+        if queries is None:
+            response = self.client.get(url)
+        else:
+            with self.assertNumQueries(queries):
+                response = self.client.get(url)
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(response['Location'], location)
+
+    def test_codes(self):
+        for recipe_id in (0, 1, 61, 62, 3843, 10 ** 6, 2 ** 63 - 1):
+            with self.subTest(recipe_id=recipe_id):
+                code = short_links.encode(recipe_id)
+                self.assertLessEqual(len(code), 11)
+                self.assertEqual(short_links.decode(code), recipe_id)
+        self.assertEqual(short_links.encode(62), '10')
+        self.assertEqual(short_links.decode_hex('fF'), 255)
+        for code in ('', 'a-b', 'рецепт', 'a' * 12):
+            with self.subTest(code=code):
+                self.assertIsNone(short_links.decode(code))
+        for code in ('', 'xyz', '0x1f', 'f' * 17):
+            with self.subTest(code=code):
+                self.assertIsNone(short_links.decode_hex(code))
+
+    def test_redirect(self):
+        client = APIClient()
+        client.force_authenticate(self.author)
+        link = client.get(
+            f'/api/recipes/{self.recipe.id}/get-link/'
+        ).json()['short-link']
+        code = short_links.encode(self.recipe.id)
+        self.assertTrue(link.endswith(f'/r/{code}'))
+        location = f'/recipes/{self.recipe.id}'
+        # Первый запрос строит карту id, дальше БД не нужна.
+        self.assertRedirect(f'/r/{code}', location, queries=None)
+        self.assertRedirect(f'/r/{code}', location)
+        self.assertRedirect(f'/s/{self.recipe.id:x}', location)
+        for url in (
+            f'/r/{short_links.encode(self.recipe.id + 1)}',
+            f'/r/{short_links.encode(10 ** 9)}',
+            '/r/a-b',
+            '/r/' + 'z' * 12,
+            f'/s/{self.recipe.id + 1:x}',
+            '/s/xyz',
+        ):
+            with self.subTest(url=url):
+                self.assertRedirect(url, '/404')
+
+    def test_created_and_deleted(self):
+        self.assertRedirect(
+            f'/r/{short_links.encode(self.recipe.id)}',
+            f'/recipes/{self.recipe.id}',
+            queries=None
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            recipe = create_recipe(self.author, 'Новый рецепт')
+        url = f'/r/{short_links.encode(recipe.id)}'
+        self.assertRedirect(url, f'/recipes/{recipe.id}', queries=None)
+        self.assertRedirect(url, f'/recipes/{recipe.id}')
+        with self.captureOnCommitCallbacks(execute=True):
+            recipe.delete()
+        self.assertRedirect(url, '/404', queries=None)
+        self.assertRedirect(url, '/404')
+
+
+@override_settings(CACHES=TEST_CACHES, METRICS_TOKEN=None)
+class MetricsViewTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+
+    def test_disabled_without_token(self):
+        self.assertEqual(self.client.get('/api/metrics').status_code, 404)
+
+    @override_settings(METRICS_TOKEN='secret')
+    def test_token(self):
+        for header, status in (
+            ({}, 403),
+            ({'HTTP_AUTHORIZATION': 'Bearer wrong'}, 403),
+            ({'HTTP_AUTHORIZATION': 'Bearer secret'}, 200),
+        ):
+            with self.subTest(header=header):
+                response = self.client.get('/api/metrics', **header)
+                self.assertEqual(response.status_code, status)
+
+    @override_settings(METRICS_TOKEN='secret', METRICS_ENABLED=True)
+    def test_serialize_duration(self):
+        create_recipe(create_user('author'), 'Рецепт')
+        self.assertEqual(self.client.get('/api/recipes/').status_code, 200)
+        metrics = self.client.get(
+            '/api/metrics', HTTP_AUTHORIZATION='Bearer secret'
+        ).content.decode()
+        self.assertIn(
+            'foodgram_serialize_duration_seconds_count'
+            '{view="culinaryrecipe.list"}',
+            metrics
+        )
+
+    def test_only_project_serializers(self):
+        class PlainSerializer(serializers.Serializer):
+            name = serializers.CharField()
+
+        class TimedSerializer(TimedSerializerMixin, PlainSerializer):
+            pass
+
+        for serializer_class in (
+            serializers.Serializer, serializers.ListSerializer
+        ):
+            self.assertEqual(
+                serializer_class.data.fget.__module__,
+                'rest_framework.serializers'
+            )
+        request = RequestFactory().get('/')
+        request.metrics = RequestMetrics()
+        context = {'request': Request(request)}
+        for serializer, timed in (
+            (PlainSerializer({'name': 'a'}, context=context), False),
+            (PlainSerializer([{'name': 'a'}], many=True, context=context),
+             False),
+            (TimedSerializer({'name': 'a'}, context=context), True),
+            (TimedSerializer([{'name': 'a'}], many=True, context=context),
+             True),
+        ):
+            with self.subTest(serializer=serializer, timed=timed):
+                request.metrics.serialize_time = 0.0
+                self.assertTrue(serializer.data)
+                self.assertEqual(request.metrics.serialize_time > 0, timed)
+
+    def test_workers(self):
+        workers = [
+            MetricsRegistry(f'worker-{number}') for number in range(3)
+        ]
+        for _ in range(2):
+            for worker in workers:
+                worker.observe('view', 200, {'db_queries': 1})
+                worker.flush()
+        self.assertEqual(
+            len({worker.slot for worker in workers}), len(workers)
+        )
+        # Слот истёк и занят другим процессом: прежний владелец
+        # переходит в свободный слот и не затирает чужие метрики.
+        cache.delete(metrics_module._slot_key(workers[0].slot))
+        newcomer = MetricsRegistry('worker-new')
+        newcomer.observe('view', 200, {'db_queries': 1})
+        newcomer.flush()
+        workers[0].flush()
+        with mock.patch.object(metrics_module, 'registry', newcomer):
+            histograms, requests = metrics_module.collect()
+        self.assertEqual(requests, {('view', '2xx'): 7})
+        self.assertEqual(histograms[('db_queries', 'view')][0], 7)
+
+
+class AsyncViewTests(SimpleTestCase):
+    """В пуле потоков выполняются только GET и HEAD."""
+
+    def test_methods(self):
+        def view(request):
+            return HttpResponse(threading.current_thread().name)
+
+        wrapped = async_view(view)
+        factory = RequestFactory()
+        for method, in_pool in (
+            ('get', True),
+            ('head', True),
+            ('post', False),
+            ('put', False),
+            ('patch', False),
+            ('delete', False),
+        ):
+            with self.subTest(method=method):
+                request = getattr(factory, method)('/')
+                thread = asyncio.run(wrapped(request)).content.decode()
+                self.assertEqual(
+                    thread.startswith('async-views'), in_pool, thread
+                )
+
+
+@override_settings(CACHES=TEST_CACHES)
+class ASGIDownloadTests(TransactionTestCase):
+    """
+    Под ASGI Django перебирает потоковый ответ в цикле событий, где
+    запросы к БД запрещены: файл списка покупок не должен их делать.
+    """
+
+    def setUp(self):
+        cache.clear()
+        reader = create_user('reader')
+        self.token = Token.objects.create(user=reader)
+        products = [
+            Ingredient.objects.create(
+                name=f'Продукт {number}', measurement_unit='г'
+            )
+            for number in range(3)
+        ]
+        recipe = create_recipe(create_user('author'), 'Рецепт', products)
+        relations.add('shopping_cart', reader.id, [recipe.id])
+
+    def get(self, path, query_string):
+        scope = {
+            'type': 'http',
+            'asgi': {'version': '3.0'},
+            'http_version': '1.1',
+            'method': 'GET',
+            'scheme': 'http',
+            'path': path,
+            'raw_path': path.encode(),
+            'query_string': query_string.encode(),
+            'root_path': '',
+            'headers': [
+                (b'host', b'testserver'),
+                (b'authorization', f'Token {self.token.key}'.encode()),
+            ],
+            'client': ('127.0.0.1', 1),
+            'server': ('testserver', 80),
+        }
+        messages = []
+
+        async def receive():
+            return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+        async def send(message):
+            messages.append(message)
+
+        asyncio.run(ASGIHandler()(scope, receive, send))
+        return messages[0]['status'], b''.join(
+            message.get('body', b'') for message in messages[1:]
+        )
+
+    def test_download(self):
+        for file_format in ('txt', 'csv', 'json'):
+            with self.subTest(file_format=file_format):
+                status, body = self.get(
+                    '/api/recipes/download_shopping_cart/',
+                    f'file_format={file_format}'
+                )
+                self.assertEqual(status, 200)
+                for number in range(3):
+                    self.assertIn(f'Продукт {number}'.encode(), body)
+
+
+@override_settings(CACHES=TEST_CACHES)
+class CachedTokenAuthenticationTests(TestCase):
+    """Кэш токенов не продлевает жизнь отозванным токенам."""
+
+    def setUp(self):
+        cache.clear()
+        local_tokens.clear()
+        self.user = create_user('reader')
+        self.token = Token.objects.create(user=self.user)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+
+    def assertStatus(self, status_code):
+        response = self.client.get('/api/users/me/')
+        self.assertEqual(response.status_code, status_code)
+
+    def test_cached(self):
+        self.assertStatus(200)
+        with self.assertNumQueries(0):
+            CachedTokenAuthentication().authenticate_credentials(
+                self.token.key
+            )
+
+    def test_expired(self):
+        Token.objects.filter(key=self.token.key).update(
+            created=expired_before() - timedelta(seconds=1)
+        )
+        self.assertStatus(401)
+        self.assertFalse(Token.objects.filter(key=self.token.key).exists())
+
+    def test_logout(self):
+        self.assertStatus(200)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/api/auth/token/logout/')
+        self.assertEqual(response.status_code, 204)
+        self.assertIsNone(local_tokens.get(self.token.key))
+        self.assertStatus(401)
+
+    def test_token_delete(self):
+        self.assertStatus(200)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.token.delete()
+        self.assertStatus(401)
+
+    def test_password_change(self):
+        self.assertStatus(200)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/api/users/set_password/', {
+                'current_password': 'password',
+                'new_password': 'new-password-2024'
+            })
+        self.assertEqual(response.status_code, 204)
+        self.assertStatus(401)
+
+    def test_deactivated(self):
+        self.assertStatus(200)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.is_active = False
+            self.user.save()
+        self.assertStatus(401)
+
+    def test_other_worker(self):
+        # Другой процесс уже закэшировал токен в своей памяти и не
+        # узнает о выходе до истечения AUTH_TOKEN_LOCAL_TIMEOUT.
+        other_worker = LocalTokenCache(10, settings.AUTH_TOKEN_LOCAL_TIMEOUT)
+        now = time.monotonic()
+        with mock.patch('api.authentication.local_tokens', other_worker):
+            self.assertStatus(200)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.token.delete()
+        with mock.patch('api.authentication.local_tokens', other_worker):
+            with mock.patch('time.monotonic', return_value=(
+                now + settings.AUTH_TOKEN_LOCAL_TIMEOUT - 1
+            )):
+                self.assertStatus(200)
+            with mock.patch('time.monotonic', return_value=(
+                now + settings.AUTH_TOKEN_LOCAL_TIMEOUT + 1
+            )):
+                self.assertStatus(401)
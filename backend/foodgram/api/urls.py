@@ -1,16 +1,33 @@
+from django.conf import settings
 from django.urls import path, include
 from rest_framework.routers import SimpleRouter
 
 from api_recipes.views import IngredientViewSet, RecipeController
-from api_user.views import CustomUserViewSet
+from api_user.views import CustomUserViewSet, ExpiringTokenCreateView
+from .async_views import async_urlpatterns
+from .views import MetricsView
+
+ASYNC_ROUTES = (
+    'ingredient-list', 'ingredient-detail', 'culinaryrecipe-detail'
+)
 
 router = SimpleRouter()
 router.register('ingredients', IngredientViewSet)
 router.register('recipes', RecipeController)
 router.register('users', CustomUserViewSet)
 
+router_urls = router.urls
+if settings.SERVER_MODE == 'asgi':
+    router_urls = async_urlpatterns(router_urls, ASYNC_ROUTES)
+
 urlpatterns = [
-    path('', include(router.urls)),
+    path('metrics', MetricsView.as_view(), name='metrics'),
+    path('', include(router_urls)),
     path('', include('djoser.urls')),
+    path(
+        'auth/token/login/',
+        ExpiringTokenCreateView.as_view(),
+        name='login'
+    ),
     path('auth/', include('djoser.urls.authtoken'))
 ]
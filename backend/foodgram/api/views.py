@@ -1,25 +1,56 @@
-from django.http import Http404
-from django.shortcuts import get_object_or_404
-from django.views.generic.base import RedirectView
+import hmac
 
-from core.models import CulinaryRecipe
+from django.conf import settings
+from django.http import Http404, HttpResponse, HttpResponseForbidden
+from django.views.generic.base import RedirectView, View
+
+from core import short_links
+
+from .metrics import render_prometheus
 
 
 class ShortRedirectView(RedirectView):
     """
     Обработчик редиректа для коротких ссылок рецептов.
 
-    Конвертирует HEX-идентификатор в числовой ID рецепта и перенаправляет
-    на полную страницу рецепта. Если рецепт не найден - перенаправляет на 404.
+    Декодирует код ссылки (base62, для ссылок старого формата - HEX) в
+    ID рецепта и перенаправляет на полную страницу рецепта. Существование
+    рецепта проверяется по битовой карте id в памяти процесса, без
+    запроса к БД. Если рецепт не найден - перенаправляет на 404.
     """
 
     permanent = False
+    legacy = False
 
     def get_redirect_url(self, short_link):
         """Генерация URL для перенаправления."""
-        try:
-            recipe_id = int(short_link, 16)
-            get_object_or_404(CulinaryRecipe, id=recipe_id)
-            return f'/recipes/{recipe_id}'
-        except (Http404, ValueError):
+        recipe_id = (
+            short_links.decode_hex(short_link) if self.legacy
+            else short_links.decode(short_link)
+        )
+        if recipe_id is None or recipe_id not in short_links.get_recipe_ids():
             return '/404'
+        return f'/recipes/{recipe_id}'
+
+
+class MetricsView(View):
+    """
+    Метрики всех воркеров в формате Prometheus.
+
+    Требуется заголовок Authorization: Bearer <METRICS_TOKEN>. Пока токен
+    не задан, эндпоинт отвечает 404: метрики раскрывают трафик по
+    маршрутам и устройство сервера.
+    """
+
+    def get(self, request):
+        if not settings.METRICS_TOKEN:
+            raise Http404
+        if not hmac.compare_digest(
+            request.headers.get('Authorization', ''),
+            f'Bearer {settings.METRICS_TOKEN}'
+        ):
+            return HttpResponseForbidden()
+        return HttpResponse(
+            render_prometheus(),
+            content_type='text/plain; version=0.0.4; charset=utf-8'
+        )
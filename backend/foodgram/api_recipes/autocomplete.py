@@ -0,0 +1,101 @@
+import bisect
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from django.db.models.functions import Upper
+
+from core import versions
+from core.catalog import get_catalog
+from core.models import Ingredient
+
+FIELDS = ('id', 'name', 'measurement_unit')
+
+
+class DatabaseAutocomplete:
+    """
+    Поиск ингредиентов по индексам PostgreSQL.
+
+    Совпадения по префиксу читаются по btree-индексу
+    UPPER(name) text_pattern_ops, совпадения по подстроке - по GIN-индексу
+    UPPER(name) gin_trgm_ops (см. миграцию core 0002).
+    """
+
+    def search(self, query, limit):
+        ingredients = Ingredient.objects.order_by(Upper('name'), 'id')
+        results = list(
+            ingredients.filter(name__istartswith=query).values(*FIELDS)[:limit]
+        )
+        if len(results) < limit:
+            results += ingredients.filter(
+                name__icontains=query
+            ).exclude(
+                name__istartswith=query
+            ).values(*FIELDS)[:limit - len(results)]
+        return results
+
+
+class CatalogAutocomplete:
+    """
+    Поиск ингредиентов по справочнику в памяти процесса.
+
+    Используется для SQLite, где нет подходящих индексов. Названия в
+    справочнике отсортированы, поэтому префикс ищется бинарным поиском,
+    подстрока - проходом по массиву имён.
+    """
+
+    def search(self, query, limit):
+        catalog = get_catalog()
+        keys = catalog.name_keys
+        query = query.lower()
+        ranks = []
+        rank = bisect.bisect_left(keys, query)
+        while (
+            rank < len(keys)
+            and len(ranks) < limit
+            and keys[rank].startswith(query)
+        ):
+            ranks.append(rank)
+            rank += 1
+        if len(ranks) < limit:
+            for rank, key in enumerate(keys):
+                if query in key and not key.startswith(query):
+                    ranks.append(rank)
+                    if len(ranks) == limit:
+                        break
+        return catalog.rows_by_name(ranks)
+
+
+_engines = {}
+
+
+def get_engine():
+    """Движок автодополнения для текущей СУБД."""
+    vendor = connection.vendor
+    if vendor not in _engines:
+        _engines[vendor] = (
+            DatabaseAutocomplete() if vendor == 'postgresql'
+            else CatalogAutocomplete()
+        )
+    return _engines[vendor]
+
+
+def autocomplete(query, limit=None):
+    """
+    Ингредиенты, подходящие под строку ввода.
+
+    Сначала идут совпадения по началу названия, затем по подстроке.
+    Число результатов ограничено, ответ кэшируется до изменения
+    справочника ингредиентов.
+    """
+    limit = limit or settings.INGREDIENT_AUTOCOMPLETE_LIMIT
+    query = query.strip()
+    version = versions.get_version(versions.INGREDIENTS)
+    digest = hashlib.md5(query.lower().encode()).hexdigest()
+    key = f'ingredients:autocomplete:{version}:{limit}:{digest}'
+    results = cache.get(key)
+    if results is None:
+        results = get_engine().search(query, limit)
+        cache.set(key, results, settings.CACHE_TIMEOUT)
+    return results
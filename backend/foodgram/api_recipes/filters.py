@@ -1,22 +1,7 @@
-from django_filters.filters import CharFilter, ChoiceFilter
+from django_filters.filters import ChoiceFilter
 from django_filters.rest_framework import FilterSet
 
-from core.models import Ingredient, CulinaryRecipe
-
-
-class IngredientSearchFilter(FilterSet):
-    """
-    Фильтр для поиска ингредиентов по частичному совпадению имени.
-    """
-
-    name = CharFilter(
-        field_name='name',
-        lookup_expr='icontains',
-    )
-
-    class Meta:
-        model = Ingredient
-        fields = ['name']
+from core.models import CulinaryRecipe
 
 
 class RecipeCustomFilter(FilterSet):
@@ -37,13 +22,27 @@ class RecipeCustomFilter(FilterSet):
         method='filter_is_in_shopping_cart',
         label='Is in shopping cart'
     )
+    ORDERINGS = {
+        'popular': ('-favorites_count', '-cart_count', '-id'),
+        'trending': ('-trending_score', '-id'),
+    }
+    ordering = ChoiceFilter(
+        choices=[(name, name) for name in ORDERINGS],
+        method='filter_ordering',
+        label='Ordering'
+    )
+
+    @staticmethod
+    def is_checked(value):
+        """Флаг включён только значением 1, '0' - непустая строка."""
+        return str(value) in ('1', 'True')
 
     def filter_is_favorited(self, queryset, name, value):
         """
         Фильтрация рецептов, добавленных в избранное текущим пользователем.
         """
         user = self.request.user
-        if value and user.is_authenticated:
+        if self.is_checked(value) and user.is_authenticated:
             return queryset.filter(users_in_favorite__user=user)
         return queryset
 
@@ -51,14 +50,22 @@ class RecipeCustomFilter(FilterSet):
         """
         Фильтрация рецептов, добавленных в корзину текущим пользователем."""
         user = self.request.user
-        if value and user.is_authenticated:
+        if self.is_checked(value) and user.is_authenticated:
             return queryset.filter(users_in_shopcart__user=user)
         return queryset
 
+    def filter_ordering(self, queryset, name, value):
+        """
+        Сортировка по популярности (избранное и корзины за всё время)
+        или по трендам (то же за последние TRENDING_WINDOW_DAYS дней).
+        """
+        return queryset.order_by(*self.ORDERINGS[value])
+
     class Meta:
         model = CulinaryRecipe
         fields = [
             'author',
             'is_favorited',
-            'is_in_shopping_cart'
+            'is_in_shopping_cart',
+            'ordering'
         ]
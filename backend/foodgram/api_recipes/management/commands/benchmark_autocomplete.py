@@ -0,0 +1,82 @@
+import json
+import statistics
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import override_settings
+
+from core.models import Ingredient
+
+from api_recipes.autocomplete import autocomplete, get_engine
+
+# Синтетические данные откатываются, поэтому всё, что построено по ним,
+# кэшируется в памяти процесса и пропадает вместе с ним, а не попадает
+# в общий кэш.
+BENCHMARK_CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'benchmark'
+    }
+}
+QUERIES = ['м', 'мо', 'мол', 'молоко', 'сыр', 'ко', 'перец', 'ова', 'ян']
+
+
+class Command(BaseCommand):
+    help = (
+        'Замер скорости автодополнения ингредиентов на синтетическом '
+        'справочнике. Данные создаются в транзакции и откатываются.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=100_000)
+        parser.add_argument('--repeat', type=int, default=50)
+
+    def handle(self, *args, **options):
+        with override_settings(CACHES=BENCHMARK_CACHES), transaction.atomic():
+            self._seed(options['rows'])
+            engine = get_engine()
+            self.stdout.write(
+                f'{type(engine).__name__} ({connection.vendor}), '
+                f'{Ingredient.objects.count()} ингредиентов'
+            )
+            engine.search(QUERIES[0], 1)
+            for query in QUERIES:
+                timings = []
+                for _ in range(options['repeat']):
+                    start = time.perf_counter()
+                    results = engine.search(
+                        query, settings.INGREDIENT_AUTOCOMPLETE_LIMIT
+                    )
+                    timings.append((time.perf_counter() - start) * 1000)
+                start = time.perf_counter()
+                autocomplete(query)
+                autocomplete(query)
+                cached = (time.perf_counter() - start) * 1000 / 2
+                self.stdout.write(
+                    f'{query!r:12} найдено {len(results):3} '
+                    f'p50 {statistics.median(timings):7.2f} мс '
+                    f'max {max(timings):7.2f} мс '
+                    f'кэш {cached:6.2f} мс'
+                )
+            transaction.set_rollback(True)
+
+    def _seed(self, rows):
+        path = settings.BASE_DIR.parent / 'data' / 'ingredients.json'
+        with open(path, encoding='utf-8') as file:
+            catalog = json.load(file)
+        batch = []
+        for number in range(rows):
+            item = catalog[number % len(catalog)]
+            batch.append(Ingredient(
+                name=f"{item['name']} {number // len(catalog)}",
+                measurement_unit=item['measurement_unit']
+            ))
+            if len(batch) == 5000:
+                Ingredient.objects.bulk_create(batch)
+                batch = []
+        Ingredient.objects.bulk_create(batch)
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute('ANALYZE core_ingredient')
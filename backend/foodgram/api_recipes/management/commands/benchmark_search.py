@@ -0,0 +1,118 @@
+import json
+import random
+import statistics
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import override_settings
+
+from core import search
+from core.models import CulinaryRecipe, Ingredient, RecipeIngredient, User
+
+# Синтетические данные откатываются, поэтому всё, что построено по ним,
+# кэшируется в памяти процесса и пропадает вместе с ним, а не попадает
+# в общий кэш.
+BENCHMARK_CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'benchmark'
+    }
+}
+QUERIES = [
+    'суп', 'курица', 'молоко', 'сырный соус', 'пирог с яблоками',
+    'томатный', 'картофель', 'шоколадный торт'
+]
+WORDS = [
+    'суп', 'салат', 'пирог', 'соус', 'торт', 'каша', 'рагу', 'запеканка',
+    'быстрый', 'домашний', 'острый', 'сладкий', 'томатный', 'сырный',
+    'шоколадный', 'овощной', 'куриный', 'рыбный', 'с', 'яблоками',
+    'картофелем', 'грибами', 'курица', 'молоко'
+]
+BATCH_SIZE = 5000
+
+
+class Command(BaseCommand):
+    help = (
+        'Замер скорости полнотекстового поиска рецептов на синтетическом '
+        'корпусе. Данные создаются в транзакции и откатываются.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--recipes', type=int, default=100_000)
+        parser.add_argument('--repeat', type=int, default=20)
+
+    def handle(self, *args, **options):
+        with override_settings(CACHES=BENCHMARK_CACHES), transaction.atomic():
+            start = time.perf_counter()
+            self._seed(options['recipes'])
+            search.rebuild_index()
+            self.stdout.write(
+                f'{connection.vendor}: {options["recipes"]} рецептов, '
+                f'подготовка {time.perf_counter() - start:.1f} с'
+            )
+            for query in QUERIES:
+                timings = []
+                for _ in range(options['repeat']):
+                    start = time.perf_counter()
+                    ranked = search.rank_recipes(query)
+                    timings.append((time.perf_counter() - start) * 1000)
+                search.search_recipes(query)
+                start = time.perf_counter()
+                search.search_recipes(query)
+                cached = (time.perf_counter() - start) * 1000
+                self.stdout.write(
+                    f'{query!r:20} найдено {len(ranked):4} '
+                    f'p50 {statistics.median(timings):7.2f} мс '
+                    f'max {max(timings):7.2f} мс '
+                    f'кэш {cached:6.2f} мс'
+                )
+            transaction.set_rollback(True)
+
+    def _seed(self, count):
+        path = settings.BASE_DIR.parent / 'data' / 'ingredients.json'
+        with open(path, encoding='utf-8') as file:
+            names = [item['name'] for item in json.load(file)]
+        author = User.objects.create(
+            email='benchmark@example.com',
+            username='benchmark',
+            first_name='benchmark',
+            last_name='benchmark'
+        )
+        # Справочник может быть уже загружен.
+        Ingredient.objects.bulk_create(
+            (Ingredient(name=name, measurement_unit='г') for name in names),
+            ignore_conflicts=True
+        )
+        ingredients = list(
+            Ingredient.objects.filter(name__in=names, measurement_unit='г')
+        )
+        generator = random.Random(0)
+        for offset in range(0, count, BATCH_SIZE):
+            recipes = CulinaryRecipe.objects.bulk_create(
+                CulinaryRecipe(
+                    author=author,
+                    name=' '.join(generator.sample(WORDS, 3)),
+                    text=' '.join(generator.choices(WORDS + names, k=30)),
+                    image='recipes/benchmark.png',
+                    cooking_time=generator.randint(5, 120)
+                )
+                for _ in range(min(BATCH_SIZE, count - offset))
+            )
+            if not recipes[0].pk:
+                recipes = CulinaryRecipe.objects.filter(
+                    author=author
+                ).order_by('-id')[:len(recipes)]
+            RecipeIngredient.objects.bulk_create(
+                RecipeIngredient(
+                    recipe=recipe,
+                    ingredient=ingredient,
+                    amount=1
+                )
+                for recipe in recipes
+                for ingredient in generator.sample(ingredients, 3)
+            )
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute('ANALYZE core_culinaryrecipe')
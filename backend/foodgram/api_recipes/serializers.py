@@ -1,7 +1,16 @@
-from drf_extra_fields import fields as drf_fields
+from django.db import transaction
 from rest_framework import serializers
 
+from api.fields import (
+    IdListField,
+    ImageVariantsField,
+    StreamingBase64ImageField
+)
+from api.metrics import TimedSerializerMixin
 from api_user.serializers import CustomUserSerializer
+from core import search, shopping_lists
+from core.catalog import get_catalog
+from core.counters import change_counter
 from core.models import (
     UserFavoriteRecipe,
     Ingredient,
@@ -12,7 +21,9 @@ from core.models import (
 )
 
 
-class IngredientSerializer(serializers.ModelSerializer):
+class IngredientSerializer(
+    TimedSerializerMixin, serializers.ModelSerializer
+):
     """Сериализатор для ингредиентов."""
     class Meta:
         model = Ingredient
@@ -46,9 +57,8 @@ class IngredientInRecipeSerializer(serializers.ModelSerializer):
 
 
 class CreateIngredientInRecipeSerializer(serializers.ModelSerializer):
-    id = serializers.PrimaryKeyRelatedField(
-        source='ingredient',
-        queryset=Ingredient.objects.all()
+    id = serializers.IntegerField(
+        source='ingredient_id'
     )
     amount = serializers.IntegerField(
         min_value=1
@@ -62,7 +72,9 @@ class CreateIngredientInRecipeSerializer(serializers.ModelSerializer):
         ]
 
 
-class RecipeDetailSerializer(serializers.ModelSerializer):
+class RecipeDetailSerializer(
+    TimedSerializerMixin, serializers.ModelSerializer
+):
     author = CustomUserSerializer()
     ingredients = IngredientInRecipeSerializer(
         source='ingredient_amounts',
@@ -74,8 +86,14 @@ class RecipeDetailSerializer(serializers.ModelSerializer):
     is_in_shopping_cart = serializers.SerializerMethodField(
         method_name='get_is_in_shopping_cart'
     )
+    image_variants = ImageVariantsField(
+        source='image'
+    )
 
     def get_is_favorited(self, obj):
+        annotated = getattr(obj, 'is_favorited', None)
+        if annotated is not None:
+            return annotated
         user = self.context.get('request').user
         if user:
             return user.is_authenticated and UserFavoriteRecipe.objects.filter(
@@ -85,6 +103,9 @@ class RecipeDetailSerializer(serializers.ModelSerializer):
         return False
 
     def get_is_in_shopping_cart(self, obj):
+        annotated = getattr(obj, 'is_in_shopping_cart', None)
+        if annotated is not None:
+            return annotated
         user = self.context.get('request').user
         if user:
             return user.is_authenticated and UserShoppingCart.objects.filter(
@@ -93,6 +114,12 @@ class RecipeDetailSerializer(serializers.ModelSerializer):
             ).exists()
         return False
 
+    def to_representation(self, instance):
+        annotated = getattr(instance, 'is_author_subscribed', None)
+        if annotated is not None:
+            instance.author.is_subscribed = annotated
+        return super().to_representation(instance)
+
     class Meta:
         model = CulinaryRecipe
         fields = [
@@ -101,6 +128,7 @@ class RecipeDetailSerializer(serializers.ModelSerializer):
             'ingredients',
             'name',
             'image',
+            'image_variants',
             'text',
             'cooking_time',
             'is_favorited',
@@ -108,11 +136,13 @@ class RecipeDetailSerializer(serializers.ModelSerializer):
         ]
 
 
-class RecipeCreateUpdateSerializer(serializers.ModelSerializer):
+class RecipeCreateUpdateSerializer(
+    TimedSerializerMixin, serializers.ModelSerializer
+):
     ingredients = CreateIngredientInRecipeSerializer(
         many=True
     )
-    image = drf_fields.Base64ImageField()
+    image = StreamingBase64ImageField()
 
     class Meta:
         model = CulinaryRecipe
@@ -136,53 +166,130 @@ class RecipeCreateUpdateSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError(
                 'Необходимо добавить хотя бы один ингредиент.'
             )
-        ingredient_ids = [item['ingredient'].id for item in ingredients]
+        ingredient_ids = [item['ingredient_id'] for item in ingredients]
         if len(ingredient_ids) != len(set(ingredient_ids)):
             raise serializers.ValidationError(
                 'Ингредиенты должны быть уникальны.'
             )
+        catalog = get_catalog()
+        unknown_ids = {
+            ingredient_id for ingredient_id in ingredient_ids
+            if ingredient_id not in catalog
+        }
+        if unknown_ids:
+            unknown_ids -= set(
+                Ingredient.objects.filter(
+                    id__in=unknown_ids
+                ).values_list('id', flat=True)
+            )
+        if unknown_ids:
+            raise serializers.ValidationError(
+                'Ингредиенты не найдены: '
+                f'{", ".join(map(str, sorted(unknown_ids)))}.'
+            )
         return ingredients
 
-    def _create_recipe_ingredients(self, recipe, ingredients_data):
-        ingredients = [
+    def _save_recipe_ingredients(self, recipe, ingredients_data):
+        """
+        Приведение ингредиентов рецепта к новому списку.
+
+        Старые строки сравниваются с новыми: изменённые количества
+        обновляются одним bulk_update, лишние строки удаляются одним
+        запросом, новые добавляются одним bulk_create. Число
+        ингредиентов меняется только через F(): удаление уменьшает его
+        сигналами, добавление - одним UPDATE. Так же и со списками
+        покупок тех, у кого рецепт в корзине: удалённые строки вычитают
+        сигналы, разница по остальным прибавляется одним запросом.
+        """
+        amounts = {
+            item['ingredient_id']: item['amount'] for item in ingredients_data
+        }
+        deltas = dict(amounts)
+        changed = []
+        removed = []
+        for recipe_ingredient in recipe.ingredient_amounts.all():
+            amount = amounts.pop(recipe_ingredient.ingredient_id, None)
+            if amount is None:
+                removed.append(recipe_ingredient.id)
+                continue
+            deltas[recipe_ingredient.ingredient_id] -= recipe_ingredient.amount
+            if amount != recipe_ingredient.amount:
+                recipe_ingredient.amount = amount
+                changed.append(recipe_ingredient)
+        if changed:
+            RecipeIngredient.objects.bulk_update(changed, ['amount'])
+        if removed:
+            RecipeIngredient.objects.filter(id__in=removed).delete()
+        if amounts:
+            RecipeIngredient.objects.bulk_create(
+                RecipeIngredient(
+                    recipe=recipe,
+                    ingredient_id=ingredient_id,
+                    amount=amount
+                )
+                for ingredient_id, amount in amounts.items()
+            )
+            # bulk_create не вызывает сигналы, удаление выше их вызывает.
+            change_counter(
+                CulinaryRecipe, recipe.pk, 'ingredients_count', len(amounts)
+            )
+        shopping_lists.change_recipe(recipe.pk, deltas)
+
+    @transaction.atomic
+    def create(self, validated_data):
+        ingredients_data = validated_data.pop('ingredients')
+        recipe = CulinaryRecipe.objects.create(
+            **validated_data,
+            ingredients_count=len(ingredients_data)
+        )
+        RecipeIngredient.objects.bulk_create(
             RecipeIngredient(
                 recipe=recipe,
-                ingredient=item['ingredient'],
+                ingredient_id=item['ingredient_id'],
                 amount=item['amount']
             )
             for item in ingredients_data
-        ]
-        return RecipeIngredient.objects.bulk_create(ingredients)
-
-    def create(self, validated_data):
-        ingredients_data = validated_data.pop('ingredients')
-        recipe = CulinaryRecipe.objects.create(**validated_data)
-        self._create_recipe_ingredients(recipe, ingredients_data)
+        )
+        # bulk_create не вызывает сигналы, индекс пересчитывается здесь.
+        search.index_recipes([recipe.pk])
         return recipe
 
+    @transaction.atomic
     def update(self, instance, validated_data):
         ingredients_data = self.validate_ingredients(
             validated_data.pop('ingredients', None)
         )
-        if ingredients_data is not None:
-            instance.ingredient_amounts.all().delete()
-            self._create_recipe_ingredients(instance, ingredients_data)
+        self._save_recipe_ingredients(instance, ingredients_data)
+        # Индекс пересчитывает сигнал сохранения рецепта.
         return super().update(instance, validated_data)
 
     def to_representation(self, instance):
+        instance = (
+            CulinaryRecipe.objects
+            .with_related()
+            .with_user_flags(self.context['request'].user)
+            .get(pk=instance.pk)
+        )
         return RecipeDetailSerializer(
             instance,
             context=self.context
         ).data
 
 
-class RecipeSummarySerializer(serializers.ModelSerializer):
+class RecipeSummarySerializer(
+    TimedSerializerMixin, serializers.ModelSerializer
+):
+    image_variants = ImageVariantsField(
+        source='image'
+    )
+
     class Meta:
         model = CulinaryRecipe
         fields = [
             'id',
             'name',
             'image',
+            'image_variants',
             'cooking_time'
         ]
 
@@ -191,9 +298,6 @@ class UserSubscriptionSerializer(CustomUserSerializer):
     recipes = serializers.SerializerMethodField(
         method_name='get_recipes'
     )
-    recipes_count = serializers.ReadOnlyField(
-        source='recipes.count'
-    )
 
     class Meta:
         model = User
@@ -205,17 +309,28 @@ class UserSubscriptionSerializer(CustomUserSerializer):
             'last_name',
             'is_subscribed',
             'avatar',
+            'avatar_variants',
             'recipes',
             'recipes_count'
         ]
 
+    @staticmethod
+    def get_recipes_limit(request):
+        recipes_limit = request.query_params.get('recipes_limit')
+        if recipes_limit and recipes_limit.isdigit():
+            return int(recipes_limit)
+        return None
+
     def get_recipes(self, obj):
         request = self.context.get('request')
-        query_params = request.query_params
-        recipes = obj.recipes.all()
-        recipes_limit = query_params.get('recipes_limit')
-        if recipes_limit and recipes_limit.isdigit():
-            recipes = recipes[:int(recipes_limit)]
+        recipes_by_author = self.context.get('recipes_by_author')
+        if recipes_by_author is not None:
+            recipes = recipes_by_author.get(obj.id, [])
+        else:
+            recipes = obj.recipes.all()
+            recipes_limit = self.get_recipes_limit(request)
+            if recipes_limit is not None:
+                recipes = recipes[:recipes_limit]
         return RecipeSummarySerializer(
             recipes,
             context={'request': request},
@@ -223,7 +338,9 @@ class UserSubscriptionSerializer(CustomUserSerializer):
         ).data
 
 
-class FavoriteSerializer(serializers.ModelSerializer):
+class FavoriteSerializer(
+    TimedSerializerMixin, serializers.ModelSerializer
+):
     class Meta:
         model = UserFavoriteRecipe
         fields = [
@@ -232,10 +349,17 @@ class FavoriteSerializer(serializers.ModelSerializer):
         ]
 
 
-class ShoppingCartSerializer(serializers.ModelSerializer):
+class ShoppingCartSerializer(
+    TimedSerializerMixin, serializers.ModelSerializer
+):
     class Meta:
         model = UserShoppingCart
         fields = [
             'user',
             'recipe'
         ]
+
+
+class RecipeIdsSerializer(serializers.Serializer):
+    """Id рецептов для пакетных действий с избранным и корзиной."""
+    recipes = IdListField()
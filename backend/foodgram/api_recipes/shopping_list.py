@@ -0,0 +1,171 @@
+import csv
+import json
+from io import BytesIO
+
+from django.conf import settings
+
+from core import shopping_lists
+from core.catalog import get_catalog
+
+
+def shopping_list_items(user):
+    """
+    Ингредиенты списка покупок пользователя с количествами.
+
+    Количества читаются из сводного списка одним запросом по индексу
+    (user, ingredient): список обновляется при изменении корзины, а не
+    пересчитывается при каждом чтении. Названия и единицы измерения
+    берутся из справочника в памяти процесса, он же задаёт порядок по
+    названию.
+    """
+    amounts = shopping_lists.get_amounts(user)
+    catalog = get_catalog()
+    if any(ingredient_id not in catalog for ingredient_id in amounts):
+        catalog = get_catalog(refresh=True)
+    for ingredient_id in sorted(amounts, key=catalog.name_rank):
+        yield catalog.get(ingredient_id), amounts[ingredient_id]
+
+
+def aggregate_shopping_list(user):
+    """Строки списка покупок для выгрузки в файл."""
+    for ingredient, amount in shopping_list_items(user):
+        yield {
+            'name': ingredient['name'],
+            'unit': ingredient['measurement_unit'],
+            'amount': amount
+        }
+
+
+class Echo:
+    """Псевдо-буфер для csv.writer: возвращает записанную строку."""
+
+    def write(self, value):
+        return value
+
+
+class ShoppingListRenderer:
+    """Базовый генератор файла списка покупок."""
+
+    extension = None
+    content_type = None
+
+    def is_available(self):
+        return True
+
+    def render(self, items):
+        raise NotImplementedError
+
+
+class TextRenderer(ShoppingListRenderer):
+    extension = 'txt'
+    content_type = 'text/plain; charset=utf-8'
+
+    def render(self, items):
+        yield 'Список покупок:\n'
+        is_empty = True
+        for item in items:
+            prefix = '' if is_empty else '\n'
+            is_empty = False
+            yield f"{prefix}{item['name']} - {item['amount']} ({item['unit']})"
+        if is_empty:
+            yield 'Ваша корзина пуста'
+
+
+class CSVRenderer(ShoppingListRenderer):
+    extension = 'csv'
+    content_type = 'text/csv; charset=utf-8'
+
+    def render(self, items):
+        writer = csv.writer(Echo())
+        yield writer.writerow(['Ингредиент', 'Количество', 'Единица'])
+        for item in items:
+            yield writer.writerow([item['name'], item['amount'], item['unit']])
+
+
+class JSONRenderer(ShoppingListRenderer):
+    extension = 'json'
+    content_type = 'application/json'
+
+    def render(self, items):
+        yield '['
+        separator = ''
+        for item in items:
+            yield separator + json.dumps(item, ensure_ascii=False)
+            separator = ','
+        yield ']'
+
+
+class PDFRenderer(ShoppingListRenderer):
+    """
+    PDF-версия списка покупок.
+
+    Требует пакет reportlab; он импортируется только при запросе PDF.
+    Для кириллицы нужен TTF-шрифт из настройки SHOPPING_LIST_PDF_FONT.
+
+    В отличие от остальных форматов, PDF не потоковый: reportlab пишет
+    файл только в save(), поэтому документ целиком собирается в памяти
+    и затем отдаётся частями. Список покупок агрегирован по
+    ингредиентам, так что его размер ограничен справочником.
+    """
+
+    extension = 'pdf'
+    content_type = 'application/pdf'
+    font_name = 'ShoppingListFont'
+
+    def is_available(self):
+        try:
+            import reportlab  # noqa: F401
+        except ImportError:
+            return False
+        return True
+
+    def render(self, items):
+        from reportlab.lib.pagesizes import A4
+        from reportlab.pdfbase import pdfmetrics
+        from reportlab.pdfbase.ttfonts import TTFont
+        from reportlab.pdfgen import canvas
+
+        font = 'Helvetica'
+        font_path = getattr(settings, 'SHOPPING_LIST_PDF_FONT', None)
+        if font_path:
+            pdfmetrics.registerFont(TTFont(self.font_name, font_path))
+            font = self.font_name
+        buffer = BytesIO()
+        pdf = canvas.Canvas(buffer, pagesize=A4)
+        width, height = A4
+        line_height = 16
+        y = height - 50
+        pdf.setFont(font, 14)
+        pdf.drawString(50, y, 'Список покупок:')
+        pdf.setFont(font, 11)
+        for item in items:
+            y -= line_height
+            if y < 50:
+                pdf.showPage()
+                pdf.setFont(font, 11)
+                y = height - 50
+            pdf.drawString(
+                50, y, f"{item['name']} - {item['amount']} ({item['unit']})"
+            )
+        pdf.save()
+        buffer.seek(0)
+        yield from iter(lambda: buffer.read(64 * 1024), b'')
+
+
+RENDERERS = {
+    renderer.extension: renderer
+    for renderer in (
+        TextRenderer(),
+        CSVRenderer(),
+        JSONRenderer(),
+        PDFRenderer()
+    )
+}
+
+
+def get_renderer(file_format):
+    """Генератор для указанного формата или None, если он недоступен."""
+    renderer = RENDERERS.get(file_format)
+    if renderer is None or not renderer.is_available():
+        return None
+    return renderer
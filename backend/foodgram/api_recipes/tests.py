@@ -0,0 +1,824 @@
+import base64
+import os
+import shutil
+import tempfile
+import time
+from io import BytesIO, StringIO
+from unittest import mock, skipUnless
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.db import IntegrityError, connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils.http import http_date
+from PIL import Image
+from rest_framework.exceptions import ValidationError
+from rest_framework.test import APIClient
+
+from core import catalog, images, relations, versions
+from core.catalog import get_catalog
+from core.models import (
+    CulinaryRecipe,
+    Ingredient,
+    RecipeIngredient,
+    Subscription,
+    User,
+    UserFavoriteRecipe,
+    UserShoppingCart
+)
+from .autocomplete import autocomplete
+from .serializers import RecipeCreateUpdateSerializer
+
+TEST_CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'
+    }
+}
+
+
+def create_user(username):
+    return User.objects.create_user(
+        email=f'{username}@example.com',
+        username=username,
+        first_name=username,
+        last_name=username,
+        password='password'
+    )
+
+
+def create_recipe(author, name, ingredients=()):
+    recipe = CulinaryRecipe.objects.create(
+        author=author, name=name, text=name, cooking_time=10
+    )
+    RecipeIngredient.objects.bulk_create(
+        RecipeIngredient(recipe=recipe, ingredient=ingredient, amount=10)
+        for ingredient in ingredients
+    )
+    return recipe
+
+
+def create_feed(reader, authors=6, recipes_per_author=10, ingredients=3):
+    """
+    Авторы с рецептами, на которых подписан reader. Часть рецептов
+    в избранном и в корзине reader.
+    """
+    products = [
+        Ingredient.objects.create(
+            name=f'Продукт {number}', measurement_unit='г'
+        )
+        for number in range(ingredients)
+    ]
+    for author_number in range(authors):
+        author = create_user(f'author{author_number}')
+        Subscription.objects.create(user=reader, subscribed_to=author)
+        for number in range(recipes_per_author):
+            recipe = create_recipe(
+                author, f'Рецепт {author_number}-{number}', products
+            )
+            if number % 2:
+                UserFavoriteRecipe.objects.create(user=reader, recipe=recipe)
+            if number % 3:
+                UserShoppingCart.objects.create(user=reader, recipe=recipe)
+
+
+class QueryCountMixin:
+    """
+    Число запросов к БД на один запрос к API при пустом кэше ответов,
+    то есть с построением ответа и множеств id пользователя. Версии
+    данных в кэше: из БД они читаются только после вытеснения.
+    """
+
+    def count_queries(self, user, url):
+        cache.clear()
+        for namespace in (
+            versions.INGREDIENTS, versions.RECIPES, versions.USERS
+        ):
+            versions.get_version(namespace)
+        client = APIClient()
+        if user is not None:
+            client.force_authenticate(user)
+        with CaptureQueriesContext(connection) as queries:
+            response = client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+
+@override_settings(CACHES=TEST_CACHES)
+class IngredientCatalogTests(TestCase):
+    """Справочник ингредиентов отдаётся из памяти процесса."""
+
+    def setUp(self):
+        cache.clear()
+        self.salt, self.sea_salt, self.beans, self.sugar = (
+            Ingredient.objects.create(name=name, measurement_unit='г')
+            for name in ('Соль', 'соль морская', 'Фасоль', 'Сахар')
+        )
+        get_catalog(refresh=True)
+        # После отката транзакции теста версия справочника в БД
+        # повторится, а названия за теми же id будут другими.
+        self.addCleanup(setattr, catalog, '_catalog', None)
+        self.client = APIClient()
+
+    def test_list_and_retrieve(self):
+        self.client.get('/api/ingredients/')
+        with self.assertNumQueries(0):
+            response = self.client.get('/api/ingredients/')
+        self.assertEqual(
+            [item['id'] for item in response.json()],
+            [self.salt.id, self.sea_salt.id, self.beans.id, self.sugar.id]
+        )
+        with self.assertNumQueries(0):
+            response = self.client.get(f'/api/ingredients/{self.sugar.id}/')
+        self.assertEqual(response.json(), {
+            'id': self.sugar.id, 'name': 'Сахар', 'measurement_unit': 'г'
+        })
+        for pk in (self.sugar.id + 100, 'abc'):
+            with self.subTest(pk=pk):
+                response = self.client.get(f'/api/ingredients/{pk}/')
+                self.assertEqual(response.status_code, 404)
+
+    def test_autocomplete(self):
+        response = self.client.get('/api/ingredients/', {'name': ' СОЛЬ '})
+        # Сначала совпадения по началу названия, затем по подстроке.
+        self.assertEqual(
+            [item['name'] for item in response.json()],
+            ['Соль', 'соль морская', 'Фасоль']
+        )
+        self.assertEqual(
+            self.client.get('/api/ingredients/', {'name': 'мёд'}).json(), []
+        )
+        self.assertEqual(len(autocomplete('с', limit=2)), 2)
+
+    def test_invalidation(self):
+        version = get_catalog().version
+        with self.captureOnCommitCallbacks(execute=True):
+            honey = Ingredient.objects.create(name='Мёд', measurement_unit='г')
+        self.assertNotEqual(get_catalog().version, version)
+        self.assertIn(honey.id, get_catalog())
+        response = self.client.get('/api/ingredients/', {'name': 'мёд'})
+        self.assertEqual([item['id'] for item in response.json()], [honey.id])
+
+    def test_validation(self):
+        serializer = RecipeCreateUpdateSerializer()
+        # Ингредиент, добавленный в обход сигналов, ищется в БД.
+        Ingredient.objects.bulk_create([
+            Ingredient(name='Мёд', measurement_unit='г')
+        ])
+        honey = Ingredient.objects.get(name='Мёд')
+        self.assertNotIn(honey.id, get_catalog())
+        items = [
+            {'ingredient_id': self.salt.id, 'amount': 1},
+            {'ingredient_id': honey.id, 'amount': 1}
+        ]
+        self.assertEqual(serializer.validate_ingredients(items), items)
+        for items, message in (
+            ([], 'хотя бы один'),
+            ([{'ingredient_id': self.salt.id, 'amount': 1}] * 2, 'уникальны'),
+            ([{'ingredient_id': honey.id + 100, 'amount': 1}],
+             f'не найдены: {honey.id + 100}.'),
+        ):
+            with self.subTest(items=items):
+                with self.assertRaisesMessage(ValidationError, message):
+                    serializer.validate_ingredients(items)
+
+
+@override_settings(CACHES=TEST_CACHES)
+class RecipeIngredientsWriteTests(TestCase):
+    """
+    Ингредиенты рецепта проверяются одним запросом и пишутся разницей,
+    число запросов не зависит от числа ингредиентов.
+    """
+
+    def setUp(self):
+        cache.clear()
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        settings_override = override_settings(MEDIA_ROOT=media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.author = create_user('author')
+        self.products = [
+            Ingredient.objects.create(
+                name=f'Продукт {number}', measurement_unit='г'
+            )
+            for number in range(45)
+        ]
+        # Справочник загружен: считаются только запросы записи.
+        get_catalog(refresh=True)
+        self.addCleanup(setattr, catalog, '_catalog', None)
+        self.client = APIClient()
+        self.client.force_authenticate(self.author)
+
+    def payload(self, products, amount=10):
+        buffer = BytesIO()
+        Image.new('RGB', (10, 10), 'red').save(buffer, 'PNG')
+        image = base64.b64encode(buffer.getvalue()).decode()
+        return {
+            'name': 'Рецепт',
+            'text': 'Описание',
+            'cooking_time': 10,
+            'image': f'data:image/png;base64,{image}',
+            'ingredients': [
+                {'id': product.id, 'amount': amount} for product in products
+            ]
+        }
+
+    def stored(self, recipe_id):
+        return {
+            row.ingredient_id: (row.pk, row.amount)
+            for row in RecipeIngredient.objects.filter(recipe_id=recipe_id)
+        }
+
+    def count_queries(self, method, url, data):
+        with CaptureQueriesContext(connection) as queries:
+            response = getattr(self.client, method)(url, data, format='json')
+        self.assertIn(response.status_code, (200, 201), response.content)
+        return len(queries), response
+
+    def test_create(self):
+        counts = []
+        for products in (self.products[:5], self.products[:40]):
+            count, response = self.count_queries(
+                'post', '/api/recipes/', self.payload(products)
+            )
+            counts.append(count)
+            self.assertEqual(
+                sorted(self.stored(response.data['id'])),
+                [product.id for product in products]
+            )
+        self.assertEqual(counts[0], counts[1])
+
+    def test_update_diff(self):
+        kept, changed, removed, added = self.products[:4]
+        recipe = create_recipe(self.author, 'Рецепт', [kept, changed, removed])
+        before = self.stored(recipe.id)
+        response = self.client.patch(f'/api/recipes/{recipe.id}/', {
+            'ingredients': [
+                {'id': kept.id, 'amount': 10},
+                {'id': changed.id, 'amount': 20},
+                {'id': added.id, 'amount': 5},
+            ]
+        }, format='json')
+        self.assertEqual(response.status_code, 200, response.content)
+        after = self.stored(recipe.id)
+        self.assertEqual(after[kept.id], before[kept.id])
+        self.assertEqual(after[changed.id], (before[changed.id][0], 20))
+        self.assertNotIn(removed.id, after)
+        self.assertEqual(after[added.id][1], 5)
+
+    def test_update_queries(self):
+        counts = []
+        for products in (self.products[:5], self.products[:40]):
+            recipe = create_recipe(self.author, 'Рецепт', products)
+            count, _ = self.count_queries(
+                'patch',
+                f'/api/recipes/{recipe.id}/',
+                {'ingredients': [
+                    {'id': product.id, 'amount': 20} for product in products
+                ]}
+            )
+            counts.append(count)
+            self.assertEqual(
+                {amount for _, amount in self.stored(recipe.id).values()},
+                {20}
+            )
+        self.assertEqual(counts[0], counts[1])
+
+    def test_errors(self):
+        recipe = create_recipe(self.author, 'Рецепт', self.products[:2])
+        before = self.stored(recipe.id)
+        unknown = self.products[-1].id + 100
+        for ingredients in (
+            [],
+            [{'id': self.products[0].id, 'amount': 1}] * 2,
+            [{'id': self.products[0].id, 'amount': 1},
+             {'id': unknown, 'amount': 1}],
+            [{'id': self.products[0].id, 'amount': 0}],
+        ):
+            with self.subTest(ingredients=ingredients):
+                response = self.client.patch(
+                    f'/api/recipes/{recipe.id}/',
+                    {'name': 'Новое название', 'ingredients': ingredients},
+                    format='json'
+                )
+                self.assertEqual(response.status_code, 400)
+                self.assertEqual(self.stored(recipe.id), before)
+        recipe.refresh_from_db()
+        self.assertEqual(recipe.name, 'Рецепт')
+        other = APIClient()
+        other.force_authenticate(create_user('other'))
+        response = other.patch(
+            f'/api/recipes/{recipe.id}/',
+            {'ingredients': [{'id': self.products[0].id, 'amount': 1}]},
+            format='json'
+        )
+        self.assertEqual(response.status_code, 403)
+        self.assertEqual(self.stored(recipe.id), before)
+
+
+@override_settings(CACHES=TEST_CACHES)
+class PersonalFiltersTests(TestCase):
+    """Выдача с is_favorited и is_in_shopping_cart не попадает в кэш."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = create_user('owner')
+        cls.other = create_user('other')
+        cls.recipes = [
+            create_recipe(cls.owner, f'Рецепт {number}')
+            for number in range(3)
+        ]
+        UserFavoriteRecipe.objects.create(
+            user=cls.owner, recipe=cls.recipes[0]
+        )
+        UserShoppingCart.objects.create(
+            user=cls.owner, recipe=cls.recipes[1]
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def get_ids(self, user, url):
+        client = APIClient()
+        if user is not None:
+            client.force_authenticate(user)
+        response = client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return sorted(recipe['id'] for recipe in response.json()['results'])
+
+    def test_personal_filters_are_not_shared(self):
+        all_ids = sorted(recipe.id for recipe in self.recipes)
+        for name, recipe in (
+            ('is_favorited', self.recipes[0]),
+            ('is_in_shopping_cart', self.recipes[1])
+        ):
+            for value, owner_ids, other_ids in (
+                ('1', [recipe.id], []),
+                ('0', all_ids, all_ids)
+            ):
+                url = f'/api/recipes/?{name}={value}'
+                with self.subTest(url=url):
+                    self.assertEqual(self.get_ids(self.owner, url), owner_ids)
+                    self.assertEqual(self.get_ids(self.other, url), other_ids)
+                    self.assertEqual(self.get_ids(None, url), all_ids)
+
+
+@override_settings(CACHES=TEST_CACHES)
+class ResponseCacheTests(TestCase):
+    """
+    Анонимные ответы читаются из общего кэша, ключ учитывает параметры
+    запроса, изменения данных делают старые ответы недоступными.
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.author = create_user('author')
+        self.salt = Ingredient.objects.create(
+            name='Соль', measurement_unit='г'
+        )
+        self.recipes = [
+            create_recipe(self.author, f'Рецепт {number}', [self.salt])
+            for number in range(3)
+        ]
+        self.client = APIClient()
+
+    def get(self, url, queries=None):
+        if queries is None:
+            response = self.client.get(url)
+        else:
+            with self.assertNumQueries(queries):
+                response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_hit(self):
+        # Для рецепта остаётся один запрос за полями ETag.
+        for url, queries in (
+            ('/api/recipes/', 0),
+            ('/api/recipes/?limit=1&page=2', 0),
+            (f'/api/recipes/{self.recipes[0].id}/', 1),
+        ):
+            with self.subTest(url=url):
+                expected = self.get(url)
+                self.assertEqual(self.get(url, queries), expected)
+
+    def test_key(self):
+        first = self.get('/api/recipes/?limit=1&page=1')
+        second = self.get('/api/recipes/?limit=1&page=2')
+        self.assertNotEqual(
+            first['results'][0]['id'], second['results'][0]['id']
+        )
+        # Порядок параметров не важен.
+        self.assertEqual(self.get('/api/recipes/?page=2&limit=1', 0), second)
+        other = create_user('other')
+        self.assertEqual(
+            self.get(f'/api/recipes/?author={self.author.id}')['count'], 3
+        )
+        self.assertEqual(
+            self.get(f'/api/recipes/?author={other.id}')['count'], 0
+        )
+
+    def test_invalidation(self):
+        url = f'/api/recipes/{self.recipes[0].id}/'
+        self.get('/api/recipes/')
+        self.get(url)
+        with self.captureOnCommitCallbacks(execute=True):
+            create_recipe(self.author, 'Новый рецепт')
+        self.assertEqual(self.get('/api/recipes/')['count'], 4)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.author.first_name = 'Автор'
+            self.author.save()
+        self.assertEqual(self.get(url)['author']['first_name'], 'Автор')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.salt.name = 'Соль морская'
+            self.salt.save()
+        self.assertEqual(
+            self.get(url)['ingredients'][0]['name'], 'Соль морская'
+        )
+
+    def test_shared_between_processes(self):
+        # Файловый кэш - замена Redis: ответ, сохранённый одним
+        # экземпляром кэша, читает другой, как другой воркер.
+        location = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, location, ignore_errors=True)
+        with override_settings(CACHES={'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': location
+        }}):
+            expected = self.get('/api/recipes/')
+            self.assertTrue(os.listdir(location))
+            self.assertEqual(self.get('/api/recipes/', queries=0), expected)
+
+
+@override_settings(CACHES=TEST_CACHES)
+class RecipeRelationsTests(TestCase):
+    """Одиночные и пакетные действия с избранным и корзиной."""
+
+    MODELS = {
+        'favorite': UserFavoriteRecipe,
+        'shopping_cart': UserShoppingCart
+    }
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.reader = create_user('reader')
+        author = create_user('author')
+        cls.recipes = [
+            create_recipe(author, f'Рецепт {number}') for number in range(5)
+        ]
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.reader)
+
+    def ids(self, model):
+        return set(
+            model.objects.filter(user=self.reader)
+            .values_list('recipe_id', flat=True)
+        )
+
+    def test_single(self):
+        recipe = self.recipes[0]
+        for kind, model in self.MODELS.items():
+            with self.subTest(kind=kind):
+                url = f'/api/recipes/{recipe.id}/{kind}/'
+                response = self.client.post(url)
+                self.assertEqual(response.status_code, 201)
+                self.assertEqual(response.json()['id'], recipe.id)
+                self.assertEqual(self.client.post(url).status_code, 400)
+                self.assertEqual(self.ids(model), {recipe.id})
+                self.assertEqual(self.client.delete(url).status_code, 204)
+                self.assertEqual(self.client.delete(url).status_code, 400)
+                self.assertEqual(self.ids(model), set())
+                self.assertEqual(
+                    self.client.post(
+                        f'/api/recipes/{self.recipes[-1].id + 1}/{kind}/'
+                    ).status_code,
+                    404
+                )
+                self.assertEqual(APIClient().post(url).status_code, 401)
+
+    def test_single_race(self):
+        # Одновременный повтор: вставка упала на уникальности - 400, не 500.
+        url = f'/api/recipes/{self.recipes[0].id}/favorite/'
+        with mock.patch.object(relations, 'add', side_effect=IntegrityError):
+            self.assertEqual(self.client.post(url).status_code, 400)
+
+    def test_bulk(self):
+        first, second = self.recipes[0].id, self.recipes[1].id
+        for kind, model in self.MODELS.items():
+            with self.subTest(kind=kind):
+                url = f'/api/recipes/{kind}/'
+                for _ in range(2):
+                    response = self.client.post(
+                        url, {'recipes': [first, second, first]},
+                        format='json'
+                    )
+                    self.assertEqual(response.status_code, 201)
+                    self.assertEqual(
+                        [recipe['id'] for recipe in response.json()],
+                        [first, second]
+                    )
+                self.assertEqual(self.ids(model), {first, second})
+                self.assertEqual(self.client.post(
+                    f'/api/recipes/{first}/{kind}/'
+                ).status_code, 400)
+                for _ in range(2):
+                    response = self.client.delete(
+                        url, {'recipes': [first, self.recipes[2].id]},
+                        format='json'
+                    )
+                    self.assertEqual(response.status_code, 204)
+                self.assertEqual(self.ids(model), {second})
+
+    def test_bulk_queries(self):
+        queries = []
+        for recipes in (self.recipes[:1], self.recipes):
+            self.client.delete(
+                '/api/recipes/favorite/',
+                {'recipes': [recipe.id for recipe in self.recipes]},
+                format='json'
+            )
+            with CaptureQueriesContext(connection) as context:
+                response = self.client.post(
+                    '/api/recipes/favorite/',
+                    {'recipes': [recipe.id for recipe in recipes]},
+                    format='json'
+                )
+            self.assertEqual(response.status_code, 201)
+            queries.append(len(context))
+        self.assertEqual(queries[0], queries[1])
+
+    def test_bulk_errors(self):
+        missing = self.recipes[-1].id + 1
+        for data in (
+            {},
+            {'recipes': []},
+            {'recipes': [0]},
+            {'recipes': ['x']},
+            {'recipes': 1},
+            {'recipes': list(range(1, settings.BULK_ACTION_LIMIT + 2))},
+            {'recipes': [self.recipes[0].id, missing]},
+        ):
+            with self.subTest(data=str(data)[:40]):
+                response = self.client.post(
+                    '/api/recipes/favorite/', data, format='json'
+                )
+                self.assertEqual(response.status_code, 400)
+                self.assertIn('recipes', response.json())
+        self.assertIn(str(missing), str(response.json()['recipes']))
+        self.assertEqual(self.ids(UserFavoriteRecipe), set())
+        self.assertEqual(
+            APIClient().post(
+                '/api/recipes/favorite/',
+                {'recipes': [self.recipes[0].id]},
+                format='json'
+            ).status_code,
+            401
+        )
+
+
+@override_settings(CACHES=TEST_CACHES)
+class RecipeQueryCountTests(QueryCountMixin, TestCase):
+    """Число запросов не зависит от размера страницы и рецепта."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.reader = create_user('reader')
+        create_feed(cls.reader)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_list(self):
+        for user, url, expected in (
+            (None, '/api/recipes/?limit={}', 3),
+            (self.reader, '/api/recipes/?limit={}', 6),
+            (self.reader, '/api/recipes/?is_favorited=1&limit={}', 3),
+        ):
+            for limit in (10, 50):
+                with self.subTest(user=user, url=url, limit=limit):
+                    self.assertEqual(
+                        self.count_queries(user, url.format(limit)), expected
+                    )
+
+    def test_detail(self):
+        products = [
+            Ingredient.objects.create(
+                name=f'Специя {number}', measurement_unit='г'
+            )
+            for number in range(20)
+        ]
+        for user, expected in ((None, 3), (self.reader, 6)):
+            for ingredients in (products[:1], products):
+                recipe = create_recipe(self.reader, 'Рецепт', ingredients)
+                with self.subTest(user=user, ingredients=len(ingredients)):
+                    self.assertEqual(
+                        self.count_queries(user, f'/api/recipes/{recipe.id}/'),
+                        expected
+                    )
+
+
+@override_settings(CACHES=TEST_CACHES)
+class ConditionalRequestTests(TestCase):
+    """ETag рецепта меняется вместе с любой частью ответа."""
+
+    def setUp(self):
+        cache.clear()
+        self.author = create_user('author')
+        self.reader = create_user('reader')
+        self.salt = Ingredient.objects.create(
+            name='Соль', measurement_unit='г'
+        )
+        self.recipe = create_recipe(self.author, 'Суп', [self.salt])
+        self.url = f'/api/recipes/{self.recipe.id}/'
+
+    def get(self, user=None, etag=None, **headers):
+        client = APIClient()
+        if user is not None:
+            client.force_authenticate(user)
+        if etag is not None:
+            headers['HTTP_IF_NONE_MATCH'] = etag
+        return client.get(self.url, **headers)
+
+    def test_not_modified(self):
+        response = self.get()
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('Last-Modified', response)
+        self.assertEqual(self.get(etag=response['ETag']).status_code, 304)
+
+    def test_modified(self):
+        for name, model, pk in (
+            ('recipe', CulinaryRecipe, self.recipe.pk),
+            ('author', User, self.author.pk),
+            ('ingredient', Ingredient, self.salt.pk),
+        ):
+            etag = self.get()['ETag']
+            time.sleep(0.001)
+            with self.captureOnCommitCallbacks(execute=True):
+                model.objects.get(pk=pk).save()
+            with self.subTest(changed=name):
+                response = self.get(etag=etag)
+                self.assertEqual(response.status_code, 200)
+                self.assertNotEqual(response['ETag'], etag)
+                # Даты изменения у ответа нет, If-Modified-Since не
+                # даёт 304 после изменения автора или ингредиента.
+                response = self.get(
+                    HTTP_IF_MODIFIED_SINCE=http_date(time.time() + 60)
+                )
+                self.assertEqual(response.status_code, 200)
+
+    def test_personalized(self):
+        response = self.get(self.reader)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('private', response['Cache-Control'])
+        etag = response['ETag']
+        self.assertEqual(self.get(self.reader, etag).status_code, 304)
+        self.assertEqual(self.get(etag=etag).status_code, 200)
+        self.assertEqual(self.get(self.author, etag).status_code, 200)
+        self.assertEqual(
+            self.get(self.reader, self.get()['ETag']).status_code, 200
+        )
+
+
+@override_settings(CACHES=TEST_CACHES)
+class ImageVariantsTests(TestCase):
+    """
+    Варианты создаются при сохранении и удаляются вместе с картинкой,
+    пока их нет, ссылки ведут на исходную картинку.
+    """
+
+    def setUp(self):
+        cache.clear()
+        images._ready.clear()
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        settings_override = override_settings(MEDIA_ROOT=media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.recipe = create_recipe(create_user('author'), 'Рецепт')
+
+    def save_image(self, name):
+        buffer = BytesIO()
+        Image.new('RGB', (800, 600), 'red').save(buffer, 'PNG')
+        return default_storage.save(name, ContentFile(buffer.getvalue()))
+
+    def get_variants(self):
+        cache.clear()
+        response = APIClient().get(f'/api/recipes/{self.recipe.id}/')
+        self.assertEqual(response.status_code, 200)
+        return response.json()['image_variants']
+
+    def set_image(self, name):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.recipe.image = name
+            self.recipe.save()
+        deadline = time.monotonic() + 10
+        while name in images._pending and time.monotonic() < deadline:
+            time.sleep(0.05)
+
+    def assertVariants(self, name, exist):
+        for variant in settings.IMAGE_VARIANTS:
+            self.assertEqual(
+                default_storage.exists(images.variant_name(name, variant)),
+                exist
+            )
+
+    def assertLinks(self, name, ready):
+        for variant, url in self.get_variants().items():
+            path = images.variant_name(name, variant) if ready else name
+            self.assertTrue(url.endswith(default_storage.url(path)), url)
+
+    def test_save(self):
+        name = self.save_image('recipes/first.png')
+        self.set_image(name)
+        self.assertVariants(name, True)
+        self.assertLinks(name, True)
+
+    def test_image_change(self):
+        first = self.save_image('recipes/first.png')
+        self.set_image(first)
+        second = self.save_image('recipes/second.png')
+        self.set_image(second)
+        self.assertVariants(first, False)
+        self.assertVariants(second, True)
+        self.assertLinks(second, True)
+
+    def test_delete(self):
+        name = self.save_image('recipes/first.png')
+        self.set_image(name)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.recipe.delete()
+        self.assertVariants(name, False)
+
+    def test_legacy_image(self):
+        name = self.save_image('recipes/legacy.png')
+        CulinaryRecipe.objects.filter(pk=self.recipe.pk).update(image=name)
+        # Чтение отдаёт исходную картинку и не ставит фоновых задач.
+        self.assertLinks(name, False)
+        self.assertFalse(images._pending)
+        self.assertVariants(name, False)
+        call_command('generate_image_variants', stdout=StringIO())
+        self.assertLinks(name, True)
+
+
+@override_settings(CACHES=TEST_CACHES)
+class ShoppingListDownloadTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.reader = create_user('reader')
+        products = [
+            Ingredient.objects.create(
+                name=f'Продукт {number}', measurement_unit='г'
+            )
+            for number in range(3)
+        ]
+        recipe = create_recipe(create_user('author'), 'Рецепт', products)
+        relations.add('shopping_cart', cls.reader.id, [recipe.id])
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.reader)
+
+    def download(self, file_format):
+        response = self.client.get(
+            '/api/recipes/download_shopping_cart/',
+            {'file_format': file_format}
+        )
+        self.assertEqual(response.status_code, 200)
+        return b''.join(response.streaming_content)
+
+    def assertPDF(self):
+        content = self.download('pdf')
+        self.assertTrue(content.startswith(b'%PDF'))
+        self.assertTrue(content.rstrip().endswith(b'%%EOF'))
+
+    def test_formats(self):
+        for file_format in ('txt', 'csv', 'json'):
+            with self.subTest(file_format=file_format):
+                self.assertIn('Продукт 0'.encode(), self.download(file_format))
+
+    @skipUnless(
+        settings.SHOPPING_LIST_PDF_FONT
+        and os.path.exists(settings.SHOPPING_LIST_PDF_FONT),
+        'шрифт SHOPPING_LIST_PDF_FONT не задан или не найден'
+    )
+    def test_pdf(self):
+        self.assertPDF()
+
+    @override_settings(SHOPPING_LIST_PDF_FONT=None)
+    def test_pdf_builtin_font(self):
+        self.assertPDF()
+
+    def test_unknown_format(self):
+        response = self.client.get(
+            '/api/recipes/download_shopping_cart/', {'file_format': 'doc'}
+        )
+        self.assertEqual(response.status_code, 400)
@@ -1,34 +1,48 @@
-from django.db.models import F, Sum
-from django.http import FileResponse
+from django.conf import settings
+from django.db import IntegrityError
+from django.http import Http404, StreamingHttpResponse
 from django.urls import reverse
 from django_filters.rest_framework import DjangoFilterBackend
 
 from rest_framework import permissions, status
 from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
 from rest_framework.response import Response
 from rest_framework.viewsets import ModelViewSet, ReadOnlyModelViewSet
 
-from core.models import (
-    UserFavoriteRecipe,
-    Ingredient,
-    RecipeIngredient,
-    CulinaryRecipe,
-    UserShoppingCart
-)
+from core import recipe_index, relations, search, short_links, versions
+from core.catalog import get_catalog
+from core.models import Ingredient, CulinaryRecipe
 
+from api.cache import CachedResponseMixin
 from api.pagination import CustomPageNumberPagination
 from api.permissions import IsOwnerOrReadOnly
-from .filters import IngredientSearchFilter, RecipeCustomFilter
+from .autocomplete import autocomplete
+from .filters import RecipeCustomFilter
 from .serializers import (
     IngredientSerializer,
     RecipeCreateUpdateSerializer,
     RecipeDetailSerializer,
+    RecipeIdsSerializer,
     RecipeSummarySerializer
 )
+from .shopping_list import (
+    aggregate_shopping_list,
+    get_renderer,
+    shopping_list_items
+)
 
 
-class RecipeController(ModelViewSet):
+class RecipeController(CachedResponseMixin, ModelViewSet):
     queryset = CulinaryRecipe.objects.all()
+    cache_namespaces = (
+        versions.RECIPES,
+        versions.USERS,
+        versions.INGREDIENTS
+    )
+    personalized = True
+    personal_filters = ('is_favorited', 'is_in_shopping_cart')
+    ranked_params = ('search', 'have_ingredients')
     serializer_class = RecipeDetailSerializer
     permission_classes = [
         permissions.IsAuthenticatedOrReadOnly,
@@ -38,6 +52,142 @@ class RecipeController(ModelViewSet):
     filter_backends = [DjangoFilterBackend]
     filterset_class = RecipeCustomFilter
 
+    def get_queryset(self):
+        user = self.request.user
+        if self.is_response_cacheable(self.request):
+            user = None
+        return (
+            super().get_queryset()
+            .with_related()
+            .with_user_flags(user)
+        )
+
+    def is_response_cacheable(self, request):
+        return super().is_response_cacheable(request) and not any(
+            name in request.query_params for name in self.personal_filters
+        )
+
+    def personalize(self, recipe, personal):
+        recipe['is_favorited'] = recipe['id'] in personal.favorites
+        recipe['is_in_shopping_cart'] = recipe['id'] in personal.shopping_cart
+        recipe['author']['is_subscribed'] = (
+            recipe['author']['id'] in personal.subscriptions
+        )
+
+    def get_validators(self, request, personal):
+        """
+        Для рецепта ETag строится по времени публикации и изменения,
+        версиям пользователей и ингредиентов, пользователю и его
+        персональным признакам, поэтому правка одного рецепта не меняет
+        ETag остальных, а 304 одного пользователя не подходит другому.
+        Last-Modified не отдаётся: версии автора и ингредиентов не
+        привязаны ко времени, и по одному updated рецепта клиент получил
+        бы 304 после изменения автора или ингредиента.
+        """
+        if self.action != 'retrieve':
+            return super().get_validators(request, personal)
+        pk = self.kwargs['pk']
+        row = pk.isdigit() and (
+            CulinaryRecipe.objects.filter(pk=pk)
+            .values_list('created', 'updated', 'author_id')
+            .first()
+        )
+        if not row:
+            return None, None
+        created, updated, author_id = row
+        recipe_id = int(pk)
+        etag = self.make_etag(
+            request.get_host(),
+            request.user.pk,
+            recipe_id,
+            created.timestamp(),
+            updated.timestamp(),
+            versions.get_version(versions.USERS),
+            versions.get_version(versions.INGREDIENTS),
+            recipe_id in personal.favorites,
+            recipe_id in personal.shopping_cart,
+            author_id in personal.subscriptions
+        )
+        return etag, None
+
+    def list(self, request, *args, **kwargs):
+        if not any(
+            request.query_params.get(name) for name in self.ranked_params
+        ):
+            return super().list(request, *args, **kwargs)
+        return self.cached_response(self.ranked_list, request)
+
+    def get_ranked_ids(self, request):
+        """
+        Id рецептов в порядке выдачи для поиска и подбора по продуктам.
+
+        При обоих параметрах порядок задаёт подбор по продуктам,
+        а поиск ограничивает набор рецептов.
+        """
+        params = request.query_params
+        ranked = None
+        if params.get('search'):
+            ranked = search.search_recipes(params['search'])
+        if params.get('have_ingredients'):
+            ingredient_ids, max_missing = self.parse_pantry(params)
+            matched = recipe_index.get_index().match(
+                ingredient_ids,
+                max_missing,
+                limit=None if ranked is not None else (
+                    settings.RECIPE_SEARCH_LIMIT
+                )
+            )
+            if ranked is not None:
+                found = set(ranked)
+                matched = [pk for pk in matched if pk in found]
+            ranked = matched
+        return ranked
+
+    @staticmethod
+    def parse_pantry(params):
+        try:
+            ingredient_ids = [
+                int(value)
+                for value in params['have_ingredients'].split(',')
+                if value.strip()
+            ]
+        except ValueError:
+            raise ValidationError(
+                {'have_ingredients': 'Укажите id ингредиентов через запятую.'}
+            )
+        try:
+            max_missing = int(params.get('max_missing', 0))
+        except ValueError:
+            max_missing = -1
+        if max_missing < 0:
+            raise ValidationError(
+                {'max_missing': 'Укажите целое неотрицательное число.'}
+            )
+        return ingredient_ids, max_missing
+
+    def ranked_list(self, request):
+        """
+        Выдача по готовому ранжированному списку id.
+
+        Страница нарезается из списка, рецепты страницы читаются одним
+        запросом. Остальные фильтры сужают список, сортировка задаётся
+        ранжированием.
+        """
+        queryset = self.filter_queryset(self.get_queryset())
+        ranked = self.get_ranked_ids(request)
+        if queryset.query.has_filters() and ranked:
+            allowed = set(
+                queryset.filter(id__in=ranked).values_list('id', flat=True)
+            )
+            ranked = [pk for pk in ranked if pk in allowed]
+        page_ids = self.paginate_queryset(ranked)
+        recipes = queryset.in_bulk(page_ids)
+        serializer = self.get_serializer(
+            [recipes[pk] for pk in page_ids if pk in recipes],
+            many=True
+        )
+        return self.get_paginated_response(serializer.data)
+
     def get_serializer_class(self):
         if self.action in ['create', 'update', 'partial_update']:
             return RecipeCreateUpdateSerializer
@@ -46,6 +196,64 @@ class RecipeController(ModelViewSet):
     def perform_create(self, serializer):
         serializer.save(author=self.request.user)
 
+    def change_relation(self, request, kind):
+        """
+        Добавление рецепта в избранное или корзину и удаление из них.
+
+        Повторное добавление и удаление отсутствующего рецепта дают 400,
+        в том числе при одновременных запросах: решение принимает
+        одна вставка или удаление в БД.
+        """
+        recipe = self.get_object()
+        change = relations.add if request.method == 'POST' else (
+            relations.remove
+        )
+        try:
+            changed = change(kind, request.user.id, [recipe.pk])
+        except IntegrityError:
+            changed = []
+        if not changed:
+            return Response(status=status.HTTP_400_BAD_REQUEST)
+        if request.method == 'DELETE':
+            return Response(status=status.HTTP_204_NO_CONTENT)
+        return Response(
+            RecipeSummarySerializer(recipe).data,
+            status=status.HTTP_201_CREATED
+        )
+
+    def change_relations(self, request, kind):
+        """
+        Пакетные добавление и удаление рецептов по списку id.
+
+        Действия идемпотентны: уже добавленные и отсутствующие рецепты
+        пропускаются. При добавлении возвращаются все рецепты списка.
+        """
+        serializer = RecipeIdsSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        recipe_ids = serializer.validated_data['recipes']
+        if request.method == 'DELETE':
+            relations.remove(kind, request.user.id, recipe_ids)
+            return Response(status=status.HTTP_204_NO_CONTENT)
+        recipes = CulinaryRecipe.objects.only(
+            'name', 'image', 'cooking_time'
+        ).in_bulk(recipe_ids)
+        missing = [pk for pk in recipe_ids if pk not in recipes]
+        if missing:
+            raise ValidationError({
+                'recipes': 'Рецепты не найдены: '
+                f'{", ".join(map(str, missing))}.'
+            })
+        try:
+            relations.add(kind, request.user.id, recipe_ids)
+        except IntegrityError:
+            raise ValidationError({'recipes': 'Рецепт был удалён.'})
+        return Response(
+            RecipeSummarySerializer(
+                [recipes[pk] for pk in recipe_ids], many=True
+            ).data,
+            status=status.HTTP_201_CREATED
+        )
+
     @action(
         detail=True,
         methods=['post', 'delete'],
@@ -53,21 +261,16 @@ class RecipeController(ModelViewSet):
         url_path='shopping_cart'
     )
     def manage_cart(self, request, pk):
-        user = request.user
-        recipe = self.get_object()
-        cart_item = UserShoppingCart.objects.filter(user=user, recipe=recipe)
-        if request.method == 'POST':
-            if cart_item.exists():
-                return Response(status=status.HTTP_400_BAD_REQUEST)
-            UserShoppingCart.objects.create(user=user, recipe=recipe)
-            return Response(
-                RecipeSummarySerializer(recipe).data,
-                status=status.HTTP_201_CREATED
-            )
-        if not cart_item.exists():
-            return Response(status=status.HTTP_400_BAD_REQUEST)
-        cart_item.delete()
-        return Response(status=status.HTTP_204_NO_CONTENT)
+        return self.change_relation(request, 'shopping_cart')
+
+    @action(
+        detail=False,
+        methods=['post', 'delete'],
+        permission_classes=[permissions.IsAuthenticated],
+        url_path='shopping_cart'
+    )
+    def manage_cart_bulk(self, request):
+        return self.change_relations(request, 'shopping_cart')
 
     @action(
         detail=True,
@@ -76,21 +279,16 @@ class RecipeController(ModelViewSet):
         url_path='favorite'
     )
     def manage_favorites(self, request, pk):
-        user = request.user
-        recipe = self.get_object()
-        favorite = UserFavoriteRecipe.objects.filter(user=user, recipe=recipe)
-        if request.method == 'POST':
-            if favorite.exists():
-                return Response(status=status.HTTP_400_BAD_REQUEST)
-            UserFavoriteRecipe.objects.create(user=user, recipe=recipe)
-            return Response(
-                RecipeSummarySerializer(recipe).data,
-                status=status.HTTP_201_CREATED
-            )
-        if not favorite.exists():
-            return Response(status=status.HTTP_400_BAD_REQUEST)
-        favorite.delete()
-        return Response(status=status.HTTP_204_NO_CONTENT)
+        return self.change_relation(request, 'favorites')
+
+    @action(
+        detail=False,
+        methods=['post', 'delete'],
+        permission_classes=[permissions.IsAuthenticated],
+        url_path='favorite'
+    )
+    def manage_favorites_bulk(self, request):
+        return self.change_relations(request, 'favorites')
 
     @action(
         detail=False,
@@ -99,29 +297,38 @@ class RecipeController(ModelViewSet):
         url_path='download_shopping_cart'
     )
     def export_shopping_list(self, request):
-        cart_items = request.user.shopping_cart.select_related('recipe')
-        recipe_ids = [item.recipe_id for item in cart_items]
-        ingredients = (
-            RecipeIngredient.objects
-            .filter(recipe_id__in=recipe_ids)
-            .values(
-                name=F('ingredient__name'),
-                unit=F('ingredient__measurement_unit')
+        file_format = request.query_params.get('file_format', 'txt')
+        renderer = get_renderer(file_format)
+        if renderer is None:
+            return Response(
+                {'file_format': f'Формат {file_format} не поддерживается.'},
+                status=status.HTTP_400_BAD_REQUEST
             )
-            .annotate(amount=Sum('amount'))
-            .order_by('name')
+        # Строки читаются из БД до создания ответа: под ASGI Django
+        # перебирает потоковый ответ в цикле событий, где запросы к БД
+        # запрещены. Список ограничен справочником, в файл он пишется
+        # потоково.
+        items = list(aggregate_shopping_list(request.user))
+        response = StreamingHttpResponse(
+            renderer.render(items),
+            content_type=renderer.content_type
         )
-        shopping_list = "Список покупок:\n"
-        shopping_list += "\n".join(
-            f"{item['name']} - {item['amount']} ({item['unit']})"
-            for item in ingredients
-        ) if ingredients else "Ваша корзина пуста"
-        return FileResponse(
-            shopping_list,
-            filename='shopping_list.txt',
-            as_attachment=True,
-            content_type='text/plain'
+        response['Content-Disposition'] = (
+            f'attachment; filename="shopping_list.{renderer.extension}"'
         )
+        return response
+
+    @action(
+        detail=False,
+        methods=['get'],
+        permission_classes=[permissions.IsAuthenticated],
+        url_path='shopping_list'
+    )
+    def shopping_list(self, request):
+        return Response([
+            dict(ingredient, amount=amount)
+            for ingredient, amount in shopping_list_items(request.user)
+        ])
 
     @action(
         detail=True,
@@ -130,8 +337,9 @@ class RecipeController(ModelViewSet):
     )
     def generate_shareable_link(self, request, pk):
         recipe = self.get_object()
-        hex_id = f"{recipe.id:x}"
-        path = reverse('short-link', kwargs={'short_link': hex_id})
+        path = reverse(
+            'short-link', kwargs={'short_link': short_links.encode(recipe.id)}
+        )
         full_url = request.build_absolute_uri(path)
         return Response(
             {'short-link': full_url},
@@ -139,9 +347,29 @@ class RecipeController(ModelViewSet):
         )
 
 
-class IngredientViewSet(ReadOnlyModelViewSet):
+class IngredientViewSet(CachedResponseMixin, ReadOnlyModelViewSet):
     queryset = Ingredient.objects.all()
+    cache_namespaces = (versions.INGREDIENTS,)
     serializer_class = IngredientSerializer
     permission_classes = [permissions.AllowAny]
-    filter_backends = [DjangoFilterBackend]
-    filterset_class = IngredientSearchFilter
+    # Справочник читается из памяти процесса, ETag задаёт версия каталога.
+    etag_interval = None
+    cache_max_age = settings.INGREDIENTS_MAX_AGE
+
+    def list(self, request, *args, **kwargs):
+        return self.conditional_response(self.catalog_list, request)
+
+    def retrieve(self, request, pk):
+        return self.conditional_response(self.catalog_item, request, pk)
+
+    def catalog_list(self, request, personal):
+        name = request.query_params.get('name')
+        if name:
+            return Response(autocomplete(name))
+        return Response(get_catalog().rows())
+
+    def catalog_item(self, request, pk, personal):
+        ingredient = get_catalog().get(int(pk)) if pk.isdigit() else None
+        if ingredient is None:
+            raise Http404
+        return Response(ingredient)
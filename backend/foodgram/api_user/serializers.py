@@ -1,16 +1,27 @@
 from djoser.serializers import UserCreateSerializer, UserSerializer
-from drf_extra_fields import fields as drf_fields
 from rest_framework import serializers
 
+from api.fields import (
+    IdListField,
+    ImageVariantsField,
+    StreamingBase64ImageField
+)
+from api.metrics import TimedSerializerMixin
 from core.models import Subscription, User
 
 
-class CustomUserSerializer(UserSerializer):
+class CustomUserSerializer(TimedSerializerMixin, UserSerializer):
     is_subscribed = serializers.SerializerMethodField(
         method_name='get_is_subscribed'
     )
+    avatar_variants = ImageVariantsField(
+        source='avatar'
+    )
 
     def get_is_subscribed(self, obj):
+        annotated = getattr(obj, 'is_subscribed', None)
+        if annotated is not None:
+            return annotated
         user = self.context.get('request').user
         if user:
             return user.is_authenticated and Subscription.objects.filter(
@@ -28,11 +39,14 @@ class CustomUserSerializer(UserSerializer):
             'first_name',
             'last_name',
             'is_subscribed',
-            'avatar'
+            'avatar',
+            'avatar_variants'
         ]
 
 
-class CustomUserCreateSerializer(UserCreateSerializer):
+class CustomUserCreateSerializer(
+    TimedSerializerMixin, UserCreateSerializer
+):
     class Meta:
         model = User
         fields = [
@@ -46,8 +60,10 @@ class CustomUserCreateSerializer(UserCreateSerializer):
         extra_kwargs = {'password': {'write_only': True}}
 
 
-class UserAvatarSerializer(serializers.ModelSerializer):
-    avatar = drf_fields.Base64ImageField()
+class UserAvatarSerializer(
+    TimedSerializerMixin, serializers.ModelSerializer
+):
+    avatar = StreamingBase64ImageField()
 
     def update(self, instance, validated_data):
         avatar = validated_data.get('avatar')
@@ -62,3 +78,8 @@ class UserAvatarSerializer(serializers.ModelSerializer):
     class Meta:
         model = User
         fields = ('avatar',)
+
+
+class AuthorIdsSerializer(serializers.Serializer):
+    """Id авторов для пакетной подписки и отписки."""
+    users = IdListField()
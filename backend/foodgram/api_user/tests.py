@@ -0,0 +1,177 @@
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+
+from api_recipes.tests import (
+    TEST_CACHES,
+    QueryCountMixin,
+    create_feed,
+    create_recipe,
+    create_user
+)
+from core.models import Subscription
+
+
+@override_settings(CACHES=TEST_CACHES)
+class SubscriptionsQueryCountTests(QueryCountMixin, TestCase):
+    """Число запросов не зависит от limit и recipes_limit."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.reader = create_user('reader')
+        create_feed(cls.reader)
+
+    def test_subscriptions(self):
+        for limit in (2, 6):
+            for recipes_limit in (1, 10):
+                url = (
+                    f'/api/users/subscriptions/'
+                    f'?limit={limit}&recipes_limit={recipes_limit}'
+                )
+                with self.subTest(url=url):
+                    self.assertEqual(self.count_queries(self.reader, url), 3)
+
+
+@override_settings(CACHES=TEST_CACHES)
+class SubscribeTests(TestCase):
+    """Подписка и отписка, одиночные и пакетные, и recipes_limit."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.reader = create_user('reader')
+        cls.authors = [create_user(f'author{number}') for number in range(2)]
+        for author in cls.authors:
+            for number in range(3):
+                create_recipe(author, f'Рецепт {number}')
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.reader)
+
+    def test_single(self):
+        for recipes_limit, expected in (('1', 1), ('', 3)):
+            with self.subTest(recipes_limit=recipes_limit):
+                author = self.authors[0]
+                response = self.client.post(
+                    f'/api/users/{author.id}/subscribe/'
+                    f'?recipes_limit={recipes_limit}'
+                )
+                self.assertEqual(response.status_code, 201)
+                self.assertEqual(len(response.json()['recipes']), expected)
+                self.client.delete(f'/api/users/{author.id}/subscribe/')
+
+    def test_bulk(self):
+        response = self.client.post(
+            '/api/users/subscribe/?recipes_limit=2',
+            {'users': [author.id for author in self.authors]},
+            format='json'
+        )
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(
+            [len(author['recipes']) for author in response.json()], [2, 2]
+        )
+        # Повторная пакетная подписка идемпотентна.
+        response = self.client.post(
+            '/api/users/subscribe/',
+            {'users': [author.id for author in self.authors]},
+            format='json'
+        )
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(
+            self.subscribed(), {author.id for author in self.authors}
+        )
+        for _ in range(2):
+            response = self.client.delete(
+                '/api/users/subscribe/',
+                {'users': [self.authors[0].id]},
+                format='json'
+            )
+            self.assertEqual(response.status_code, 204)
+        self.assertEqual(self.subscribed(), {self.authors[1].id})
+
+    def subscribed(self):
+        return set(
+            Subscription.objects.filter(user=self.reader)
+            .values_list('subscribed_to', flat=True)
+        )
+
+    def test_recipes_limit(self):
+        # Нечисловой и отрицательный лимит игнорируются.
+        author = self.authors[0]
+        for recipes_limit, expected in (
+            ('0', 0), ('abc', 3), ('-1', 3), ('2.5', 3)
+        ):
+            with self.subTest(recipes_limit=recipes_limit):
+                response = self.client.post(
+                    f'/api/users/{author.id}/subscribe/'
+                    f'?recipes_limit={recipes_limit}'
+                )
+                self.assertEqual(response.status_code, 201)
+                self.assertEqual(len(response.json()['recipes']), expected)
+                self.client.delete(f'/api/users/{author.id}/subscribe/')
+
+    def test_single_errors(self):
+        author = self.authors[0]
+        url = f'/api/users/{author.id}/subscribe/'
+        self.assertEqual(self.client.post(url).status_code, 201)
+        self.assertEqual(self.client.post(url).status_code, 400)
+        self.assertEqual(self.client.delete(url).status_code, 204)
+        self.assertEqual(self.client.delete(url).status_code, 400)
+        self.assertEqual(
+            self.client.post(
+                f'/api/users/{self.reader.id}/subscribe/'
+            ).status_code,
+            400
+        )
+        self.assertEqual(
+            self.client.post(
+                f'/api/users/{self.authors[-1].id + 1}/subscribe/'
+            ).status_code,
+            404
+        )
+        self.assertEqual(APIClient().post(url).status_code, 401)
+        self.assertEqual(self.subscribed(), set())
+
+    def test_bulk_errors(self):
+        missing = self.authors[-1].id + 1
+        for users in (
+            [],
+            [0],
+            [self.authors[0].id, self.reader.id],
+            [self.authors[0].id, missing],
+        ):
+            with self.subTest(users=users):
+                response = self.client.post(
+                    '/api/users/subscribe/', {'users': users}, format='json'
+                )
+                self.assertEqual(response.status_code, 400)
+                self.assertIn('users', response.json())
+        self.assertIn(str(missing), str(response.json()['users']))
+        self.assertEqual(self.subscribed(), set())
+
+
+@override_settings(CACHES=TEST_CACHES)
+class UserResponseCacheTests(TestCase):
+    """Профиль пользователя кэшируется до изменения пользователей."""
+
+    def setUp(self):
+        cache.clear()
+        self.user = create_user('author')
+        self.url = f'/api/users/{self.user.id}/'
+        self.client = APIClient()
+
+    def test_cache(self):
+        self.client.get(self.url)
+        with self.assertNumQueries(0):
+            response = self.client.get(self.url)
+        self.assertEqual(response.json()['first_name'], 'author')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.first_name = 'Автор'
+            self.user.save()
+        response = self.client.get(self.url)
+        self.assertEqual(response.json()['first_name'], 'Автор')
+        self.assertEqual(
+            self.client.get(f'/api/users/{self.user.id + 1}/').status_code,
+            404
+        )
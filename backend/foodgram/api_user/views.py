@@ -1,22 +1,39 @@
-from djoser.views import UserViewSet
+from django.db import IntegrityError
+from django.db.models import BooleanField, Value
+from djoser.views import TokenCreateView, UserViewSet
 
 from rest_framework import permissions, status
+from rest_framework.authtoken.models import Token
 from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
 from rest_framework.response import Response
 
-from core.models import Subscription, User
+from core import relations, versions
+from core.models import CulinaryRecipe, User
 
+from api.authentication import expired_before
+from api.cache import CachedResponseMixin
 from api.pagination import CustomPageNumberPagination
 from api_recipes.serializers import UserSubscriptionSerializer
-from .serializers import UserAvatarSerializer, CustomUserSerializer
+from .serializers import (
+    AuthorIdsSerializer,
+    CustomUserSerializer,
+    UserAvatarSerializer
+)
 
 
-class CustomUserViewSet(UserViewSet):
+class CustomUserViewSet(CachedResponseMixin, UserViewSet):
     queryset = User.objects.all()
+    cache_actions = ('retrieve',)
+    cache_namespaces = (versions.USERS,)
+    personalized = True
     serializer_class = CustomUserSerializer
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
     pagination_class = CustomPageNumberPagination
 
+    def personalize(self, user, personal):
+        user['is_subscribed'] = user['id'] in personal.subscriptions
+
     @action(
         detail=False,
         methods=['get'],
@@ -53,12 +70,23 @@ class CustomUserViewSet(UserViewSet):
         permission_classes=[permissions.IsAuthenticated]
     )
     def subscriptions(self, request):
-        queryset = User.objects.filter(subscribed__user=request.user)
+        queryset = User.objects.filter(
+            subscribed__user=request.user
+        ).annotate(
+            is_subscribed=Value(True, output_field=BooleanField())
+        ).order_by('id')
         pages = self.paginate_queryset(queryset)
+        recipes_by_author = CulinaryRecipe.objects.latest_by_author(
+            [author.id for author in pages],
+            UserSubscriptionSerializer.get_recipes_limit(request)
+        )
         serializer = UserSubscriptionSerializer(
             pages,
             many=True,
-            context={'request': request}
+            context={
+                'request': request,
+                'recipes_by_author': recipes_by_author
+            }
         )
         return self.get_paginated_response(serializer.data)
 
@@ -70,20 +98,82 @@ class CustomUserViewSet(UserViewSet):
     def subscribe(self, request, id):
         subscriber = request.user
         user = self.get_object()
-        sub = Subscription.objects.filter(user=subscriber, subscribed_to=user)
-        if request.method == 'POST':
-            if subscriber == user or sub.exists():
-                return Response(status=status.HTTP_400_BAD_REQUEST)
-            Subscription.objects.create(user=subscriber, subscribed_to=user)
-            serializer = UserSubscriptionSerializer(
-                user,
-                context={
-                    'request': request,
-                    'recipes_limit': request.query_params.get('recipes_limit')
-                }
-            )
-            return Response(serializer.data, status=status.HTTP_201_CREATED)
-        if not sub.exists():
+        if subscriber == user:
             return Response(status=status.HTTP_400_BAD_REQUEST)
-        sub.delete()
-        return Response(status=status.HTTP_204_NO_CONTENT)
+        change = relations.add if request.method == 'POST' else (
+            relations.remove
+        )
+        try:
+            changed = change('subscriptions', subscriber.id, [user.pk])
+        except IntegrityError:
+            changed = []
+        if not changed:
+            return Response(status=status.HTTP_400_BAD_REQUEST)
+        if request.method == 'DELETE':
+            return Response(status=status.HTTP_204_NO_CONTENT)
+        serializer = UserSubscriptionSerializer(
+            user, context={'request': request}
+        )
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
+
+    @action(
+        detail=False,
+        methods=['post', 'delete'],
+        permission_classes=[permissions.IsAuthenticated],
+        url_path='subscribe'
+    )
+    def subscribe_bulk(self, request):
+        """
+        Пакетные подписка и отписка по списку id авторов.
+
+        Действия идемпотентны. При подписке возвращаются все авторы
+        списка в формате списка подписок.
+        """
+        serializer = AuthorIdsSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        author_ids = serializer.validated_data['users']
+        if request.method == 'DELETE':
+            relations.remove('subscriptions', request.user.id, author_ids)
+            return Response(status=status.HTTP_204_NO_CONTENT)
+        if request.user.id in author_ids:
+            raise ValidationError({'users': 'Нельзя подписаться на себя.'})
+        authors = User.objects.annotate(
+            is_subscribed=Value(True, output_field=BooleanField())
+        ).in_bulk(author_ids)
+        missing = [pk for pk in author_ids if pk not in authors]
+        if missing:
+            raise ValidationError({
+                'users': 'Пользователи не найдены: '
+                f'{", ".join(map(str, missing))}.'
+            })
+        try:
+            relations.add('subscriptions', request.user.id, author_ids)
+        except IntegrityError:
+            raise ValidationError({'users': 'Пользователь был удалён.'})
+        serializer = UserSubscriptionSerializer(
+            [authors[pk] for pk in author_ids],
+            many=True,
+            context={
+                'request': request,
+                'recipes_by_author': CulinaryRecipe.objects.latest_by_author(
+                    author_ids,
+                    UserSubscriptionSerializer.get_recipes_limit(request)
+                )
+            }
+        )
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
+
+
+class ExpiringTokenCreateView(TokenCreateView):
+    """
+    Вход по email и паролю.
+
+    Просроченный токен удаляется до выдачи, иначе djoser вернул бы его
+    же, и следующий запрос с ним получил бы 401.
+    """
+
+    def _action(self, serializer):
+        Token.objects.filter(
+            user=serializer.user, created__lt=expired_before()
+        ).delete()
+        return super()._action(serializer)
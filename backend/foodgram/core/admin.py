@@ -1,4 +1,3 @@
-from django.contrib import admin
 from django.contrib.admin import register, ModelAdmin
 from django.contrib.auth.admin import UserAdmin
 
@@ -48,24 +47,18 @@ class CulinaryRecipeAdmin(ModelAdmin):
     list_display = [
         'id',
         'author',
-        'ingredients',
+        'ingredients_count',
         'name',
         'image',
         'text',
         'cooking_time',
-        'favorites',
+        'favorites_count',
+        'cart_count',
         'created'
     ]
     list_filter = ['name', 'author']
     search_fields = ['name', 'author__username']
-
-    @admin.display(description='Число ингредиентов')
-    def ingredients(self, obj):
-        return obj.ingredients.count()
-
-    @admin.display(description='В избранном')
-    def favorites(self, obj):
-        return obj.users_in_favorite.count()
+    list_select_related = ['author']
 
 
 @register(UserShoppingCart)
@@ -96,7 +89,9 @@ class CustomUserAdmin(UserAdmin):
         'username',
         'first_name',
         'last_name',
-        'avatar'
+        'avatar',
+        'recipes_count',
+        'subscribers_count'
     ]
     list_filter = ['username', 'email']
     search_fields = ['username', 'email']
@@ -0,0 +1,106 @@
+import bisect
+from array import array
+
+from . import versions
+from .models import Ingredient
+
+FIELDS = ('id', 'name', 'measurement_unit')
+
+
+class IngredientCatalog:
+    """
+    Неизменяемый снимок справочника ингредиентов в памяти процесса.
+
+    Хранится в виде параллельных массивов, упорядоченных по id:
+    поиск по id - бинарный поиск без обращения к БД.
+    """
+
+    def __init__(self, version, rows):
+        rows = sorted(rows)
+        self.version = version
+        self.ids = array('q', (row[0] for row in rows))
+        self.names = tuple(row[1] for row in rows)
+        self.units = tuple(row[2] for row in rows)
+        self.name_order = array('l', sorted(
+            range(len(rows)),
+            key=lambda position: (
+                self.names[position].lower(), self.ids[position]
+            )
+        ))
+        self.name_keys = tuple(
+            self.names[position].lower() for position in self.name_order
+        )
+        self.name_ranks = array('l', [0]) * len(rows)
+        for rank, position in enumerate(self.name_order):
+            self.name_ranks[position] = rank
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __contains__(self, ingredient_id):
+        return self._position(ingredient_id) is not None
+
+    def _position(self, ingredient_id):
+        position = bisect.bisect_left(self.ids, ingredient_id)
+        if position < len(self.ids) and self.ids[position] == ingredient_id:
+            return position
+        return None
+
+    def _row(self, position):
+        return {
+            'id': self.ids[position],
+            'name': self.names[position],
+            'measurement_unit': self.units[position]
+        }
+
+    def get(self, ingredient_id):
+        """Данные ингредиента в виде словаря или None."""
+        position = self._position(ingredient_id)
+        return None if position is None else self._row(position)
+
+    def get_instance(self, ingredient_id):
+        """Экземпляр Ingredient, собранный без запроса к БД, или None."""
+        position = self._position(ingredient_id)
+        if position is None:
+            return None
+        return Ingredient.from_db(None, FIELDS, (
+            self.ids[position],
+            self.names[position],
+            self.units[position]
+        ))
+
+    def name_rank(self, ingredient_id):
+        """Позиция ингредиента при сортировке по названию."""
+        return self.name_ranks[self._position(ingredient_id)]
+
+    def rows(self):
+        """Все ингредиенты в порядке id."""
+        return [self._row(position) for position in range(len(self.ids))]
+
+    def rows_by_name(self, positions=None):
+        """Ингредиенты в порядке названия."""
+        if positions is None:
+            positions = range(len(self.name_order))
+        return [self._row(self.name_order[rank]) for rank in positions]
+
+
+_catalog = None
+
+
+def get_catalog(refresh=False):
+    """
+    Справочник ингредиентов текущего процесса.
+
+    Загружается один раз на воркер и перечитывается, когда версия
+    справочника в общем кэше изменилась (сигналы post_save/post_delete
+    модели Ingredient).
+    """
+    global _catalog
+    version = versions.get_version(versions.INGREDIENTS)
+    catalog = _catalog
+    if refresh or catalog is None or catalog.version != version:
+        catalog = IngredientCatalog(
+            version, Ingredient.objects.values_list(*FIELDS).order_by('id')
+        )
+        _catalog = catalog
+    return catalog
@@ -0,0 +1,91 @@
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from .models import (
+    CulinaryRecipe,
+    RecipeIngredient,
+    Subscription,
+    User,
+    UserFavoriteRecipe,
+    UserShoppingCart
+)
+
+COUNTERS = {
+    CulinaryRecipe: {
+        'favorites_count': (UserFavoriteRecipe, 'recipe'),
+        'cart_count': (UserShoppingCart, 'recipe'),
+        'ingredients_count': (RecipeIngredient, 'recipe'),
+    },
+    User: {
+        'recipes_count': (CulinaryRecipe, 'author'),
+        'subscribers_count': (Subscription, 'subscribed_to'),
+    },
+}
+
+
+def change_counter(model, pk, field, delta):
+    """
+    Атомарное изменение счётчика через F() без чтения строки.
+
+    Счётчик не уменьшается ниже нуля: разошедшийся с данными счётчик
+    не должен ломать каскадное удаление, его исправит repair_counters.
+    """
+    rows = model.objects.filter(pk=pk)
+    if delta < 0:
+        rows = rows.filter(**{f'{field}__gte': -delta})
+    rows.update(**{field: F(field) + delta})
+
+
+def change_counters(model, pks, field, delta):
+    """Одинаковое изменение счётчика у нескольких строк одним UPDATE."""
+    model.objects.filter(pk__in=pks).update(**{field: F(field) + delta})
+
+
+def count_instance(instance, delta):
+    """
+    Учёт созданной (delta=1) или удалённой (delta=-1) связанной строки
+    во всех счётчиках, которые её считают.
+    """
+    for model, counters in COUNTERS.items():
+        for field, (source, relation) in counters.items():
+            if isinstance(instance, source):
+                change_counter(
+                    model, getattr(instance, f'{relation}_id'), field, delta
+                )
+
+
+def actual_count(source, field):
+    """Подзапрос с фактическим числом связанных строк."""
+    return Coalesce(
+        Subquery(
+            source.objects
+            .filter(**{field: OuterRef('pk')})
+            .order_by()
+            .values(field)
+            .annotate(total=Count('pk'))
+            .values('total')
+        ),
+        0
+    )
+
+
+def repair_counters(fix=True):
+    """
+    Поиск и исправление расхождений счётчиков с фактическими данными.
+
+    Для каждого счётчика выполняется один UPDATE по строкам
+    с расхождением. Возвращает число таких строк по каждому счётчику.
+    """
+    report = {}
+    for model, counters in COUNTERS.items():
+        for field, (source, relation) in counters.items():
+            drifted = model.objects.annotate(
+                actual=actual_count(source, relation)
+            ).exclude(**{field: F('actual')})
+            total = drifted.count()
+            if total and fix:
+                model.objects.filter(
+                    pk__in=drifted.values('pk')
+                ).update(**{field: actual_count(source, relation)})
+            report[f'{model.__name__}.{field}'] = total
+    return report
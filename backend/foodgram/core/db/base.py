@@ -0,0 +1,177 @@
+import os
+import threading
+
+import psycopg2
+import psycopg2.extras
+from django.db.backends.postgresql import base
+from psycopg2 import extensions
+
+
+class ConnectionPool:
+    """
+    Соединения процесса, общие для его потоков.
+
+    Открыто не больше max_size соединений, при их нехватке поток ждёт
+    освобождения до timeout секунд. Возвращённые соединения хранятся
+    стеком: чаще используются недавно освободившиеся.
+    """
+
+    def __init__(self, conn_params, max_size, timeout):
+        self.conn_params = conn_params
+        self.timeout = timeout
+        self.slots = threading.BoundedSemaphore(max_size)
+        self.idle = []
+        self.lock = threading.Lock()
+
+    def get(self):
+        if not self.slots.acquire(timeout=self.timeout):
+            raise psycopg2.OperationalError(
+                'Нет свободных соединений в пуле.'
+            )
+        try:
+            with self.lock:
+                if self.idle:
+                    return self.idle.pop()
+            return psycopg2.connect(**self.conn_params)
+        except BaseException:
+            self.slots.release()
+            raise
+
+    def put(self, connection, discard=False):
+        try:
+            status = connection.info.transaction_status
+            if status == extensions.TRANSACTION_STATUS_UNKNOWN:
+                discard = True
+            elif not discard and status != extensions.TRANSACTION_STATUS_IDLE:
+                connection.rollback()
+        except psycopg2.Error:
+            discard = True
+        try:
+            if discard or connection.closed:
+                connection.close()
+            else:
+                with self.lock:
+                    self.idle.append(connection)
+        finally:
+            self.slots.release()
+
+    def close(self):
+        with self.lock:
+            idle, self.idle = self.idle, []
+        for connection in idle:
+            connection.close()
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    """
+    PostgreSQL с проверкой постоянных соединений и пулом в процессе.
+
+    CONN_HEALTH_CHECKS: переиспользуемое соединение проверяется запросом
+    SELECT 1 перед первым обращением к БД в рамках HTTP-запроса. Если
+    сервер перезапустился или закрыл соединение по таймауту, открывается
+    новое, а не возвращается ошибка пользователю. В Django 3.2 такой
+    настройки нет, поведение повторяет Django 4.1.
+
+    POOL: {'MAX_SIZE': ..., 'TIMEOUT': ...} - соединения берутся из
+    общего для потоков процесса пула и возвращаются в него при закрытии
+    в конце запроса, поэтому CONN_MAX_AGE должен быть 0.
+    """
+
+    pools = {}
+    pools_lock = threading.Lock()
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.health_check_done = False
+        self.pool = None
+
+    @property
+    def health_check_enabled(self):
+        return self.settings_dict.get('CONN_HEALTH_CHECKS', False)
+
+    @property
+    def pool_options(self):
+        return self.settings_dict.get('POOL')
+
+    def get_pool(self, conn_params):
+        """Пул текущего процесса: после fork соединения не разделяются."""
+        key = (self.alias, os.getpid())
+        with self.pools_lock:
+            pool = self.pools.get(key)
+            if pool is None:
+                pool = self.pools[key] = ConnectionPool(
+                    conn_params,
+                    self.pool_options['MAX_SIZE'],
+                    self.pool_options.get('TIMEOUT', 10)
+                )
+        return pool
+
+    def get_new_connection(self, conn_params):
+        self.health_check_done = True
+        if not self.pool_options:
+            self.pool = None
+            return super().get_new_connection(conn_params)
+        self.pool = self.get_pool(conn_params)
+        connection = self.pool.get()
+        # Разорванные соединения выбрасываются из пула по одному, пока не
+        # найдётся рабочее или пул не откроет новое.
+        while self.health_check_enabled and not self.ping(connection):
+            self.pool.put(connection, discard=True)
+            connection = self.pool.get()
+        options = self.settings_dict['OPTIONS']
+        self.isolation_level = options.get(
+            'isolation_level', connection.isolation_level
+        )
+        if self.isolation_level != connection.isolation_level:
+            connection.set_session(isolation_level=self.isolation_level)
+        psycopg2.extras.register_default_jsonb(
+            conn_or_curs=connection, loads=lambda x: x
+        )
+        return connection
+
+    @staticmethod
+    def ping(connection):
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT 1')
+            # SELECT 1 вне autocommit открывает транзакцию, а соединение
+            # должно вернуться к Django без неё.
+            if not connection.autocommit:
+                connection.rollback()
+        except psycopg2.Error:
+            return False
+        return True
+
+    def _close(self):
+        if self.connection is None or self.pool is None:
+            return super()._close()
+        # После ошибок соединение закрывается, а не возвращается в пул:
+        # его состояние неизвестно. Незавершённую транзакцию пул откатит.
+        with self.wrap_database_errors:
+            return self.pool.put(
+                self.connection, discard=self.errors_occurred
+            )
+
+    def close_if_unusable_or_obsolete(self):
+        super().close_if_unusable_or_obsolete()
+        self.health_check_done = False
+
+    def close_if_health_check_failed(self):
+        """Закрытие соединения, не прошедшего проверку в этом запросе."""
+        if (
+            self.connection is None
+            or not self.health_check_enabled
+            or self.health_check_done
+        ):
+            return
+        if not self.is_usable():
+            self.close()
+        self.health_check_done = True
+
+    def set_autocommit(self, *args, **kwargs):
+        self.close_if_health_check_failed()
+        return super().set_autocommit(*args, **kwargs)
+
+    def _cursor(self, name=None):
+        self.close_if_health_check_failed()
+        return super()._cursor(name)
@@ -0,0 +1,162 @@
+import logging
+import posixpath
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import transaction
+from PIL import Image, ImageOps, features
+
+logger = logging.getLogger(__name__)
+
+VARIANT_FORMAT = 'WEBP' if features.check('webp') else 'JPEG'
+VARIANT_EXTENSION = 'webp' if VARIANT_FORMAT == 'WEBP' else 'jpg'
+
+_executor = None
+_pending = set()
+_pending_lock = threading.Lock()
+# Картинки с готовыми вариантами: повторно они не проверяются.
+_ready = set()
+READY_CACHE_SIZE = 100000
+
+
+def variant_name(name, variant):
+    """Путь варианта картинки: <папка>/variants/<имя>_<вариант>.<ext>."""
+    directory, filename = posixpath.split(name)
+    stem = posixpath.splitext(filename)[0]
+    return posixpath.join(
+        directory, 'variants', f'{stem}_{variant}.{VARIANT_EXTENSION}'
+    )
+
+
+def variants_ready(name):
+    """
+    Созданы ли все варианты картинки.
+
+    Пока вариантов нет, каждая проверка обращается к хранилищу; готовые
+    картинки запоминаются в памяти процесса. Варианты удаляются вместе
+    с картинкой, когда на неё больше не ссылается ни одна запись.
+    """
+    if name in _ready:
+        return True
+    if not all(
+        default_storage.exists(variant_name(name, variant))
+        for variant in settings.IMAGE_VARIANTS
+    ):
+        return False
+    if len(_ready) >= READY_CACHE_SIZE:
+        _ready.clear()
+    _ready.add(name)
+    return True
+
+
+def variant_urls(field_file, request=None):
+    """
+    Ссылки на все варианты картинки или None, если картинки нет.
+
+    Пока варианты не созданы (картинка ещё обрабатывается или загружена
+    до появления вариантов), все ссылки ведут на исходную картинку.
+    Чтение не ставит задач: варианты создаются при сохранении записи,
+    для старых картинок - командой generate_image_variants.
+    """
+    if not field_file:
+        return None
+    ready = variants_ready(field_file.name)
+    urls = {}
+    for variant in settings.IMAGE_VARIANTS:
+        url = default_storage.url(
+            variant_name(field_file.name, variant) if ready
+            else field_file.name
+        )
+        urls[variant] = request.build_absolute_uri(url) if request else url
+    return urls
+
+
+def generate_variants(name):
+    """
+    Создание уменьшенных копий картинки для всех вариантов.
+
+    Возвращает False, если картинку не удалось прочитать или сохранить.
+    """
+    try:
+        with default_storage.open(name) as source:
+            image = ImageOps.exif_transpose(Image.open(source))
+            image.load()
+        if VARIANT_FORMAT == 'JPEG':
+            image = image.convert('RGB')
+        elif image.mode not in ('RGB', 'RGBA'):
+            image = image.convert('RGBA')
+        for variant, size in settings.IMAGE_VARIANTS.items():
+            resized = image.copy()
+            resized.thumbnail(size, Image.LANCZOS)
+            buffer = BytesIO()
+            resized.save(
+                buffer,
+                VARIANT_FORMAT,
+                quality=settings.IMAGE_VARIANT_QUALITY
+            )
+            path = variant_name(name, variant)
+            if default_storage.exists(path):
+                default_storage.delete(path)
+            default_storage.save(path, ContentFile(buffer.getvalue()))
+    except Exception:
+        logger.exception('Не удалось создать варианты картинки %s', name)
+        return False
+    return True
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=settings.IMAGE_WORKERS,
+            thread_name_prefix='image-variants'
+        )
+    return _executor
+
+
+def delete_variants(name):
+    """Удаление всех вариантов картинки из хранилища."""
+    for variant in settings.IMAGE_VARIANTS:
+        path = variant_name(name, variant)
+        if default_storage.exists(path):
+            default_storage.delete(path)
+    _ready.discard(name)
+
+
+def _generate_pending(name):
+    try:
+        generate_variants(name)
+    finally:
+        with _pending_lock:
+            _pending.discard(name)
+
+
+def _submit(name):
+    with _pending_lock:
+        if name in _pending:
+            return
+        _pending.add(name)
+    _get_executor().submit(_generate_pending, name)
+
+
+def schedule_variants(name):
+    """
+    Фоновое создание вариантов после фиксации транзакции.
+
+    Картинка обрабатывается в пуле потоков, поэтому ответ на запрос
+    не ждёт перекодирования. Повторная постановка картинки, которая ещё
+    обрабатывается, игнорируется.
+    """
+    transaction.on_commit(lambda: _submit(name))
+
+
+def schedule_delete_variants(name):
+    """
+    Удаление вариантов картинки после фиксации транзакции: при откате
+    запись по-прежнему ссылается на картинку и её варианты.
+    """
+    transaction.on_commit(lambda: delete_variants(name))
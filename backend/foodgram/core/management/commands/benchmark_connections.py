@@ -0,0 +1,135 @@
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.core.signals import request_finished, request_started
+from django.db import connection, connections
+from django.db.backends.signals import connection_created
+
+from core.db.base import DatabaseWrapper
+from core.models import Ingredient
+
+MODES = {
+    'без переиспользования': {'CONN_MAX_AGE': 0},
+    'постоянные': {'CONN_MAX_AGE': None},
+    'постоянные + проверка': {
+        'CONN_MAX_AGE': None, 'CONN_HEALTH_CHECKS': True
+    },
+    'пул': {'CONN_MAX_AGE': 0, 'POOL': {}},
+    'пул + проверка': {
+        'CONN_MAX_AGE': 0, 'CONN_HEALTH_CHECKS': True, 'POOL': {}
+    },
+}
+
+
+class Command(BaseCommand):
+    help = (
+        'Замер накладных расходов на открытие соединений с БД: каждый '
+        'запрос повторяет цикл HTTP-запроса (request_started, несколько '
+        'SQL-запросов, request_finished) при разных режимах '
+        'переиспользования соединений.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=500)
+        parser.add_argument(
+            '--queries', type=int, default=3,
+            help='SQL-запросов на один HTTP-запрос.'
+        )
+        parser.add_argument(
+            '--threads', type=int, default=1,
+            help='Параллельных потоков, как у gunicorn gthread.'
+        )
+        parser.add_argument(
+            '--rate', type=float, default=50,
+            help='Запросов в секунду на процесс для оценки экономии.'
+        )
+
+    def handle(self, *args, **options):
+        self.opened = set()
+        self.opened_lock = threading.Lock()
+        connection_created.connect(self._count_connection)
+        database = connections.databases[connection.alias]
+        original = {
+            key: database.get(key)
+            for key in ('CONN_MAX_AGE', 'CONN_HEALTH_CHECKS', 'POOL')
+        }
+        self.stdout.write(
+            f'{connection.vendor}, {options["requests"]} запросов по '
+            f'{options["queries"]} SQL, потоков: {options["threads"]}'
+        )
+        self.stdout.write(
+            f'{"режим":24} {"соединений":>10} {"p50 мс":>8} '
+            f'{"p95 мс":>8} {"среднее мс":>10} {"экономия":>12}'
+        )
+        baseline = None
+        # Прогрев: первые запросы платят за импорт и компиляцию SQL.
+        self._requests(20, options['queries'])
+        try:
+            for mode, values in MODES.items():
+                if len(values) > 1 and not isinstance(
+                    connections[connection.alias], DatabaseWrapper
+                ):
+                    continue
+                database.update(original)
+                database.update(values)
+                if 'POOL' in values:
+                    database['POOL'] = {'MAX_SIZE': options['threads']}
+                timings = self._run(options)
+                mean = statistics.mean(timings)
+                baseline = mean if baseline is None else baseline
+                saved = (baseline - mean) * options['rate']
+                self.stdout.write(
+                    f'{mode:24} {len(self.opened):>10} '
+                    f'{statistics.median(timings):8.2f} '
+                    f'{statistics.quantiles(timings, n=20)[-1]:8.2f} '
+                    f'{mean:10.2f} {saved:8.1f} мс/с'
+                )
+        finally:
+            connection_created.disconnect(self._count_connection)
+            connection.close()
+            database.update(original)
+            for pool in DatabaseWrapper.pools.values():
+                pool.close()
+            DatabaseWrapper.pools.clear()
+        self.stdout.write(
+            'Экономия: время процесса в секунду, не потраченное на '
+            f'соединения при {options["rate"]:g} запросах в секунду.'
+        )
+
+    def _count_connection(self, sender, connection, **kwargs):
+        # Из пула Django получает уже открытые соединения, поэтому
+        # считаются различные соединения драйвера, а не вызовы connect.
+        with self.opened_lock:
+            self.opened.add(connection.connection)
+
+    def _run(self, options):
+        """Время каждого запроса в мс, соединения открываются заново."""
+        connection.close()
+        self.opened = set()
+        per_thread = options['requests'] // options['threads']
+        if options['threads'] == 1:
+            return self._requests(per_thread, options['queries'])
+        with ThreadPoolExecutor(options['threads']) as executor:
+            results = executor.map(
+                lambda _: self._requests(per_thread, options['queries']),
+                range(options['threads'])
+            )
+            return [timing for timings in results for timing in timings]
+
+    def _requests(self, count, queries):
+        timings = []
+        try:
+            for _ in range(count):
+                start = time.perf_counter()
+                request_started.send(sender=self.__class__)
+                for _ in range(queries):
+                    Ingredient.objects.filter(pk=1).first()
+                request_finished.send(sender=self.__class__)
+                timings.append((time.perf_counter() - start) * 1000)
+        finally:
+            if threading.current_thread() is not threading.main_thread():
+                connections.close_all()
+        return timings
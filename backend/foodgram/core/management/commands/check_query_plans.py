@@ -0,0 +1,41 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from core.models import User
+from core.query_plans import check_plans
+
+
+class Command(BaseCommand):
+    help = (
+        'Проверка планов запросов API: падает, если запрос читает '
+        'таблицу целиком или сортирует без индекса. Подходит для CI '
+        'на SQLite и PostgreSQL.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--verbose-plans',
+            action='store_true',
+            help='Выводить планы всех запросов.'
+        )
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            user = User.objects.create(
+                email='plans@example.com',
+                username='plans',
+                first_name='plans',
+                last_name='plans'
+            )
+            report = check_plans(user)
+            transaction.set_rollback(True)
+        failed = 0
+        for name, plan, problems in report:
+            status = 'FAIL' if problems else 'ok'
+            self.stdout.write(f'{status:4} {name}')
+            if problems or options['verbose_plans']:
+                for line in plan.splitlines():
+                    self.stdout.write(f'       {line}')
+            failed += bool(problems)
+        if failed:
+            raise CommandError(f'Запросов без подходящего индекса: {failed}')
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from core.trending import compact_activity
+
+
+class Command(BaseCommand):
+    help = (
+        'Свёртка часовой активности рецептов и пересчёт trending_score. '
+        'Запускается по расписанию, например раз в час.'
+    )
+
+    def handle(self, *args, **options):
+        report = compact_activity()
+        self.stdout.write(
+            'Удалено интервалов вне окна: {expired}, '
+            'свёрнуто часовых интервалов: {merged}, '
+            'пересчитано рецептов: {rescored}'.format(**report)
+        )
@@ -0,0 +1,248 @@
+import json
+import random
+from datetime import timedelta
+from io import BytesIO
+from itertools import accumulate
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from PIL import Image
+from rest_framework.authtoken.models import Token
+
+from core import search, versions
+from core.counters import repair_counters
+from core.models import (
+    CulinaryRecipe,
+    Ingredient,
+    RecipeActivity,
+    RecipeIngredient,
+    Subscription,
+    User,
+    UserFavoriteRecipe,
+    UserShoppingCart
+)
+from core.shopping_lists import repair_shopping_lists
+from core.trending import compact_activity, current_hour
+
+PREFIX = 'bench_'
+PASSWORD = 'bench-password'
+IMAGE_NAME = 'recipes/benchmark.png'
+BATCH_SIZE = 5000
+WORDS = [
+    'суп', 'салат', 'пирог', 'соус', 'торт', 'каша', 'рагу', 'запеканка',
+    'быстрый', 'домашний', 'острый', 'сладкий', 'томатный', 'сырный',
+    'шоколадный', 'овощной', 'куриный', 'рыбный', 'с', 'яблоками',
+    'картофелем', 'грибами'
+]
+
+
+def zipf_weights(count, exponent):
+    """Накопленные веса закона Ципфа: первые элементы самые популярные."""
+    return list(accumulate(
+        1 / (rank + 1) ** exponent for rank in range(count)
+    ))
+
+
+class Command(BaseCommand):
+    help = (
+        'Синтетические данные для нагрузочных тестов: пользователи, '
+        'рецепты, избранное, корзины и подписки с неравномерным '
+        'распределением популярности. Пишет файл с токенами и id '
+        'для сценариев backend/benchmarks.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--recipes', type=int, default=10_000)
+        parser.add_argument('--favorites', type=int, default=20)
+        parser.add_argument('--carts', type=int, default=5)
+        parser.add_argument('--subscriptions', type=int, default=10)
+        parser.add_argument('--tokens', type=int, default=100)
+        parser.add_argument(
+            '--skew', type=float, default=1.1,
+            help='Показатель закона Ципфа для популярности рецептов.'
+        )
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument(
+            '--output', default='benchmark_data.json',
+            help='Файл с токенами и id для сценариев.'
+        )
+        parser.add_argument(
+            '--clear', action='store_true',
+            help='Удалить ранее созданные данные нагрузочных тестов.'
+        )
+
+    def handle(self, *args, **options):
+        self.random = random.Random(options['seed'])
+        with transaction.atomic():
+            if options['clear']:
+                User.objects.filter(username__startswith=PREFIX).delete()
+            ingredients = self._ingredients()
+            users = self._users(options['users'])
+            recipes = self._recipes(users, ingredients, options['recipes'])
+            recipe_weights = zipf_weights(len(recipes), options['skew'])
+            author_weights = zipf_weights(len(users), options['skew'])
+            self._relations(
+                UserFavoriteRecipe, 'recipe_id', users, recipes,
+                recipe_weights, options['favorites']
+            )
+            self._relations(
+                UserShoppingCart, 'recipe_id', users, recipes,
+                recipe_weights, options['carts']
+            )
+            self._relations(
+                Subscription, 'subscribed_to_id', users, users,
+                author_weights, options['subscriptions']
+            )
+            self._activity(recipes, recipe_weights)
+            tokens = self._tokens(users[:options['tokens']])
+            repair_counters()
+            repair_shopping_lists(rebuild=True)
+            compact_activity()
+            search.rebuild_index()
+        for namespace in (
+            versions.INGREDIENTS,
+            versions.RECIPES,
+            versions.RECIPE_INGREDIENTS,
+            versions.RECIPE_IDS,
+            versions.USERS
+        ):
+            versions.bump_version(namespace)
+        with open(options['output'], 'w', encoding='utf-8') as file:
+            json.dump({
+                'password': PASSWORD,
+                'users': tokens,
+                'authors': users[:100],
+                'recipes': recipes[:1000],
+                'ingredients': ingredients[:200],
+            }, file, ensure_ascii=False)
+        self.stdout.write(
+            f'Пользователей: {len(users)}, рецептов: {len(recipes)}, '
+            f'данные сценариев: {options["output"]}'
+        )
+
+    def _ingredients(self):
+        if not Ingredient.objects.exists():
+            path = settings.BASE_DIR.parent / 'data' / 'ingredients.json'
+            with open(path, encoding='utf-8') as file:
+                Ingredient.objects.bulk_create(
+                    Ingredient(**item) for item in json.load(file)
+                )
+        return list(Ingredient.objects.values_list('id', flat=True))
+
+    def _users(self, count):
+        start = User.objects.filter(username__startswith=PREFIX).count()
+        password = make_password(PASSWORD)
+        User.objects.bulk_create(
+            (
+                User(
+                    email=f'{PREFIX}{number}@example.com',
+                    username=f'{PREFIX}{number}',
+                    first_name='Нагрузка',
+                    last_name=str(number),
+                    password=password
+                )
+                for number in range(start, start + count)
+            ),
+            batch_size=BATCH_SIZE
+        )
+        return list(
+            User.objects.filter(username__startswith=PREFIX)
+            .order_by('-id').values_list('id', flat=True)[:count]
+        )
+
+    def _recipes(self, authors, ingredients, count):
+        if not default_storage.exists(IMAGE_NAME):
+            buffer = BytesIO()
+            Image.new('RGB', (480, 480), (230, 160, 80)).save(buffer, 'PNG')
+            default_storage.save(IMAGE_NAME, ContentFile(buffer.getvalue()))
+        author_weights = zipf_weights(len(authors), 0.8)
+        authored = CulinaryRecipe.objects.filter(
+            author__username__startswith=PREFIX
+        ).order_by('-id').values_list('id', flat=True)
+        for offset in range(0, count, BATCH_SIZE):
+            size = min(BATCH_SIZE, count - offset)
+            CulinaryRecipe.objects.bulk_create(
+                CulinaryRecipe(
+                    author_id=self.random.choices(
+                        authors, cum_weights=author_weights
+                    )[0],
+                    name=' '.join(self.random.sample(WORDS, 3)),
+                    text=' '.join(self.random.choices(WORDS, k=40)),
+                    image=IMAGE_NAME,
+                    cooking_time=self.random.randint(5, 180)
+                )
+                for _ in range(size)
+            )
+            batch = list(authored[:size])
+            RecipeIngredient.objects.bulk_create(
+                RecipeIngredient(
+                    recipe_id=recipe_id,
+                    ingredient_id=ingredient_id,
+                    amount=self.random.randint(1, 500)
+                )
+                for recipe_id in batch
+                for ingredient_id in self.random.sample(
+                    ingredients, self.random.randint(3, 12)
+                )
+            )
+        return list(authored[:count])
+
+    def _relations(self, model, field, users, targets, weights, average):
+        """Связи пользователей с популярными объектами, по Ципфу."""
+        rows = []
+        for user_id in users:
+            count = min(
+                int(self.random.expovariate(1 / average)) if average else 0,
+                len(targets)
+            )
+            chosen = set(
+                self.random.choices(targets, cum_weights=weights, k=count)
+            )
+            if field == 'subscribed_to_id':
+                chosen.discard(user_id)
+            rows.extend(
+                model(user_id=user_id, **{field: target})
+                for target in chosen
+            )
+        model.objects.bulk_create(
+            rows, batch_size=BATCH_SIZE, ignore_conflicts=True
+        )
+
+    def _activity(self, recipes, weights):
+        """Добавления в избранное и корзину за последнюю неделю."""
+        now = current_hour()
+        buckets = {}
+        for recipe_id in self.random.choices(
+            recipes, cum_weights=weights, k=len(recipes) * 2
+        ):
+            hour = now - timedelta(hours=self.random.randint(0, 24 * 7 - 1))
+            key = (recipe_id, hour)
+            buckets[key] = buckets.get(key, 0) + 1
+        RecipeActivity.objects.bulk_create(
+            (
+                RecipeActivity(recipe_id=recipe_id, hour=hour, favorites=count)
+                for (recipe_id, hour), count in buckets.items()
+            ),
+            batch_size=BATCH_SIZE,
+            ignore_conflicts=True
+        )
+
+    def _tokens(self, users):
+        Token.objects.bulk_create(
+            (
+                Token(user_id=user_id, key=Token.generate_key())
+                for user_id in users
+            ),
+            ignore_conflicts=True
+        )
+        return [
+            {'id': user_id, 'token': key, 'email': email}
+            for user_id, key, email in Token.objects.filter(
+                user_id__in=users
+            ).values_list('user_id', 'key', 'user__email')
+        ]
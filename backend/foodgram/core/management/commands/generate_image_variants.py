@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand
+
+from core.images import generate_variants, variants_ready
+from core.models import CulinaryRecipe, User
+
+
+class Command(BaseCommand):
+    help = (
+        'Создание уменьшенных копий картинок рецептов и аватаров, '
+        'у которых их ещё нет (например, загруженных до появления '
+        'вариантов).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--force',
+            action='store_true',
+            help='Пересоздать варианты всех картинок.'
+        )
+
+    def handle(self, *args, **options):
+        names = list(
+            CulinaryRecipe.objects.exclude(image='')
+            .values_list('image', flat=True)
+        ) + list(
+            User.objects.exclude(avatar='').values_list('avatar', flat=True)
+        )
+        processed = 0
+        for name in names:
+            if options['force'] or not variants_ready(name):
+                generate_variants(name)
+                processed += 1
+        self.stdout.write(
+            f'Обработано картинок: {processed} из {len(names)}'
+        )
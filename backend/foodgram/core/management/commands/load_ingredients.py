@@ -0,0 +1,195 @@
+import csv
+import io
+import json
+import re
+import sys
+import time
+from itertools import islice
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from core import versions
+from core.models import Ingredient
+
+CHUNK_SIZE = 1 << 16
+SEPARATOR = re.compile(r'[\s,]*')
+FORMATS = {'.csv': 'csv', '.json': 'json', '.jsonl': 'jsonl'}
+NAME_LENGTH = Ingredient._meta.get_field('name').max_length
+UNIT_LENGTH = Ingredient._meta.get_field('measurement_unit').max_length
+
+COPY_TABLE_SQL = '''
+CREATE TEMPORARY TABLE ingredient_load (
+    position bigserial,
+    name varchar(%s),
+    measurement_unit varchar(%s)
+) ON COMMIT DROP
+'''
+COPY_SQL = (
+    'COPY ingredient_load (name, measurement_unit) FROM STDIN '
+    'WITH (FORMAT csv)'
+)
+COPY_INSERT_SQL = '''
+INSERT INTO core_ingredient (name, measurement_unit)
+SELECT name, measurement_unit FROM ingredient_load ORDER BY position
+ON CONFLICT (name, measurement_unit) DO NOTHING
+'''
+# ON COMMIT DROP срабатывает только при фиксации внешней транзакции:
+# повторная загрузка внутри неё иначе найдёт таблицу занятой.
+COPY_DROP_SQL = 'DROP TABLE ingredient_load'
+
+
+def iter_json_array(file):
+    """Элементы JSON-массива по одному, без чтения файла целиком."""
+    decoder = json.JSONDecoder()
+    buffer, position, started = '', 0, False
+    while True:
+        position = SEPARATOR.match(buffer, position).end()
+        if position < len(buffer):
+            if not started:
+                if buffer[position] != '[':
+                    raise CommandError('Ожидался JSON-массив ингредиентов.')
+                started = True
+                position += 1
+                continue
+            if buffer[position] == ']':
+                return
+            try:
+                item, position = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                pass
+            else:
+                yield item
+                continue
+        chunk = file.read(CHUNK_SIZE)
+        if not chunk:
+            raise CommandError('Некорректный или обрезанный JSON.')
+        buffer = buffer[position:] + chunk
+        position = 0
+
+
+def iter_rows(file, file_format):
+    """Пары (название, единица измерения) из CSV, JSON или JSON Lines."""
+    if file_format == 'csv':
+        for row in csv.reader(file):
+            if row[:2] == ['name', 'measurement_unit']:
+                continue
+            yield row[:2] if len(row) >= 2 else None
+        return
+    items = (
+        iter_json_array(file) if file_format == 'json'
+        else (json.loads(line) for line in file if line.strip())
+    )
+    for item in items:
+        yield (
+            (item.get('name'), item.get('measurement_unit'))
+            if isinstance(item, dict) else None
+        )
+
+
+class Command(BaseCommand):
+    help = (
+        'Загрузка справочника ингредиентов из CSV, JSON или JSON Lines '
+        'с потоковым разбором и пакетной вставкой. Уже существующие '
+        'пары (название, единица измерения) пропускаются, поэтому '
+        'повторная загрузка безопасна.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path', nargs='?',
+            default=str(settings.BASE_DIR.parent / 'data' / 'ingredients.csv'),
+            help='Файл справочника, "-" - стандартный ввод.'
+        )
+        parser.add_argument('--format', choices=sorted(set(FORMATS.values())))
+        parser.add_argument('--batch-size', type=int, default=10_000)
+        parser.add_argument(
+            '--no-copy', action='store_true',
+            help='Вставка bulk_create и на PostgreSQL вместо COPY.'
+        )
+
+    def handle(self, *args, **options):
+        path = options['path']
+        file_format = options['format'] or FORMATS.get(Path(path).suffix)
+        if file_format is None:
+            raise CommandError(
+                'Не удалось определить формат файла, укажите --format.'
+            )
+        self.read = self.rejected = 0
+        use_copy = (
+            connection.vendor == 'postgresql' and not options['no_copy']
+        )
+        start = time.perf_counter()
+        if path == '-':
+            file = io.TextIOWrapper(sys.stdin.buffer, encoding='utf-8')
+        else:
+            file = open(path, encoding='utf-8', newline='')
+        with file, transaction.atomic():
+            batches = self._batches(
+                iter_rows(file, file_format), options['batch_size']
+            )
+            if use_copy:
+                added = self._copy(batches)
+            else:
+                added = self._bulk_create(batches)
+        elapsed = time.perf_counter() - start
+        if added:
+            versions.bump_version(versions.INGREDIENTS)
+        self.stdout.write(
+            f'Прочитано {self.read}, добавлено {added}, '
+            f'уже были {self.read - self.rejected - added}, '
+            f'отклонено {self.rejected} за {elapsed * 1000:.0f} мс '
+            f'({self.read / elapsed:.0f} строк/с, '
+            f'{"COPY" if use_copy else "bulk_create"})'
+        )
+
+    def _batches(self, rows, batch_size):
+        """Проверенные строки пакетами по batch_size."""
+        def valid_rows():
+            for row in rows:
+                self.read += 1
+                name, unit = row if row is not None else (None, None)
+                name = name.strip() if isinstance(name, str) else ''
+                unit = unit.strip() if isinstance(unit, str) else ''
+                if not (
+                    0 < len(name) <= NAME_LENGTH
+                    and 0 < len(unit) <= UNIT_LENGTH
+                ):
+                    self.rejected += 1
+                    continue
+                yield name, unit
+
+        iterator = valid_rows()
+        while True:
+            batch = list(islice(iterator, batch_size))
+            if not batch:
+                return
+            yield batch
+
+    def _bulk_create(self, batches):
+        before = Ingredient.objects.count()
+        for batch in batches:
+            Ingredient.objects.bulk_create(
+                (
+                    Ingredient(name=name, measurement_unit=unit)
+                    for name, unit in batch
+                ),
+                ignore_conflicts=True
+            )
+        return Ingredient.objects.count() - before
+
+    def _copy(self, batches):
+        """Загрузка во временную таблицу через COPY и одна вставка."""
+        with connection.cursor() as cursor:
+            cursor.execute(COPY_TABLE_SQL, [NAME_LENGTH, UNIT_LENGTH])
+            for batch in batches:
+                buffer = io.StringIO()
+                csv.writer(buffer).writerows(batch)
+                buffer.seek(0)
+                cursor.copy_expert(COPY_SQL, buffer)
+            cursor.execute(COPY_INSERT_SQL)
+            added = cursor.rowcount
+            cursor.execute(COPY_DROP_SQL)
+            return added
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from core.search import rebuild_index
+
+
+class Command(BaseCommand):
+    help = (
+        'Перестройка поискового индекса рецептов, например после '
+        'переименования ингредиентов или правки рецептов в админке.'
+    )
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            rebuild_index()
+        self.stdout.write('Поисковый индекс перестроен.')
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from core.counters import repair_counters
+
+
+class Command(BaseCommand):
+    help = 'Пересчёт денормализованных счётчиков рецептов и пользователей.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check',
+            action='store_true',
+            help='Только показать расхождения, не исправляя их.'
+        )
+
+    def handle(self, *args, **options):
+        report = repair_counters(fix=not options['check'])
+        for counter, drifted in report.items():
+            self.stdout.write(f'{counter}: расхождений {drifted}')
@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+
+from core.shopping_lists import repair_shopping_lists
+
+
+class Command(BaseCommand):
+    help = 'Сверка сводных списков покупок с корзинами пользователей.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check',
+            action='store_true',
+            help='Только показать расхождения, не исправляя их.'
+        )
+        parser.add_argument(
+            '--rebuild',
+            action='store_true',
+            help='Пересобрать списки всех пользователей.'
+        )
+
+    def handle(self, *args, **options):
+        report = repair_shopping_lists(
+            fix=not options['check'], rebuild=options['rebuild']
+        )
+        self.stdout.write(
+            f'Строк с расхождениями: {report["rows"]}, '
+            f'пользователей: {report["users"]}'
+        )
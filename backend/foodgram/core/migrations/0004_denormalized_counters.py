@@ -0,0 +1,73 @@
+# Generated by Django 3.2.16 on 2026-10-18 19:44
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+COUNTERS = {
+    'CulinaryRecipe': {
+        'favorites_count': ('UserFavoriteRecipe', 'recipe'),
+        'cart_count': ('UserShoppingCart', 'recipe'),
+        'ingredients_count': ('RecipeIngredient', 'recipe'),
+    },
+    'User': {
+        'recipes_count': ('CulinaryRecipe', 'author'),
+        'subscribers_count': ('Subscription', 'subscribed_to'),
+    },
+}
+
+
+def fill_counters(apps, schema_editor):
+    for model_name, counters in COUNTERS.items():
+        model = apps.get_model('core', model_name)
+        values = {}
+        for field, (source_name, relation) in counters.items():
+            source = apps.get_model('core', source_name)
+            values[field] = Coalesce(
+                Subquery(
+                    source.objects
+                    .filter(**{relation: OuterRef('pk')})
+                    .order_by()
+                    .values(relation)
+                    .annotate(total=Count('pk'))
+                    .values('total')
+                ),
+                0
+            )
+        model.objects.update(**values)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0003_recipe_created_id_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='culinaryrecipe',
+            name='cart_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='В корзинах'),
+        ),
+        migrations.AddField(
+            model_name='culinaryrecipe',
+            name='favorites_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='В избранном'),
+        ),
+        migrations.AddField(
+            model_name='culinaryrecipe',
+            name='ingredients_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Число ингредиентов'),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='recipes_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Число рецептов'),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='subscribers_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Число подписчиков'),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
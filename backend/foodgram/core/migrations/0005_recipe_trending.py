@@ -0,0 +1,54 @@
+# Generated by Django 3.2.16 on 2026-10-18 19:47
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0004_denormalized_counters'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RecipeActivity',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('hour', models.DateTimeField(verbose_name='Начало интервала')),
+                ('favorites', models.IntegerField(default=0, verbose_name='Добавления в избранное')),
+                ('carts', models.IntegerField(default=0, verbose_name='Добавления в корзину')),
+            ],
+            options={
+                'verbose_name': 'Активность рецепта',
+                'verbose_name_plural': 'Активность рецептов',
+                'ordering': ('id',),
+            },
+        ),
+        migrations.AddField(
+            model_name='culinaryrecipe',
+            name='trending_score',
+            field=models.IntegerField(default=0, editable=False, verbose_name='Активность за неделю'),
+        ),
+        migrations.AddIndex(
+            model_name='culinaryrecipe',
+            index=models.Index(fields=['favorites_count', 'cart_count', 'id'], name='recipe_popular_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='culinaryrecipe',
+            index=models.Index(fields=['trending_score', 'id'], name='recipe_trending_idx'),
+        ),
+        migrations.AddField(
+            model_name='recipeactivity',
+            name='recipe',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='activity', to='core.culinaryrecipe', verbose_name='Рецепт'),
+        ),
+        migrations.AddIndex(
+            model_name='recipeactivity',
+            index=models.Index(fields=['hour'], name='recipe_activity_hour_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='recipeactivity',
+            constraint=models.UniqueConstraint(fields=('recipe', 'hour'), name='unique_RecipeActivity'),
+        ),
+    ]
@@ -0,0 +1,69 @@
+import django.contrib.postgres.search
+from django.db import migrations
+
+POSTGRESQL_FILL = '''
+UPDATE core_culinaryrecipe AS recipe SET search_vector =
+    setweight(to_tsvector('russian', recipe.name), 'A')
+    || setweight(to_tsvector('russian', coalesce((
+        SELECT string_agg(ingredient.name, ' ')
+        FROM core_recipeingredient AS amount
+        JOIN core_ingredient AS ingredient
+            ON ingredient.id = amount.ingredient_id
+        WHERE amount.recipe_id = recipe.id
+    ), '')), 'B')
+    || setweight(to_tsvector('russian', recipe.text), 'C')
+'''
+
+SQLITE_FILL = '''
+INSERT INTO core_recipe_search (rowid, name, ingredients, text)
+SELECT recipe.id, recipe.name, coalesce((
+    SELECT group_concat(ingredient.name, ' ')
+    FROM core_recipeingredient AS amount
+    JOIN core_ingredient AS ingredient
+        ON ingredient.id = amount.ingredient_id
+    WHERE amount.recipe_id = recipe.id
+), ''), recipe.text
+FROM core_culinaryrecipe AS recipe
+'''
+
+
+def create_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        schema_editor.execute(
+            'CREATE INDEX IF NOT EXISTS core_recipe_search_vector_idx '
+            'ON core_culinaryrecipe USING gin (search_vector)'
+        )
+        schema_editor.execute(POSTGRESQL_FILL)
+    elif vendor == 'sqlite':
+        schema_editor.execute(
+            'CREATE VIRTUAL TABLE IF NOT EXISTS core_recipe_search '
+            'USING fts5(name, ingredients, text)'
+        )
+        schema_editor.execute(SQLITE_FILL)
+
+
+def drop_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        schema_editor.execute(
+            'DROP INDEX IF EXISTS core_recipe_search_vector_idx'
+        )
+    elif vendor == 'sqlite':
+        schema_editor.execute('DROP TABLE IF EXISTS core_recipe_search')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0005_recipe_trending'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='culinaryrecipe',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True, verbose_name='Поисковый индекс'),
+        ),
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
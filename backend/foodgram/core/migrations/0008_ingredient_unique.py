@@ -0,0 +1,63 @@
+from django.db import migrations, models
+from django.db.models import Count, Min, Sum
+
+
+def deduplicate_ingredients(apps, schema_editor):
+    """
+    Объединение одинаковых ингредиентов перед уникальным ограничением.
+
+    Ссылки рецептов переводятся на ингредиент с наименьшим id. Если в
+    рецепте были оба дубликата, их количества складываются в одну
+    строку: рецепт не может содержать ингредиент дважды.
+    """
+    Ingredient = apps.get_model('core', 'Ingredient')
+    RecipeIngredient = apps.get_model('core', 'RecipeIngredient')
+    CulinaryRecipe = apps.get_model('core', 'CulinaryRecipe')
+    groups = Ingredient.objects.values(
+        'name', 'measurement_unit'
+    ).annotate(keep=Min('id'), total=Count('id')).filter(total__gt=1)
+    for group in groups:
+        duplicates = list(Ingredient.objects.filter(
+            name=group['name'], measurement_unit=group['measurement_unit']
+        ).exclude(id=group['keep']).values_list('id', flat=True))
+        RecipeIngredient.objects.filter(
+            ingredient_id__in=duplicates
+        ).update(ingredient_id=group['keep'])
+        Ingredient.objects.filter(id__in=duplicates).delete()
+        repeated = RecipeIngredient.objects.filter(
+            ingredient_id=group['keep']
+        ).values('recipe_id').annotate(
+            first=Min('id'), amount=Sum('amount'), total=Count('id')
+        ).filter(total__gt=1)
+        for row in repeated:
+            RecipeIngredient.objects.filter(
+                id=row['first']
+            ).update(amount=row['amount'])
+            RecipeIngredient.objects.filter(
+                recipe_id=row['recipe_id'], ingredient_id=group['keep']
+            ).exclude(id=row['first']).delete()
+            CulinaryRecipe.objects.filter(id=row['recipe_id']).update(
+                ingredients_count=RecipeIngredient.objects.filter(
+                    recipe_id=row['recipe_id']
+                ).count()
+            )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_query_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            deduplicate_ingredients, migrations.RunPython.noop
+        ),
+        migrations.AddConstraint(
+            model_name='ingredient',
+            constraint=models.UniqueConstraint(
+                fields=('name', 'measurement_unit'),
+                name='unique_Ingredient'
+            ),
+        ),
+    ]
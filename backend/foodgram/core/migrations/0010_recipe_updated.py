@@ -0,0 +1,31 @@
+# Generated by Django 3.2.16 on 2026-10-18 22:10
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+def fill_updated(apps, schema_editor):
+    """Время изменения существующих рецептов - время публикации."""
+    CulinaryRecipe = apps.get_model('core', 'CulinaryRecipe')
+    CulinaryRecipe.objects.update(updated=models.F('created'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_shopping_list'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='culinaryrecipe',
+            name='updated',
+            field=models.DateTimeField(
+                auto_now=True,
+                default=django.utils.timezone.now,
+                verbose_name='Дата изменения'
+            ),
+            preserve_default=False,
+        ),
+        migrations.RunPython(fill_updated, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,52 @@
+# Generated by Django 3.2.16 on 2026-10-18 23:40
+
+import time
+
+from django.db import migrations, models
+
+NAMESPACES = (
+    'ingredients', 'recipes', 'recipe_ingredients', 'recipe_ids', 'users'
+)
+
+
+def create_versions(apps, schema_editor):
+    """
+    Начальные версии не совпадают с выданными раньше через кэш: те
+    строились от текущего времени в миллисекундах.
+    """
+    DataVersion = apps.get_model('core', 'DataVersion')
+    version = int(time.time() * 1000)
+    DataVersion.objects.bulk_create(
+        [
+            DataVersion(namespace=namespace, version=version)
+            for namespace in NAMESPACES
+        ],
+        ignore_conflicts=True
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0010_recipe_updated'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DataVersion',
+            fields=[
+                ('namespace', models.CharField(
+                    max_length=64,
+                    primary_key=True,
+                    serialize=False,
+                    verbose_name='Пространство имён'
+                )),
+                ('version', models.BigIntegerField(verbose_name='Версия')),
+            ],
+            options={
+                'verbose_name': 'Версия данных',
+                'verbose_name_plural': 'Версии данных',
+            },
+        ),
+        migrations.RunPython(create_versions, migrations.RunPython.noop),
+    ]
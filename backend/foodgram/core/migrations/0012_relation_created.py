@@ -0,0 +1,24 @@
+# Generated by Django 3.2.16 on 2026-10-18 22:02
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0011_data_version'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userfavoriterecipe',
+            name='created',
+            field=models.DateTimeField(default=django.utils.timezone.now, editable=False, verbose_name='Дата добавления'),
+        ),
+        migrations.AddField(
+            model_name='usershoppingcart',
+            name='created',
+            field=models.DateTimeField(default=django.utils.timezone.now, editable=False, verbose_name='Дата добавления'),
+        ),
+    ]
@@ -1,9 +1,42 @@
 from django.contrib.auth.models import AbstractUser
+from django.contrib.postgres.search import SearchVectorField
 from django.core.validators import RegexValidator, MinValueValidator
 from django.db import models
+from django.db.models.functions import RowNumber
+from django.utils import timezone
 
 
-class User(AbstractUser):
+class MaintainedFieldsMixin:
+    """
+    Поля maintained_fields меняются только запросами UPDATE с F()
+    (счётчики, поисковый индекс). Сохранение существующего объекта их
+    не записывает, иначе прочитанные раньше значения затёрли бы
+    параллельные изменения.
+    """
+
+    maintained_fields = ()
+
+    def save(self, force_insert=False, force_update=False, using=None,
+             update_fields=None):
+        if update_fields is None and not force_insert and not (
+            self._state.adding
+        ):
+            deferred = self.get_deferred_fields()
+            update_fields = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key
+                and field.name not in self.maintained_fields
+                and field.attname not in deferred
+            ]
+        super().save(
+            force_insert=force_insert,
+            force_update=force_update,
+            using=using,
+            update_fields=update_fields
+        )
+
+
+class User(MaintainedFieldsMixin, AbstractUser):
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = ['first_name', 'last_name', 'username']
     email = models.EmailField(
@@ -41,6 +74,17 @@ class User(AbstractUser):
         upload_to='users',
         blank=True
     )
+    maintained_fields = ('recipes_count', 'subscribers_count')
+    recipes_count = models.PositiveIntegerField(
+        verbose_name='Число рецептов',
+        default=0,
+        editable=False
+    )
+    subscribers_count = models.PositiveIntegerField(
+        verbose_name='Число подписчиков',
+        default=0,
+        editable=False
+    )
 
     class Meta:
         verbose_name = 'Пользователь'
@@ -95,12 +139,107 @@ class Ingredient(models.Model):
         verbose_name = 'Ингредиент'
         verbose_name_plural = 'Ингредиенты'
         ordering = ('id',)
+        constraints = [
+            models.UniqueConstraint(
+                fields=['name', 'measurement_unit'],
+                name='unique_Ingredient'
+            )
+        ]
 
     def __str__(self):
         return self.name
 
 
-class CulinaryRecipe(models.Model):
+class RecipeQuerySet(models.QuerySet):
+    """Набор запросов рецептов с пакетной подготовкой данных для API."""
+
+    def with_related(self):
+        """
+        Подгрузка автора и ингредиентов фиксированным числом запросов.
+
+        Поисковый индекс в ответах не нужен и не читается.
+        """
+        return self.select_related('author').defer(
+            'search_vector'
+        ).prefetch_related(
+            models.Prefetch(
+                'ingredient_amounts',
+                queryset=RecipeIngredient.objects.select_related('ingredient')
+            )
+        )
+
+    def with_user_flags(self, user):
+        """
+        Аннотация персональных флагов пользователя.
+
+        Добавляет is_favorited, is_in_shopping_cart и is_author_subscribed
+        через Exists(), чтобы сериализаторы не выполняли запрос на каждый
+        рецепт. Для анонимного пользователя все флаги равны False.
+        """
+        if not user or not user.is_authenticated:
+            false = models.Value(False, output_field=models.BooleanField())
+            return self.annotate(
+                is_favorited=false,
+                is_in_shopping_cart=false,
+                is_author_subscribed=false
+            )
+        return self.annotate(
+            is_favorited=models.Exists(
+                UserFavoriteRecipe.objects.filter(
+                    user=user,
+                    recipe=models.OuterRef('pk')
+                )
+            ),
+            is_in_shopping_cart=models.Exists(
+                UserShoppingCart.objects.filter(
+                    user=user,
+                    recipe=models.OuterRef('pk')
+                )
+            ),
+            is_author_subscribed=models.Exists(
+                Subscription.objects.filter(
+                    user=user,
+                    subscribed_to=models.OuterRef('author')
+                )
+            )
+        )
+
+    def latest_by_author(self, author_ids, limit=None):
+        """
+        Последние рецепты каждого автора одним запросом.
+
+        Номер рецепта внутри автора считается оконной функцией
+        ROW_NUMBER() OVER (PARTITION BY author_id ORDER BY created DESC),
+        поэтому число запросов не зависит ни от числа авторов, ни от limit.
+        Возвращает словарь author_id -> список рецептов.
+        """
+        recipes_by_author = {author_id: [] for author_id in author_ids}
+        if not recipes_by_author:
+            return recipes_by_author
+        recipes = self.filter(author_id__in=recipes_by_author)
+        if limit is None:
+            recipes = recipes.order_by('author_id', '-created')
+        else:
+            ranked = recipes.annotate(
+                row_number=models.Window(
+                    expression=RowNumber(),
+                    partition_by=[models.F('author_id')],
+                    order_by=models.F('created').desc()
+                )
+            ).order_by()
+            sql, params = ranked.query.sql_with_params()
+            recipes = self.raw(
+                f'SELECT * FROM ({sql}) ranked '
+                'WHERE ranked.row_number <= %s '
+                'ORDER BY ranked.author_id, ranked.row_number',
+                (*params, limit)
+            )
+        for recipe in recipes:
+            recipes_by_author[recipe.author_id].append(recipe)
+        return recipes_by_author
+
+
+class CulinaryRecipe(MaintainedFieldsMixin, models.Model):
     author = models.ForeignKey(
         User,
         on_delete=models.CASCADE,
@@ -136,11 +275,67 @@ class CulinaryRecipe(models.Model):
         auto_now_add=True,
         verbose_name='Дата публикации'
     )
+    updated = models.DateTimeField(
+        auto_now=True,
+        verbose_name='Дата изменения'
+    )
+    favorites_count = models.PositiveIntegerField(
+        verbose_name='В избранном',
+        default=0,
+        editable=False
+    )
+    cart_count = models.PositiveIntegerField(
+        verbose_name='В корзинах',
+        default=0,
+        editable=False
+    )
+    ingredients_count = models.PositiveIntegerField(
+        verbose_name='Число ингредиентов',
+        default=0,
+        editable=False
+    )
+    trending_score = models.IntegerField(
+        verbose_name='Активность за неделю',
+        default=0,
+        editable=False
+    )
+    search_vector = SearchVectorField(
+        verbose_name='Поисковый индекс',
+        null=True,
+        editable=False
+    )
+
+    objects = RecipeQuerySet.as_manager()
+    maintained_fields = (
+        'favorites_count',
+        'cart_count',
+        'ingredients_count',
+        'trending_score',
+        'search_vector'
+    )
 
     class Meta:
         verbose_name = 'Рецепт'
         verbose_name_plural = 'Рецепты'
         ordering = ('-created',)
+        indexes = [
+            models.Index(
+                fields=['created', 'id'],
+                name='recipe_created_id_idx'
+            ),
+            models.Index(
+                fields=['author', 'created'],
+                name='recipe_author_created_idx'
+            ),
+            models.Index(
+                fields=['favorites_count', 'cart_count', 'id'],
+                name='recipe_popular_idx'
+            ),
+            models.Index(
+                fields=['trending_score', 'id'],
+                name='recipe_trending_idx'
+            )
+        ]
 
     def __str__(self):
         return self.name
@@ -168,6 +363,16 @@ class RecipeIngredient(models.Model):
         verbose_name = 'Ингредиент рецепта'
         verbose_name_plural = 'Ингредиенты рецептов'
         ordering = ('id',)
+        indexes = [
+            models.Index(
+                fields=['recipe', 'ingredient', 'amount'],
+                name='recipe_ingredient_cover_idx'
+            ),
+            models.Index(
+                fields=['ingredient', 'recipe'],
+                name='ingredient_recipe_idx'
+            )
+        ]
 
     def __str__(self):
         return f'В рецепте {self.recipe.name} есть {self.ingredient.name}.'
@@ -186,6 +391,13 @@ class UserFavoriteRecipe(models.Model):
         related_name='users_in_favorite',
         verbose_name='Рецепт'
     )
+    # Удаление вычитается из интервала активности, в котором было
+    # учтено добавление, см. core.trending.
+    created = models.DateTimeField(
+        default=timezone.now,
+        editable=False,
+        verbose_name='Дата добавления'
+    )
 
     class Meta:
         constraints = [
@@ -216,6 +428,13 @@ class UserShoppingCart(models.Model):
         related_name='users_in_shopcart',
         verbose_name='Подписчик'
     )
+    # Удаление вычитается из интервала активности, в котором было
+    # учтено добавление, см. core.trending.
+    created = models.DateTimeField(
+        default=timezone.now,
+        editable=False,
+        verbose_name='Дата добавления'
+    )
 
     class Meta:
         constraints = [
@@ -229,4 +448,113 @@ class UserShoppingCart(models.Model):
         ordering = ('id',)
 
     def __str__(self):
-        return f'{self.user.username} добавил "{self.recipe.title}" в корзину.'
+        return f'{self.user.username} добавил "{self.recipe.name}" в корзину.'
+
+
+class ShoppingListItem(models.Model):
+    """
+    Строка сводного списка покупок пользователя.
+
+    Количества меняются на разницу при изменении корзины и ингредиентов
+    рецептов в ней, команда repair_shopping_lists сверяет их с корзиной.
+    """
+
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='shopping_list',
+        verbose_name='Пользователь'
+    )
+    ingredient = models.ForeignKey(
+        Ingredient,
+        on_delete=models.CASCADE,
+        related_name='shopping_list_items',
+        verbose_name='Ингредиент'
+    )
+    amount = models.IntegerField(
+        verbose_name='Количество'
+    )
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'ingredient'],
+                name='unique_ShoppingListItem'
+            )
+        ]
+        verbose_name = 'Строка списка покупок'
+        verbose_name_plural = 'Списки покупок'
+        ordering = ('id',)
+
+    def __str__(self):
+        return f'{self.user_id}: {self.ingredient_id} - {self.amount}.'
+
+
+class RecipeActivity(models.Model):
+    """
+    Добавления рецепта в избранное и корзину за один час.
+
+    Свежие строки хранят часовые интервалы, команда compact_trending
+    сворачивает старые в суточные и удаляет вышедшие из окна.
+    """
+
+    recipe = models.ForeignKey(
+        CulinaryRecipe,
+        on_delete=models.CASCADE,
+        related_name='activity',
+        verbose_name='Рецепт'
+    )
+    hour = models.DateTimeField(
+        verbose_name='Начало интервала'
+    )
+    favorites = models.IntegerField(
+        verbose_name='Добавления в избранное',
+        default=0
+    )
+    carts = models.IntegerField(
+        verbose_name='Добавления в корзину',
+        default=0
+    )
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['recipe', 'hour'],
+                name='unique_RecipeActivity'
+            )
+        ]
+        indexes = [
+            models.Index(fields=['hour'], name='recipe_activity_hour_idx')
+        ]
+        verbose_name = 'Активность рецепта'
+        verbose_name_plural = 'Активность рецептов'
+        ordering = ('id',)
+
+    def __str__(self):
+        return f'{self.recipe_id} за {self.hour:%Y-%m-%d %H:00}.'
+
+
+class DataVersion(models.Model):
+    """
+    Версия данных пространства имён (см. core.versions).
+
+    Номера выдаются увеличением строки в БД, поэтому два параллельных
+    изменения никогда не получают одну версию. Читается версия из общего
+    кэша, в БД - только после вытеснения ключа.
+    """
+
+    namespace = models.CharField(
+        verbose_name='Пространство имён',
+        max_length=64,
+        primary_key=True
+    )
+    version = models.BigIntegerField(
+        verbose_name='Версия'
+    )
+
+    class Meta:
+        verbose_name = 'Версия данных'
+        verbose_name_plural = 'Версии данных'
+
+    def __str__(self):
+        return f'{self.namespace}: {self.version}'
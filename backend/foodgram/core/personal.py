@@ -0,0 +1,54 @@
+from collections import namedtuple
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from .models import Subscription, UserFavoriteRecipe, UserShoppingCart
+
+PersonalIds = namedtuple(
+    'PersonalIds', ['favorites', 'shopping_cart', 'subscriptions']
+)
+
+EMPTY = PersonalIds(frozenset(), frozenset(), frozenset())
+
+SOURCES = {
+    'favorites': (UserFavoriteRecipe, 'recipe_id'),
+    'shopping_cart': (UserShoppingCart, 'recipe_id'),
+    'subscriptions': (Subscription, 'subscribed_to_id'),
+}
+
+
+def _key(user_id, kind):
+    return f'personal:{user_id}:{kind}'
+
+
+def get_personal_ids(user):
+    """
+    Id избранных рецептов, рецептов в корзине и авторов в подписках.
+
+    Каждое множество загружается одним запросом и хранится в общем кэше
+    до изменения соответствующей связи пользователя.
+    """
+    if not user or not user.is_authenticated:
+        return EMPTY
+    keys = {kind: _key(user.id, kind) for kind in PersonalIds._fields}
+    cached = cache.get_many(keys.values())
+    ids = {}
+    for kind, key in keys.items():
+        if key in cached:
+            ids[kind] = cached[key]
+            continue
+        model, field = SOURCES[kind]
+        ids[kind] = frozenset(
+            model.objects.filter(user=user)
+            .order_by()
+            .values_list(field, flat=True)
+        )
+        cache.set(key, ids[kind], settings.CACHE_TIMEOUT)
+    return PersonalIds(**ids)
+
+
+def invalidate_personal_ids(user_id, kind):
+    """Сброс множества пользователя после фиксации транзакции."""
+    transaction.on_commit(lambda: cache.delete(_key(user_id, kind)))
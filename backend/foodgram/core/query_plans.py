@@ -0,0 +1,223 @@
+import re
+from dataclasses import dataclass
+from datetime import timedelta
+from typing import Callable, Tuple
+
+from django.conf import settings
+from django.contrib.postgres.search import SearchQuery, SearchRank
+from django.db import connection
+from django.db.models import F, Q, Sum, Window
+from django.db.models.functions import RowNumber, Upper
+from django.utils import timezone
+
+from .models import (
+    CulinaryRecipe,
+    Ingredient,
+    RecipeActivity,
+    RecipeIngredient,
+    ShoppingListItem,
+    Subscription,
+    User,
+    UserFavoriteRecipe,
+    UserShoppingCart
+)
+
+SQLITE_SCAN = re.compile(r'\bSCAN (?:TABLE )?(\w+)(?: AS \w+)?\s*$')
+SQLITE_SORT = re.compile(r'USE TEMP B-TREE FOR (?:ORDER|GROUP) BY')
+POSTGRESQL_SCAN = re.compile(r'Seq Scan on (\w+)')
+POSTGRESQL_SORT = re.compile(r'(?:->\s+|^\s*)(?:Incremental )?Sort\b')
+SEARCH_QUERY = SearchQuery('суп', config='russian', search_type='websearch')
+
+
+@dataclass
+class QueryShape:
+    """
+    Форма запроса, который выполняет API.
+
+    allow_sort отмечает запросы, где сортировка неизбежна и ограничена
+    небольшим набором строк (например, избранное одного пользователя).
+    """
+
+    name: str
+    build: Callable
+    allow_sort: bool = False
+    vendors: Tuple[str, ...] = ('sqlite', 'postgresql')
+
+
+def _user_recipes(model, user):
+    return CulinaryRecipe.objects.filter(
+        **{f'{model}__user': user}
+    ).with_user_flags(user)[:10]
+
+
+SHAPES = [
+    QueryShape(
+        'recipes: список',
+        lambda user: CulinaryRecipe.objects.with_user_flags(user)[:10]
+    ),
+    QueryShape(
+        'recipes: ?author=',
+        lambda user: CulinaryRecipe.objects.filter(
+            author=user
+        ).with_user_flags(user)[:10]
+    ),
+    QueryShape(
+        'recipes: ?is_favorited=1',
+        lambda user: _user_recipes('users_in_favorite', user),
+        allow_sort=True
+    ),
+    QueryShape(
+        'recipes: ?is_in_shopping_cart=1',
+        lambda user: _user_recipes('users_in_shopcart', user),
+        allow_sort=True
+    ),
+    QueryShape(
+        'recipes: ?ordering=popular',
+        lambda user: CulinaryRecipe.objects.order_by(
+            '-favorites_count', '-cart_count', '-id'
+        )[:10]
+    ),
+    QueryShape(
+        'recipes: ?ordering=trending',
+        lambda user: CulinaryRecipe.objects.order_by(
+            '-trending_score', '-id'
+        )[:10]
+    ),
+    QueryShape(
+        'recipes: ?cursor=',
+        lambda user: CulinaryRecipe.objects.filter(
+            Q(created__lt=timezone.now())
+            | Q(created=timezone.now(), id__lt=100)
+        ).order_by('-created', '-id')[:10]
+    ),
+    QueryShape(
+        'recipes: ингредиенты страницы',
+        lambda user: RecipeIngredient.objects.filter(
+            recipe_id__in=[1, 2, 3]
+        ).select_related('ingredient'),
+        allow_sort=True
+    ),
+    # Совпадения всегда сортируются по рангу, их число ограничено
+    # RECIPE_SEARCH_LIMIT.
+    QueryShape(
+        'recipes: ?search=',
+        lambda user: CulinaryRecipe.objects.filter(
+            search_vector=SEARCH_QUERY
+        ).annotate(
+            rank=SearchRank(F('search_vector'), SEARCH_QUERY)
+        ).order_by('-rank', '-id').values_list('id', flat=True)[
+            :settings.RECIPE_SEARCH_LIMIT
+        ],
+        allow_sort=True,
+        vendors=('postgresql',)
+    ),
+    QueryShape(
+        'shopping_list: сводный список',
+        lambda user: ShoppingListItem.objects.filter(
+            user=user
+        ).order_by().values_list('ingredient_id', 'amount')
+    ),
+    QueryShape(
+        'shopping_list: изменение рецепта',
+        lambda user: RecipeIngredient.objects.filter(
+            recipe_id__in=[1]
+        ).values('ingredient_id').annotate(
+            total=Sum('amount')
+        ).order_by().values_list('ingredient_id', 'total'),
+        allow_sort=True
+    ),
+    QueryShape(
+        'personal: избранное',
+        lambda user: UserFavoriteRecipe.objects.filter(
+            user=user
+        ).order_by().values_list('recipe_id', flat=True)
+    ),
+    QueryShape(
+        'personal: корзина',
+        lambda user: UserShoppingCart.objects.filter(
+            user=user
+        ).order_by().values_list('recipe_id', flat=True)
+    ),
+    QueryShape(
+        'personal: подписки',
+        lambda user: Subscription.objects.filter(
+            user=user
+        ).order_by().values_list('subscribed_to_id', flat=True)
+    ),
+    QueryShape(
+        'users: subscriptions',
+        lambda user: User.objects.filter(
+            subscribed__user=user
+        ).order_by('id')[:10],
+        allow_sort=True
+    ),
+    QueryShape(
+        'users: рецепты авторов',
+        lambda user: CulinaryRecipe.objects.filter(
+            author_id__in=[user.pk]
+        ).annotate(
+            row_number=Window(
+                expression=RowNumber(),
+                partition_by=[F('author_id')],
+                order_by=F('created').desc()
+            )
+        ).order_by(),
+        allow_sort=True
+    ),
+    QueryShape(
+        'ingredients: ?name=',
+        lambda user: Ingredient.objects.filter(
+            name__istartswith='мол'
+        ).order_by(Upper('name'), 'id')[:20],
+        allow_sort=True,
+        vendors=('postgresql',)
+    ),
+    QueryShape(
+        'recipe_index: построение',
+        lambda user: RecipeIngredient.objects.order_by(
+            'ingredient_id', 'recipe_id'
+        ).values_list('ingredient_id', 'recipe_id')
+    ),
+    QueryShape(
+        'trending: свёртка',
+        lambda user: RecipeActivity.objects.filter(
+            hour__lt=timezone.now() - timedelta(days=7)
+        ).order_by()
+    ),
+]
+
+
+def plan_problems(plan, allow_sort=False):
+    """Полные просмотры таблиц и сортировки в плане запроса."""
+    if connection.vendor == 'postgresql':
+        scan, sort = POSTGRESQL_SCAN, POSTGRESQL_SORT
+    else:
+        scan, sort = SQLITE_SCAN, SQLITE_SORT
+    problems = []
+    for line in plan.splitlines():
+        if scan.search(line) or (not allow_sort and sort.search(line)):
+            problems.append(line.strip())
+    return problems
+
+
+def check_plans(user):
+    """
+    Планы всех форм запросов API для текущей БД.
+
+    На PostgreSQL последовательный просмотр запрещается на время
+    проверки, поэтому Seq Scan в плане означает, что подходящего
+    индекса нет, а не то, что таблица мала. Возвращает список
+    (форма, план, проблемы).
+    """
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute('SET LOCAL enable_seqscan = off')
+    report = []
+    for shape in SHAPES:
+        if connection.vendor not in shape.vendors:
+            continue
+        plan = shape.build(user).explain()
+        report.append(
+            (shape.name, plan, plan_problems(plan, shape.allow_sort))
+        )
+    return report
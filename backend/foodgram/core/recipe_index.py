@@ -0,0 +1,158 @@
+import bisect
+import threading
+from array import array
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from . import versions
+from .models import RecipeIngredient
+
+# Сколько последних изменений хранит журнал и сколько рецептов можно
+# применить к индексу точечно; при большем отставании индекс
+# перестраивается целиком.
+JOURNAL_SIZE = 1000
+PATCH_LIMIT = 200
+
+
+def _change_key(version):
+    return f'recipe-index:change:{version}'
+
+
+class RecipeIngredientIndex:
+    """
+    Обратный индекс ингредиент -> рецепты в памяти процесса.
+
+    Для каждого ингредиента хранится отсортированный массив id рецептов,
+    для каждого рецепта - число его ингредиентов. Снимок не изменяется:
+    точечное обновление создаёт новый снимок, копируя только
+    затронутые массивы.
+    """
+
+    def __init__(self, version, postings, sizes):
+        self.version = version
+        self.postings = postings
+        self.sizes = sizes
+
+    @classmethod
+    def build(cls, version):
+        postings = defaultdict(lambda: array('q'))
+        sizes = array('I')
+        rows = RecipeIngredient.objects.order_by(
+            'ingredient_id', 'recipe_id'
+        ).values_list('ingredient_id', 'recipe_id')
+        for ingredient_id, recipe_id in rows.iterator(chunk_size=10000):
+            postings[ingredient_id].append(recipe_id)
+            if recipe_id >= len(sizes):
+                sizes.extend([0] * (recipe_id + 1 - len(sizes)))
+            sizes[recipe_id] += 1
+        return cls(version, dict(postings), sizes)
+
+    def patched(self, version, recipe_ids):
+        """Новый снимок с перечитанными ингредиентами рецептов."""
+        added = defaultdict(list)
+        sizes = array('I', self.sizes)
+        for recipe_id in recipe_ids:
+            if recipe_id < len(sizes):
+                sizes[recipe_id] = 0
+        rows = RecipeIngredient.objects.filter(
+            recipe_id__in=recipe_ids
+        ).values_list('ingredient_id', 'recipe_id')
+        for ingredient_id, recipe_id in rows:
+            added[ingredient_id].append(recipe_id)
+            if recipe_id >= len(sizes):
+                sizes.extend([0] * (recipe_id + 1 - len(sizes)))
+            sizes[recipe_id] += 1
+        postings = dict(self.postings)
+        for ingredient_id, posting in self.postings.items():
+            if ingredient_id in added or any(
+                self._contains(posting, recipe_id) for recipe_id in recipe_ids
+            ):
+                postings[ingredient_id] = array('q', sorted(
+                    {pk for pk in posting if pk not in recipe_ids}
+                    | set(added.pop(ingredient_id, ()))
+                ))
+        for ingredient_id, recipes in added.items():
+            postings[ingredient_id] = array('q', sorted(recipes))
+        return RecipeIngredientIndex(version, postings, sizes)
+
+    @staticmethod
+    def _contains(posting, recipe_id):
+        position = bisect.bisect_left(posting, recipe_id)
+        return position < len(posting) and posting[position] == recipe_id
+
+    def match(self, ingredient_ids, max_missing=0, limit=None):
+        """
+        Рецепты, для которых не хватает не больше max_missing ингредиентов.
+
+        Совпадения считаются пересечением массивов id, без запросов к БД.
+        Сортировка: доля имеющихся ингредиентов по убыванию, затем число
+        недостающих, затем новые рецепты выше.
+        """
+        matched = Counter()
+        for ingredient_id in set(ingredient_ids):
+            matched.update(self.postings.get(ingredient_id, ()))
+        found = []
+        for recipe_id, have in matched.items():
+            size = self.sizes[recipe_id]
+            if size - have <= max_missing:
+                found.append((-have / size, size - have, -recipe_id))
+        found.sort()
+        return [-item[2] for item in found[:limit]]
+
+
+def record_change(recipe_id):
+    """
+    Запись изменённого рецепта в журнал после фиксации транзакции.
+
+    Каждое изменение получает свой номер версии из БД, по журналу другие
+    процессы обновляют свои индексы точечно. Запись журнала появляется
+    раньше версии; если записи всё же нет (вытеснена или ещё не
+    опубликована), индекс перестраивается целиком.
+    """
+    def publish():
+        version = versions.allocate_version(versions.RECIPE_INGREDIENTS)
+        cache.set(_change_key(version), recipe_id, settings.CACHE_TIMEOUT)
+        versions.publish_version(versions.RECIPE_INGREDIENTS, version)
+    transaction.on_commit(publish)
+
+
+_index = None
+_lock = threading.Lock()
+
+
+def get_index():
+    """
+    Обратный индекс текущего процесса.
+
+    Строится одним запросом при первом обращении, после изменений
+    рецептов применяет записи журнала; если записей не хватает или их
+    слишком много, перестраивается целиком.
+    """
+    global _index
+    version = versions.get_version(versions.RECIPE_INGREDIENTS)
+    index = _index
+    if index is not None and index.version == version:
+        return index
+    with _lock:
+        index = _index
+        if index is not None and index.version == version:
+            return index
+        lag = version - index.version if index is not None else None
+        if lag is None or not 0 < lag <= JOURNAL_SIZE:
+            index = RecipeIngredientIndex.build(version)
+        else:
+            keys = [
+                _change_key(number)
+                for number in range(index.version + 1, version + 1)
+            ]
+            changes = cache.get_many(keys)
+            recipe_ids = set(changes.values())
+            if len(changes) == len(keys) and len(recipe_ids) <= PATCH_LIMIT:
+                index = index.patched(version, recipe_ids)
+            else:
+                index = RecipeIngredientIndex.build(version)
+        _index = index
+    return index
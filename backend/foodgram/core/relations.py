@@ -0,0 +1,177 @@
+from collections import namedtuple
+
+from django.db import connection, transaction
+from django.utils import timezone
+
+from . import shopping_lists, trending
+from .counters import change_counters
+from .models import Subscription, UserFavoriteRecipe, UserShoppingCart
+from .personal import invalidate_personal_ids
+
+Relation = namedtuple('Relation', ['model', 'field', 'counter', 'activity'])
+
+RELATIONS = {
+    'favorites': Relation(
+        UserFavoriteRecipe, 'recipe', 'favorites_count', trending.FAVORITES
+    ),
+    'shopping_cart': Relation(
+        UserShoppingCart, 'recipe', 'cart_count', trending.CARTS
+    ),
+    'subscriptions': Relation(
+        Subscription, 'subscribed_to', 'subscribers_count', None
+    ),
+}
+
+INSERT_SQL = '''
+INSERT INTO {table} ({user}, {target})
+SELECT %s, target FROM unnest(%s) AS target
+ON CONFLICT DO NOTHING
+RETURNING {target}
+'''
+INSERT_CREATED_SQL = '''
+INSERT INTO {table} ({user}, {target}, {created})
+SELECT %s, target, %s FROM unnest(%s) AS target
+ON CONFLICT DO NOTHING
+RETURNING {target}
+'''
+DELETE_SQL = '''
+DELETE FROM {table} WHERE {user} = %s AND {target} = ANY(%s)
+RETURNING {target}
+'''
+DELETE_IN_SQL = '''
+DELETE FROM {table} WHERE {user} = %s AND {target} IN ({targets})
+'''
+
+
+def _format(sql, relation, **kwargs):
+    quote = connection.ops.quote_name
+    meta = relation.model._meta
+    return sql.format(
+        table=quote(meta.db_table),
+        user=quote(meta.get_field('user').column),
+        target=quote(meta.get_field(relation.field).column),
+        created=quote('created'),
+        **kwargs
+    )
+
+
+def _execute(sql, relation, params):
+    with connection.cursor() as cursor:
+        cursor.execute(_format(sql, relation), params)
+        return sorted(row[0] for row in cursor.fetchall())
+
+
+def _existing(relation, user_id, target_ids):
+    return set(
+        relation.model.objects.filter(
+            user_id=user_id, **{f'{relation.field}_id__in': target_ids}
+        ).values_list(f'{relation.field}_id', flat=True)
+    )
+
+
+def _insert(relation, user_id, target_ids, created):
+    """
+    Вставка связей, возвращает id действительно добавленных объектов.
+
+    На PostgreSQL это один INSERT ... ON CONFLICT DO NOTHING RETURNING:
+    параллельный запрос с теми же id ничего не вставит и не изменит
+    счётчики повторно. На остальных СУБД уже существующие связи
+    читаются отдельным запросом. У избранного и корзины сохраняется
+    время добавления created.
+    """
+    if connection.vendor == 'postgresql' and relation.activity:
+        return _execute(
+            INSERT_CREATED_SQL, relation, [user_id, created, target_ids]
+        )
+    if connection.vendor == 'postgresql':
+        return _execute(INSERT_SQL, relation, [user_id, target_ids])
+    existing = _existing(relation, user_id, target_ids)
+    added = [pk for pk in target_ids if pk not in existing]
+    extra = {'created': created} if relation.activity else {}
+    relation.model.objects.bulk_create(
+        [
+            relation.model(
+                user_id=user_id, **{f'{relation.field}_id': pk}, **extra
+            )
+            for pk in added
+        ],
+        ignore_conflicts=True
+    )
+    return added
+
+
+def _delete(relation, user_id, target_ids):
+    """
+    Удаление связей, возвращает id действительно удалённых объектов.
+
+    Как и вставка, удаление идёт в обход сигналов post_delete:
+    счётчики меняются одним UPDATE в _change, а не по строке.
+    """
+    if connection.vendor == 'postgresql':
+        return _execute(DELETE_SQL, relation, [user_id, target_ids])
+    existing = sorted(_existing(relation, user_id, target_ids))
+    if existing:
+        with connection.cursor() as cursor:
+            cursor.execute(
+                _format(
+                    DELETE_IN_SQL,
+                    relation,
+                    targets=', '.join(['%s'] * len(existing))
+                ),
+                [user_id, *existing]
+            )
+    return existing
+
+
+def _change(kind, user_id, target_ids, delta):
+    relation = RELATIONS[kind]
+    target_ids = sorted(set(target_ids))
+    if not target_ids:
+        return []
+    with transaction.atomic():
+        if delta > 0:
+            now = timezone.now()
+            changed = _insert(relation, user_id, target_ids, now)
+        else:
+            if relation.activity:
+                # Время добавления нужно трендам, после удаления его
+                # уже не прочитать.
+                added_at = dict(
+                    relation.model.objects.select_for_update().filter(
+                        user_id=user_id,
+                        **{f'{relation.field}_id__in': target_ids}
+                    ).values_list(f'{relation.field}_id', 'created')
+                )
+            changed = _delete(relation, user_id, target_ids)
+        if changed:
+            change_counters(
+                relation.model._meta.get_field(relation.field).related_model,
+                changed,
+                relation.counter,
+                delta
+            )
+            if relation.activity and delta > 0:
+                trending.record_added(changed, relation.activity, now)
+            elif relation.activity:
+                trending.record_removed(
+                    [(pk, added_at[pk]) for pk in changed], relation.activity
+                )
+            if kind == 'shopping_cart':
+                shopping_lists.change_cart(user_id, changed, delta)
+            invalidate_personal_ids(user_id, kind)
+    return changed
+
+
+def add(kind, user_id, target_ids):
+    """
+    Добавление рецептов в избранное или корзину либо подписка на авторов.
+
+    kind - ключ RELATIONS. Уже существующие связи пропускаются, счётчики
+    и тренды меняются только для добавленных. Возвращает их id.
+    """
+    return _change(kind, user_id, target_ids, 1)
+
+
+def remove(kind, user_id, target_ids):
+    """Обратное к add действие, возвращает id удалённых связей."""
+    return _change(kind, user_id, target_ids, -1)
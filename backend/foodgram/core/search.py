@@ -0,0 +1,166 @@
+import hashlib
+import re
+
+from django.conf import settings
+from django.contrib.postgres.search import SearchQuery, SearchRank
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import F
+
+from . import versions
+from .models import CulinaryRecipe
+
+SEARCH_CONFIG = 'russian'
+FTS_TABLE = 'core_recipe_search'
+# Веса полей: название важнее ингредиентов, ингредиенты важнее описания.
+FTS_WEIGHTS = (10.0, 4.0, 1.0)
+
+REBUILD_SQL = {
+    'postgresql': f'''
+        UPDATE core_culinaryrecipe AS recipe SET search_vector =
+            setweight(to_tsvector('{SEARCH_CONFIG}', recipe.name), 'A')
+            || setweight(to_tsvector('{SEARCH_CONFIG}', coalesce((
+                SELECT string_agg(ingredient.name, ' ')
+                FROM core_recipeingredient AS amount
+                JOIN core_ingredient AS ingredient
+                    ON ingredient.id = amount.ingredient_id
+                WHERE amount.recipe_id = recipe.id
+            ), '')), 'B')
+            || setweight(to_tsvector('{SEARCH_CONFIG}', recipe.text), 'C')
+        {{where}}
+    ''',
+    'sqlite': f'''
+        INSERT INTO {FTS_TABLE} (rowid, name, ingredients, text)
+        SELECT recipe.id, recipe.name, coalesce((
+            SELECT group_concat(ingredient.name, ' ')
+            FROM core_recipeingredient AS amount
+            JOIN core_ingredient AS ingredient
+                ON ingredient.id = amount.ingredient_id
+            WHERE amount.recipe_id = recipe.id
+        ), ''), recipe.text
+        FROM core_culinaryrecipe AS recipe {{where}}
+    ''',
+}
+RECIPES_WITH_INGREDIENT = (
+    'recipe.id IN (SELECT recipe_id FROM core_recipeingredient '
+    'WHERE ingredient_id = %s)'
+)
+
+
+def index_recipes(recipe_ids=None, ingredient_id=None):
+    """
+    Пересчёт поискового индекса одним запросом.
+
+    Пересчитываются рецепты из recipe_ids, рецепты с ингредиентом
+    ingredient_id или, без аргументов, все рецепты. Названия
+    ингредиентов читаются из БД тем же запросом. На PostgreSQL
+    пересчитывается столбец search_vector, на SQLite - строки таблицы
+    FTS5.
+    """
+    sql = REBUILD_SQL.get(connection.vendor)
+    if sql is None:
+        return
+    if recipe_ids is not None:
+        recipe_ids = list(recipe_ids)
+        if not recipe_ids:
+            return
+        where = 'WHERE recipe.id IN ({})'.format(
+            ', '.join(['%s'] * len(recipe_ids))
+        )
+        params = recipe_ids
+    elif ingredient_id is not None:
+        where, params = f'WHERE {RECIPES_WITH_INGREDIENT}', [ingredient_id]
+    else:
+        where, params = '', []
+    with connection.cursor() as cursor:
+        if connection.vendor == 'sqlite' and where:
+            cursor.execute(
+                f'DELETE FROM {FTS_TABLE} WHERE rowid IN '
+                f'(SELECT recipe.id FROM core_culinaryrecipe AS recipe '
+                f'{where})',
+                params
+            )
+        elif connection.vendor == 'sqlite':
+            cursor.execute(f'DELETE FROM {FTS_TABLE}')
+        cursor.execute(sql.format(where=where), params)
+
+
+def rebuild_index():
+    """Полная перестройка поискового индекса одним запросом."""
+    index_recipes()
+    versions.bump_version_on_commit(versions.RECIPES)
+
+
+def remove_recipe(recipe_id):
+    """Удаление рецепта из таблицы FTS5 (на PostgreSQL не требуется)."""
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [recipe_id]
+        )
+
+
+def _search_postgresql(query, limit):
+    search_query = SearchQuery(
+        query, config=SEARCH_CONFIG, search_type='websearch'
+    )
+    return list(
+        CulinaryRecipe.objects
+        .filter(search_vector=search_query)
+        .annotate(rank=SearchRank(F('search_vector'), search_query))
+        .order_by('-rank', '-id')
+        .values_list('id', flat=True)[:limit]
+    )
+
+
+def _search_sqlite(query, limit):
+    words = re.findall(r'\w+', query.lower())
+    if not words:
+        return []
+    # FTS5 не умеет русскую морфологию, поэтому слова ищутся по префиксу;
+    # однобуквенные предлоги по префиксу совпали бы почти со всем.
+    match = ' '.join(
+        f'"{word}"*' if len(word) > 1 else f'"{word}"' for word in words
+    )
+    weights = ', '.join(str(weight) for weight in FTS_WEIGHTS)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s '
+            f'ORDER BY bm25({FTS_TABLE}, {weights}), rowid DESC LIMIT %s',
+            [match, limit]
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+
+def rank_recipes(query, limit=None):
+    """Id рецептов по убыванию релевантности без кэша."""
+    limit = limit or settings.RECIPE_SEARCH_LIMIT
+    if connection.vendor == 'postgresql':
+        return _search_postgresql(query, limit)
+    if connection.vendor == 'sqlite':
+        return _search_sqlite(query, limit)
+    return list(
+        CulinaryRecipe.objects
+        .filter(name__icontains=query)
+        .values_list('id', flat=True)[:limit]
+    )
+
+
+def search_recipes(query):
+    """
+    Ранжированный список id рецептов по запросу.
+
+    Список считается один раз и кэшируется до изменения рецептов,
+    страницы выдачи нарезаются из него без повторного ранжирования.
+    """
+    query = ' '.join(query.split())
+    if not query:
+        return []
+    digest = hashlib.md5(query.lower().encode()).hexdigest()
+    key = f'search:{versions.get_version(versions.RECIPES)}:{digest}'
+    ranked = cache.get(key)
+    if ranked is None:
+        ranked = rank_recipes(query)
+        cache.set(key, ranked, settings.CACHE_TIMEOUT)
+    return ranked
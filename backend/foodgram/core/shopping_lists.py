@@ -0,0 +1,182 @@
+from django.db import connection, transaction
+from django.db.models import Sum
+
+from .models import RecipeIngredient, ShoppingListItem, UserShoppingCart
+
+BATCH_SIZE = 5000
+
+UPSERT_SQL = '''
+INSERT INTO core_shoppinglistitem (user_id, ingredient_id, amount)
+SELECT {users}, delta.ingredient_id, delta.amount
+FROM unnest(%s, %s) AS delta (ingredient_id, amount) {join}
+ON CONFLICT (user_id, ingredient_id) DO UPDATE
+SET amount = core_shoppinglistitem.amount + EXCLUDED.amount
+'''
+USER_UPSERT_SQL = UPSERT_SQL.format(users='%s', join='')
+CART_UPSERT_SQL = UPSERT_SQL.format(
+    users='cart.user_id',
+    join='JOIN core_usershoppingcart AS cart ON cart.recipe_id = %s'
+)
+
+
+def recipe_amounts(recipe_ids):
+    """Суммарные количества ингредиентов рецептов по id ингредиента."""
+    return dict(
+        RecipeIngredient.objects
+        .filter(recipe_id__in=recipe_ids)
+        .values('ingredient_id')
+        .annotate(total=Sum('amount'))
+        .order_by()
+        .values_list('ingredient_id', 'total')
+    )
+
+
+def _apply(user_ids, deltas):
+    """Изменение количеств без UPSERT: чтение, правка и запись строк."""
+    items = {
+        (item.user_id, item.ingredient_id): item
+        for item in ShoppingListItem.objects.filter(
+            user_id__in=user_ids, ingredient_id__in=deltas
+        )
+    }
+    changed, created = [], []
+    for user_id in user_ids:
+        for ingredient_id, delta in deltas.items():
+            item = items.get((user_id, ingredient_id))
+            if item is None:
+                created.append(ShoppingListItem(
+                    user_id=user_id, ingredient_id=ingredient_id, amount=delta
+                ))
+            else:
+                item.amount += delta
+                changed.append(item)
+    ShoppingListItem.objects.bulk_update(
+        changed, ['amount'], batch_size=BATCH_SIZE
+    )
+    ShoppingListItem.objects.bulk_create(created, batch_size=BATCH_SIZE)
+
+
+def _change(deltas, user_id=None, recipe_id=None):
+    """
+    Прибавление количеств к списку пользователя или к спискам всех,
+    у кого рецепт в корзине.
+
+    На PostgreSQL это один INSERT ... ON CONFLICT DO UPDATE, прибавление
+    выполняется в БД и не теряется при параллельных изменениях. Строки,
+    количество в которых стало нулевым, удаляются.
+    """
+    deltas = {pk: delta for pk, delta in deltas.items() if delta}
+    if not deltas:
+        return
+    items = ShoppingListItem.objects.filter(amount__lte=0)
+    if user_id is not None:
+        items = items.filter(user_id=user_id)
+    else:
+        items = items.filter(user__shopping_cart__recipe_id=recipe_id)
+    with transaction.atomic():
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                if user_id is not None:
+                    cursor.execute(
+                        USER_UPSERT_SQL,
+                        [user_id, list(deltas), list(deltas.values())]
+                    )
+                else:
+                    cursor.execute(
+                        CART_UPSERT_SQL,
+                        [list(deltas), list(deltas.values()), recipe_id]
+                    )
+        else:
+            _apply(
+                [user_id] if user_id is not None else list(
+                    UserShoppingCart.objects.filter(
+                        recipe_id=recipe_id
+                    ).values_list('user_id', flat=True)
+                ),
+                deltas
+            )
+        if any(delta < 0 for delta in deltas.values()):
+            items.delete()
+
+
+def change_cart(user_id, recipe_ids, sign):
+    """Учёт добавления (sign=1) или удаления (sign=-1) рецептов корзины."""
+    _change(
+        {
+            ingredient_id: sign * amount
+            for ingredient_id, amount in recipe_amounts(recipe_ids).items()
+        },
+        user_id=user_id
+    )
+
+
+def change_recipe(recipe_id, deltas):
+    """Изменение ингредиентов рецепта в корзинах всех пользователей."""
+    _change(deltas, recipe_id=recipe_id)
+
+
+def get_amounts(user):
+    """Количества ингредиентов списка покупок по id ингредиента."""
+    return dict(
+        ShoppingListItem.objects
+        .filter(user=user)
+        .order_by()
+        .values_list('ingredient_id', 'amount')
+    )
+
+
+def actual_amounts():
+    """Количества по корзинам, пересчитанные из ингредиентов рецептов."""
+    return {
+        (user_id, ingredient_id): amount
+        for user_id, ingredient_id, amount in (
+            RecipeIngredient.objects
+            .filter(recipe__users_in_shopcart__isnull=False)
+            .values('recipe__users_in_shopcart__user', 'ingredient_id')
+            .annotate(total=Sum('amount'))
+            .order_by()
+            .values_list(
+                'recipe__users_in_shopcart__user', 'ingredient_id', 'total'
+            )
+            .iterator(chunk_size=BATCH_SIZE)
+        )
+    }
+
+
+def repair_shopping_lists(fix=True, rebuild=False):
+    """
+    Сверка сводных списков покупок с корзинами.
+
+    Списки пользователей с расхождениями пересобираются целиком,
+    при rebuild - списки всех пользователей. Возвращает число строк
+    с расхождениями и число затронутых пользователей.
+    """
+    actual = actual_amounts()
+    stored = {
+        (user_id, ingredient_id): amount
+        for user_id, ingredient_id, amount in (
+            ShoppingListItem.objects
+            .values_list('user_id', 'ingredient_id', 'amount')
+            .iterator(chunk_size=BATCH_SIZE)
+        )
+    }
+    drifted = {
+        key for key in actual.keys() | stored.keys()
+        if actual.get(key) != stored.get(key)
+    }
+    users = {user_id for user_id, _ in drifted}
+    if fix and (users or rebuild):
+        items = [
+            ShoppingListItem(
+                user_id=user_id, ingredient_id=ingredient_id, amount=amount
+            )
+            for (user_id, ingredient_id), amount in actual.items()
+            if rebuild or user_id in users
+        ]
+        stale = ShoppingListItem.objects.all()
+        if not rebuild:
+            stale = stale.filter(user_id__in=users)
+        with transaction.atomic():
+            stale.delete()
+            ShoppingListItem.objects.bulk_create(items, batch_size=BATCH_SIZE)
+    return {'rows': len(drifted), 'users': len(users)}
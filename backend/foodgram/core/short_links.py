@@ -0,0 +1,100 @@
+import re
+import string
+
+from django.conf import settings
+from django.core.cache import cache
+
+from . import versions
+from .models import CulinaryRecipe
+
+BASE62 = string.digits + string.ascii_lowercase + string.ascii_uppercase
+BASE62_CODE = re.compile(r'[0-9a-zA-Z]{1,11}')
+HEX_CODE = re.compile(r'[0-9a-fA-F]{1,16}')
+
+
+def encode(recipe_id):
+    """Короткий код рецепта в base62."""
+    code = ''
+    while True:
+        recipe_id, digit = divmod(recipe_id, 62)
+        code = BASE62[digit] + code
+        if not recipe_id:
+            return code
+
+
+def decode(code):
+    """Id рецепта из base62-кода или None для некорректного кода."""
+    if not BASE62_CODE.fullmatch(code):
+        return None
+    recipe_id = 0
+    for char in code:
+        recipe_id = recipe_id * 62 + BASE62.index(char)
+    return recipe_id
+
+
+def decode_hex(code):
+    """Id рецепта из шестнадцатеричного кода ссылок старого формата."""
+    return int(code, 16) if HEX_CODE.fullmatch(code) else None
+
+
+def _bitmap_key(version):
+    return f'recipe-ids:{version}'
+
+
+class RecipeIdBitmap:
+    """
+    Битовая карта id существующих рецептов в памяти процесса.
+
+    Бит id выставлен, если рецепт существует. На миллион рецептов
+    карта занимает 125 КБ, проверка - одно обращение к байту.
+    """
+
+    def __init__(self, version, bitmap):
+        self.version = version
+        self.bitmap = bitmap
+
+    @classmethod
+    def build(cls, version):
+        bitmap = bytearray()
+        ids = CulinaryRecipe.objects.order_by('id').values_list(
+            'id', flat=True
+        )
+        for recipe_id in ids.iterator(chunk_size=10000):
+            if recipe_id >> 3 >= len(bitmap):
+                bitmap.extend(bytes((recipe_id >> 3) + 1 - len(bitmap)))
+            bitmap[recipe_id >> 3] |= 1 << (recipe_id & 7)
+        return cls(version, bytes(bitmap))
+
+    def __contains__(self, recipe_id):
+        return 0 <= recipe_id >> 3 < len(self.bitmap) and bool(
+            self.bitmap[recipe_id >> 3] & 1 << (recipe_id & 7)
+        )
+
+
+_recipe_ids = None
+
+
+def get_recipe_ids(refresh=False):
+    """
+    Id существующих рецептов для проверки коротких ссылок.
+
+    Версия меняется только при создании и удалении рецептов. Карту
+    новой версии строит из БД один процесс, остальные берут её из
+    общего кэша.
+    """
+    global _recipe_ids
+    version = versions.get_version(versions.RECIPE_IDS)
+    recipe_ids = _recipe_ids
+    if refresh or recipe_ids is None or recipe_ids.version != version:
+        bitmap = None if refresh else cache.get(_bitmap_key(version))
+        if bitmap is None:
+            recipe_ids = RecipeIdBitmap.build(version)
+            cache.set(
+                _bitmap_key(version),
+                recipe_ids.bitmap,
+                settings.CACHE_TIMEOUT
+            )
+        else:
+            recipe_ids = RecipeIdBitmap(version, bitmap)
+        _recipe_ids = recipe_ids
+    return recipe_ids
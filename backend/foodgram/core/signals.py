@@ -0,0 +1,282 @@
+from django.core.files.storage import default_storage
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from . import (
+    images,
+    recipe_index,
+    search,
+    shopping_lists,
+    trending,
+    versions
+)
+from .counters import count_instance
+from .models import (
+    CulinaryRecipe,
+    Ingredient,
+    RecipeIngredient,
+    Subscription,
+    User,
+    UserFavoriteRecipe,
+    UserShoppingCart
+)
+from .personal import invalidate_personal_ids
+
+
+@receiver([post_save, post_delete], sender=Ingredient)
+def invalidate_ingredients(**kwargs):
+    versions.bump_version_on_commit(versions.INGREDIENTS)
+
+
+@receiver([post_save, post_delete], sender=CulinaryRecipe)
+@receiver([post_save, post_delete], sender=RecipeIngredient)
+def invalidate_recipes(**kwargs):
+    versions.bump_version_on_commit(versions.RECIPES)
+
+
+@receiver([post_save, post_delete], sender=CulinaryRecipe)
+def update_recipe_index(instance, **kwargs):
+    recipe_index.record_change(instance.pk)
+
+
+@receiver([post_save, post_delete], sender=RecipeIngredient)
+def update_recipe_index_ingredients(instance, **kwargs):
+    recipe_index.record_change(instance.recipe_id)
+
+
+@receiver(post_save, sender=CulinaryRecipe)
+def update_search_index(instance, raw=False, update_fields=None, **kwargs):
+    # Поисковый индекс пересчитывается в той же транзакции, до
+    # увеличения версии рецептов, поэтому кэш поиска не получит
+    # старую выдачу под новой версией.
+    if raw or update_fields is not None and not (
+        {'name', 'text'} & set(update_fields)
+    ):
+        return
+    search.index_recipes([instance.pk])
+
+
+@receiver([post_save, post_delete], sender=RecipeIngredient)
+def update_search_index_ingredients(instance, raw=False, **kwargs):
+    if not raw:
+        search.index_recipes([instance.recipe_id])
+
+
+@receiver(post_save, sender=Ingredient)
+def update_search_index_ingredient(instance, created, raw=False,
+                                   update_fields=None, **kwargs):
+    # У нового ингредиента ещё нет рецептов.
+    if created or raw or update_fields is not None and (
+        'name' not in update_fields
+    ):
+        return
+    search.index_recipes(ingredient_id=instance.pk)
+    versions.bump_version_on_commit(versions.RECIPES)
+
+
+@receiver(post_delete, sender=CulinaryRecipe)
+def remove_from_search_index(instance, **kwargs):
+    search.remove_recipe(instance.pk)
+
+
+# Списки покупок меняются на разницу при любом изменении корзин и
+# ингредиентов рецептов: API, админка, ORM, каскадное удаление.
+# Массовые операции relations и сериализатора рецепта идут в обход
+# сигналов и меняют списки сами. При удалении рецепта каскадом пара
+# (корзина, ингредиент) вычитается ровно один раз: первая удалённая
+# из двух строк вычитает её, для второй пары в БД уже нет.
+
+@receiver(pre_save, sender=RecipeIngredient)
+def remember_recipe_ingredient(instance, raw=False, **kwargs):
+    instance._stored_row = None if raw or instance.pk is None else (
+        RecipeIngredient.objects.filter(pk=instance.pk)
+        .values_list('recipe_id', 'ingredient_id', 'amount')
+        .first()
+    )
+
+
+@receiver(post_save, sender=RecipeIngredient)
+def add_to_shopping_lists(instance, raw=False, **kwargs):
+    if raw:
+        return
+    stored = getattr(instance, '_stored_row', None)
+    deltas = {instance.ingredient_id: instance.amount}
+    if stored is not None:
+        recipe_id, ingredient_id, amount = stored
+        if recipe_id == instance.recipe_id:
+            deltas[ingredient_id] = deltas.get(ingredient_id, 0) - amount
+        else:
+            shopping_lists.change_recipe(recipe_id, {ingredient_id: -amount})
+    shopping_lists.change_recipe(instance.recipe_id, deltas)
+
+
+@receiver(post_delete, sender=RecipeIngredient)
+def remove_from_shopping_lists(instance, **kwargs):
+    shopping_lists.change_recipe(
+        instance.recipe_id, {instance.ingredient_id: -instance.amount}
+    )
+
+
+@receiver(pre_save, sender=UserShoppingCart)
+def remember_cart_row(instance, raw=False, **kwargs):
+    instance._stored_row = None if raw or instance.pk is None else (
+        UserShoppingCart.objects.filter(pk=instance.pk)
+        .values_list('user_id', 'recipe_id')
+        .first()
+    )
+
+
+@receiver(post_save, sender=UserShoppingCart)
+def add_cart_to_shopping_list(instance, raw=False, **kwargs):
+    if raw:
+        return
+    stored = getattr(instance, '_stored_row', None)
+    if stored == (instance.user_id, instance.recipe_id):
+        return
+    if stored is not None:
+        user_id, recipe_id = stored
+        shopping_lists.change_cart(user_id, [recipe_id], -1)
+    shopping_lists.change_cart(instance.user_id, [instance.recipe_id], 1)
+
+
+@receiver(post_delete, sender=UserShoppingCart)
+def remove_cart_from_shopping_list(instance, **kwargs):
+    shopping_lists.change_cart(instance.user_id, [instance.recipe_id], -1)
+
+
+@receiver([post_save, post_delete], sender=CulinaryRecipe)
+def invalidate_recipe_ids(created=True, **kwargs):
+    # Редактирование рецепта не меняет набор id для коротких ссылок.
+    if created:
+        versions.bump_version_on_commit(versions.RECIPE_IDS)
+
+
+@receiver([post_save, post_delete], sender=User)
+def invalidate_users(update_fields=None, **kwargs):
+    if update_fields is not None and set(update_fields) == {'last_login'}:
+        return
+    versions.bump_version_on_commit(versions.USERS)
+
+
+@receiver(post_save, sender=CulinaryRecipe)
+@receiver(post_save, sender=RecipeIngredient)
+@receiver(post_save, sender=Subscription)
+@receiver(post_save, sender=UserFavoriteRecipe)
+@receiver(post_save, sender=UserShoppingCart)
+def count_created(instance, created, raw=False, **kwargs):
+    # Счётчики меняются при любом пути изменения: API, админка, ORM.
+    # Массовые операции relations идут в обход сигналов и меняют
+    # счётчики сами.
+    if created and not raw:
+        count_instance(instance, 1)
+
+
+@receiver(post_delete, sender=CulinaryRecipe)
+@receiver(post_delete, sender=RecipeIngredient)
+@receiver(post_delete, sender=Subscription)
+@receiver(post_delete, sender=UserFavoriteRecipe)
+@receiver(post_delete, sender=UserShoppingCart)
+def count_deleted(instance, **kwargs):
+    # В том числе при каскадном удалении пользователя или рецепта.
+    count_instance(instance, -1)
+
+
+ACTIVITY_FIELDS = {
+    UserFavoriteRecipe: trending.FAVORITES,
+    UserShoppingCart: trending.CARTS,
+}
+
+
+@receiver(post_save, sender=UserFavoriteRecipe)
+@receiver(post_save, sender=UserShoppingCart)
+def record_added_activity(sender, instance, created, raw=False, **kwargs):
+    # Массовые операции relations учитывают активность сами.
+    if created and not raw:
+        trending.record_added(
+            [instance.recipe_id], ACTIVITY_FIELDS[sender], instance.created
+        )
+
+
+@receiver(post_delete, sender=UserFavoriteRecipe)
+@receiver(post_delete, sender=UserShoppingCart)
+def record_removed_activity(sender, instance, **kwargs):
+    trending.record_removed(
+        [(instance.recipe_id, instance.created)], ACTIVITY_FIELDS[sender]
+    )
+
+
+@receiver([post_save, post_delete], sender=UserFavoriteRecipe)
+def invalidate_favorite_ids(instance, **kwargs):
+    invalidate_personal_ids(instance.user_id, 'favorites')
+
+
+@receiver([post_save, post_delete], sender=UserShoppingCart)
+def invalidate_shopping_cart_ids(instance, **kwargs):
+    invalidate_personal_ids(instance.user_id, 'shopping_cart')
+
+
+@receiver([post_save, post_delete], sender=Subscription)
+def invalidate_subscription_ids(instance, **kwargs):
+    invalidate_personal_ids(instance.user_id, 'subscriptions')
+
+
+def _remember_image(instance, field_name, raw, update_fields):
+    stored = None
+    if not raw and instance.pk is not None and (
+        update_fields is None or field_name in update_fields
+    ):
+        stored = (
+            type(instance).objects.filter(pk=instance.pk)
+            .values_list(field_name, flat=True)
+            .first()
+        )
+    setattr(instance, f'_stored_{field_name}', stored)
+
+
+def _update_image_variants(instance, field_name, raw, update_fields):
+    # Варианты создаются при сохранении, а не при чтении: ответы API
+    # до их появления ссылаются на исходную картинку.
+    if raw or update_fields is not None and field_name not in update_fields:
+        return
+    field_file = getattr(instance, field_name)
+    stored = getattr(instance, f'_stored_{field_name}', None)
+    if stored and stored != field_file.name:
+        images.schedule_delete_variants(stored)
+    if field_file and not default_storage.exists(
+        images.variant_name(field_file.name, 'thumb')
+    ):
+        images.schedule_variants(field_file.name)
+
+
+@receiver(pre_save, sender=CulinaryRecipe)
+def remember_recipe_image(instance, raw=False, update_fields=None, **kwargs):
+    _remember_image(instance, 'image', raw, update_fields)
+
+
+@receiver(post_save, sender=CulinaryRecipe)
+def update_recipe_image_variants(instance, raw=False, update_fields=None,
+                                 **kwargs):
+    _update_image_variants(instance, 'image', raw, update_fields)
+
+
+@receiver(post_delete, sender=CulinaryRecipe)
+def delete_recipe_image_variants(instance, **kwargs):
+    if instance.image:
+        images.schedule_delete_variants(instance.image.name)
+
+
+@receiver(pre_save, sender=User)
+def remember_avatar(instance, raw=False, update_fields=None, **kwargs):
+    _remember_image(instance, 'avatar', raw, update_fields)
+
+
+@receiver(post_save, sender=User)
+def update_avatar_variants(instance, raw=False, update_fields=None,
+                           **kwargs):
+    _update_image_variants(instance, 'avatar', raw, update_fields)
+
+
+@receiver(post_delete, sender=User)
+def delete_avatar_variants(instance, **kwargs):
+    if instance.avatar:
+        images.schedule_delete_variants(instance.avatar.name)
@@ -0,0 +1,772 @@
+import csv
+import io
+import json
+import os
+import shutil
+import tempfile
+from datetime import timedelta
+from unittest import mock, skipUnless
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection, transaction
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from api_recipes.tests import (
+    TEST_CACHES,
+    create_feed,
+    create_recipe,
+    create_user
+)
+from . import (
+    recipe_index,
+    relations,
+    search,
+    shopping_lists,
+    trending,
+    versions
+)
+from .counters import repair_counters
+from .management.commands import load_ingredients
+from .models import (
+    CulinaryRecipe,
+    Ingredient,
+    RecipeActivity,
+    RecipeIngredient,
+    Subscription,
+    User,
+    UserFavoriteRecipe,
+    UserShoppingCart
+)
+from .query_plans import check_plans
+
+
+@override_settings(CACHES=TEST_CACHES)
+class QueryPlanTests(TestCase):
+    """
+    Каждая форма запроса API из query_plans.SHAPES читает таблицы по
+    индексу и не сортирует без индекса. Проверяется на той БД, на
+    которой запущены тесты: SQLite (IS_SQLITE3=True) или PostgreSQL.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.reader = create_user('reader')
+        create_feed(cls.reader)
+
+    def test_plans(self):
+        for name, plan, problems in check_plans(self.reader):
+            with self.subTest(shape=name):
+                self.assertEqual(problems, [], f'\n{plan}')
+
+
+@override_settings(CACHES=TEST_CACHES)
+class DataVersionTests(TestCase):
+    """Номера версий выдаёт БД, кэш только публикует их."""
+
+    def setUp(self):
+        cache.clear()
+
+    def test_allocate(self):
+        numbers = [
+            versions.allocate_version(versions.RECIPES) for _ in range(5)
+        ]
+        self.assertEqual(numbers, sorted(set(numbers)))
+        # Без публикации читатели видят прежнюю версию.
+        cache.set(versions._key(versions.RECIPES), numbers[0], None)
+        self.assertEqual(versions.get_version(versions.RECIPES), numbers[0])
+
+    def test_publish_does_not_regress(self):
+        old = versions.allocate_version(versions.USERS)
+        new = versions.bump_version(versions.USERS)
+        # Процесс, получивший номер раньше, публикует его последним.
+        self.assertEqual(versions.publish_version(versions.USERS, old), new)
+        self.assertEqual(versions.get_version(versions.USERS), new)
+
+    def test_rolled_back_bump(self):
+        with transaction.atomic():
+            rolled_back = versions.bump_version(versions.INGREDIENTS)
+            transaction.set_rollback(True)
+        # Номер остался в кэше, хотя счётчик в БД откатился.
+        self.assertEqual(
+            versions.get_version(versions.INGREDIENTS), rolled_back
+        )
+        self.assertGreater(
+            versions.bump_version(versions.INGREDIENTS), rolled_back
+        )
+
+    def test_evicted_version(self):
+        version = versions.bump_version(versions.INGREDIENTS)
+        cache.clear()
+        self.assertEqual(versions.get_version(versions.INGREDIENTS), version)
+
+    def test_new_namespace(self):
+        version = versions.get_version('test')
+        self.assertEqual(versions.get_version('test'), version)
+        self.assertGreater(versions.bump_version('test'), version)
+
+
+@override_settings(CACHES=TEST_CACHES)
+class RecipeIndexTests(TestCase):
+    """Без записи журнала индекс перестраивается целиком."""
+
+    def setUp(self):
+        cache.clear()
+        recipe_index._index = None
+        self.addCleanup(setattr, recipe_index, '_index', None)
+
+    def test_journal_gap(self):
+        salt = Ingredient.objects.create(name='Соль', measurement_unit='г')
+        recipe = create_recipe(create_user('author'), 'Суп', [salt])
+        self.assertEqual(
+            recipe_index.get_index().match([salt.id]), [recipe.id]
+        )
+        other = create_recipe(create_user('other'), 'Каша')
+        RecipeIngredient.objects.create(
+            recipe=other, ingredient=salt, amount=1
+        )
+        # Изменение без записи журнала: вытеснена или не успела
+        # появиться.
+        versions.bump_version(versions.RECIPE_INGREDIENTS)
+        self.assertEqual(
+            recipe_index.get_index().match([salt.id]), [other.id, recipe.id]
+        )
+
+
+@override_settings(CACHES=TEST_CACHES)
+class CounterTests(TestCase):
+    """Счётчики совпадают с данными при любом пути изменения."""
+
+    def setUp(self):
+        cache.clear()
+        self.reader = create_user('reader')
+        self.author = create_user('author')
+        salt = Ingredient.objects.create(name='Соль', measurement_unit='г')
+        self.recipe = create_recipe(self.author, 'Суп')
+        RecipeIngredient.objects.create(
+            recipe=self.recipe, ingredient=salt, amount=1
+        )
+
+    def assertCounters(self, recipes_count, subscribers_count, favorites_count,
+                       cart_count):
+        self.assertEqual(
+            [value for value in repair_counters(fix=False).values() if value],
+            []
+        )
+        author = User.objects.get(pk=self.author.pk)
+        recipe = CulinaryRecipe.objects.get(pk=self.recipe.pk)
+        self.assertEqual(
+            (
+                author.recipes_count,
+                author.subscribers_count,
+                recipe.favorites_count,
+                recipe.cart_count,
+                recipe.ingredients_count
+            ),
+            (
+                recipes_count,
+                subscribers_count,
+                favorites_count,
+                cart_count,
+                1
+            )
+        )
+
+    def test_orm(self):
+        favorite = UserFavoriteRecipe.objects.create(
+            user=self.reader, recipe=self.recipe
+        )
+        UserShoppingCart.objects.create(user=self.reader, recipe=self.recipe)
+        Subscription.objects.create(
+            user=self.reader, subscribed_to=self.author
+        )
+        self.assertCounters(1, 1, 1, 1)
+        favorite.delete()
+        UserShoppingCart.objects.filter(user=self.reader).delete()
+        self.assertCounters(1, 1, 0, 0)
+
+    def test_relations(self):
+        for kind, target in (
+            ('favorites', self.recipe.pk),
+            ('shopping_cart', self.recipe.pk),
+            ('subscriptions', self.author.pk)
+        ):
+            relations.add(kind, self.reader.pk, [target])
+        self.assertCounters(1, 1, 1, 1)
+        for kind, target in (
+            ('favorites', self.recipe.pk),
+            ('shopping_cart', self.recipe.pk),
+            ('subscriptions', self.author.pk)
+        ):
+            relations.remove(kind, self.reader.pk, [target])
+        self.assertCounters(1, 0, 0, 0)
+
+    def test_admin(self):
+        admin = User.objects.create_superuser(
+            email='admin@example.com',
+            username='admin',
+            first_name='admin',
+            last_name='admin',
+            password='password'
+        )
+        self.client.force_login(admin)
+        response = self.client.post('/admin/core/userfavoriterecipe/add/', {
+            'user': self.reader.pk, 'recipe': self.recipe.pk
+        })
+        self.assertEqual(response.status_code, 302)
+        self.assertCounters(1, 0, 1, 0)
+        favorite = UserFavoriteRecipe.objects.get()
+        response = self.client.post(
+            f'/admin/core/userfavoriterecipe/{favorite.pk}/delete/',
+            {'post': 'yes'}
+        )
+        self.assertEqual(response.status_code, 302)
+        self.assertCounters(1, 0, 0, 0)
+
+    def test_save_keeps_counters(self):
+        recipe = CulinaryRecipe.objects.get(pk=self.recipe.pk)
+        author = User.objects.get(pk=self.author.pk)
+        # Счётчики меняются в БД, пока объекты уже прочитаны.
+        UserFavoriteRecipe.objects.create(
+            user=self.reader, recipe=self.recipe
+        )
+        Subscription.objects.create(
+            user=self.reader, subscribed_to=self.author
+        )
+        recipe.name = 'Борщ'
+        recipe.save()
+        author.first_name = 'Автор'
+        author.save()
+        self.assertCounters(1, 1, 1, 0)
+        self.assertEqual(CulinaryRecipe.objects.get().name, 'Борщ')
+        self.assertEqual(User.objects.get(pk=author.pk).first_name, 'Автор')
+
+    def test_api_update_ingredients(self):
+        products = [
+            Ingredient.objects.create(name=name, measurement_unit='г')
+            for name in ('Перец', 'Лук')
+        ]
+        client = APIClient()
+        client.force_authenticate(self.author)
+        response = client.patch(
+            f'/api/recipes/{self.recipe.pk}/',
+            {
+                'ingredients': [
+                    {'id': product.id, 'amount': 5} for product in products
+                ]
+            },
+            format='json'
+        )
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(
+            CulinaryRecipe.objects.get(pk=self.recipe.pk).ingredients_count, 2
+        )
+        self.assertEqual(
+            [value for value in repair_counters(fix=False).values() if value],
+            []
+        )
+
+    def test_cascade_user_delete(self):
+        UserFavoriteRecipe.objects.create(
+            user=self.reader, recipe=self.recipe
+        )
+        UserShoppingCart.objects.create(user=self.reader, recipe=self.recipe)
+        Subscription.objects.create(
+            user=self.reader, subscribed_to=self.author
+        )
+        create_recipe(self.reader, 'Каша')
+        self.reader.delete()
+        self.assertCounters(1, 0, 0, 0)
+
+
+@override_settings(CACHES=TEST_CACHES)
+class ShoppingListTests(TestCase):
+    """Сводный список покупок следует за корзиной при любом пути."""
+
+    def setUp(self):
+        cache.clear()
+        self.reader = create_user('reader')
+        self.author = create_user('author')
+        self.salt, self.pepper, self.onion = (
+            Ingredient.objects.create(name=name, measurement_unit='г')
+            for name in ('Соль', 'Перец', 'Лук')
+        )
+        self.recipe = create_recipe(self.author, 'Суп')
+        self.salt_row = RecipeIngredient.objects.create(
+            recipe=self.recipe, ingredient=self.salt, amount=10
+        )
+        RecipeIngredient.objects.create(
+            recipe=self.recipe, ingredient=self.pepper, amount=5
+        )
+
+    def assertShoppingList(self, expected, user=None):
+        self.assertEqual(
+            shopping_lists.repair_shopping_lists(fix=False),
+            {'rows': 0, 'users': 0}
+        )
+        self.assertEqual(
+            shopping_lists.get_amounts(user or self.reader),
+            {
+                ingredient.id: amount
+                for ingredient, amount in expected.items()
+            }
+        )
+
+    def admin_client(self):
+        admin = User.objects.create_superuser(
+            email='admin@example.com',
+            username='admin',
+            first_name='admin',
+            last_name='admin',
+            password='password'
+        )
+        self.client.force_login(admin)
+        return self.client
+
+    def test_cart_orm(self):
+        cart = UserShoppingCart.objects.create(
+            user=self.reader, recipe=self.recipe
+        )
+        self.assertShoppingList({self.salt: 10, self.pepper: 5})
+        cart.delete()
+        self.assertShoppingList({})
+
+    def test_cart_relations(self):
+        relations.add('shopping_cart', self.reader.id, [self.recipe.id])
+        self.assertShoppingList({self.salt: 10, self.pepper: 5})
+        relations.remove('shopping_cart', self.reader.id, [self.recipe.id])
+        self.assertShoppingList({})
+
+    def test_cart_admin(self):
+        client = self.admin_client()
+        response = client.post('/admin/core/usershoppingcart/add/', {
+            'user': self.reader.pk, 'recipe': self.recipe.pk
+        })
+        self.assertEqual(response.status_code, 302)
+        self.assertShoppingList({self.salt: 10, self.pepper: 5})
+        cart = UserShoppingCart.objects.get()
+        response = client.post(
+            f'/admin/core/usershoppingcart/{cart.pk}/delete/',
+            {'post': 'yes'}
+        )
+        self.assertEqual(response.status_code, 302)
+        self.assertShoppingList({})
+
+    def test_recipe_ingredient_edit(self):
+        relations.add('shopping_cart', self.reader.id, [self.recipe.id])
+        response = self.admin_client().post(
+            f'/admin/core/recipeingredient/{self.salt_row.pk}/change/',
+            {
+                'recipe': self.recipe.pk,
+                'ingredient': self.onion.pk,
+                'amount': 3
+            }
+        )
+        self.assertEqual(response.status_code, 302)
+        self.assertShoppingList({self.onion: 3, self.pepper: 5})
+        self.salt_row.refresh_from_db()
+        self.salt_row.amount = 7
+        self.salt_row.save()
+        self.assertShoppingList({self.onion: 7, self.pepper: 5})
+        RecipeIngredient.objects.create(
+            recipe=self.recipe, ingredient=self.salt, amount=1
+        )
+        self.assertShoppingList({self.onion: 7, self.pepper: 5, self.salt: 1})
+        self.salt_row.delete()
+        self.assertShoppingList({self.pepper: 5, self.salt: 1})
+
+    def test_api_update(self):
+        relations.add('shopping_cart', self.reader.id, [self.recipe.id])
+        client = APIClient()
+        client.force_authenticate(self.author)
+        response = client.patch(
+            f'/api/recipes/{self.recipe.pk}/',
+            {
+                'ingredients': [
+                    {'id': self.pepper.id, 'amount': 8},
+                    {'id': self.onion.id, 'amount': 2}
+                ]
+            },
+            format='json'
+        )
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertShoppingList({self.pepper: 8, self.onion: 2})
+
+    def test_recipe_delete(self):
+        other = create_recipe(self.author, 'Каша')
+        RecipeIngredient.objects.create(
+            recipe=other, ingredient=self.salt, amount=2
+        )
+        second = create_user('second')
+        for user in (self.reader, second):
+            relations.add('shopping_cart', user.id, [self.recipe.id])
+        relations.add('shopping_cart', self.reader.id, [other.id])
+        self.recipe.delete()
+        self.assertShoppingList({self.salt: 2})
+        self.assertShoppingList({}, user=second)
+
+    def test_repair(self):
+        relations.add('shopping_cart', self.reader.id, [self.recipe.id])
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'UPDATE core_shoppinglistitem SET amount = 1 '
+                'WHERE ingredient_id = %s',
+                [self.salt.id]
+            )
+            cursor.execute(
+                'DELETE FROM core_shoppinglistitem WHERE ingredient_id = %s',
+                [self.pepper.id]
+            )
+        self.assertEqual(
+            shopping_lists.repair_shopping_lists(),
+            {'rows': 2, 'users': 1}
+        )
+        self.assertShoppingList({self.salt: 10, self.pepper: 5})
+
+
+@override_settings(CACHES=TEST_CACHES)
+class SearchTests(TestCase):
+    """Поисковый индекс следует за рецептами и ингредиентами."""
+
+    def setUp(self):
+        cache.clear()
+        self.author = create_user('author')
+        self.other = create_user('other')
+        self.soup_mix = Ingredient.objects.create(
+            name='Суп быстрого приготовления', measurement_unit='г'
+        )
+        self.by_name = CulinaryRecipe.objects.create(
+            author=self.author, name='Томатный суп', text='Варить',
+            cooking_time=10
+        )
+        self.by_ingredient = CulinaryRecipe.objects.create(
+            author=self.author, name='Обед', text='Варить', cooking_time=10
+        )
+        RecipeIngredient.objects.create(
+            recipe=self.by_ingredient, ingredient=self.soup_mix, amount=1
+        )
+        self.by_text = CulinaryRecipe.objects.create(
+            author=self.other, name='Ужин', text='Подать суп',
+            cooking_time=10
+        )
+
+    def test_ranking(self):
+        self.assertEqual(
+            search.rank_recipes('суп'),
+            [self.by_name.pk, self.by_ingredient.pk, self.by_text.pk]
+        )
+
+    def test_recipe_edit(self):
+        self.by_text.text = 'Подать горячим'
+        self.by_text.save()
+        self.assertNotIn(self.by_text.pk, search.rank_recipes('суп'))
+        self.assertEqual(
+            search.rank_recipes('горячим'), [self.by_text.pk]
+        )
+
+    def test_ingredient_edit(self):
+        RecipeIngredient.objects.filter(recipe=self.by_ingredient).delete()
+        self.assertNotIn(self.by_ingredient.pk, search.rank_recipes('суп'))
+        RecipeIngredient.objects.create(
+            recipe=self.by_ingredient, ingredient=self.soup_mix, amount=1
+        )
+        self.assertIn(self.by_ingredient.pk, search.rank_recipes('суп'))
+
+    def test_ingredient_rename(self):
+        self.soup_mix.name = 'Лапша быстрого приготовления'
+        self.soup_mix.save()
+        self.assertNotIn(self.by_ingredient.pk, search.rank_recipes('суп'))
+        self.assertEqual(
+            search.rank_recipes('лапша'), [self.by_ingredient.pk]
+        )
+
+    def test_delete(self):
+        self.by_name.delete()
+        self.assertEqual(
+            search.rank_recipes('суп'),
+            [self.by_ingredient.pk, self.by_text.pk]
+        )
+
+    def test_rebuild(self):
+        search.rebuild_index()
+        self.assertEqual(len(search.rank_recipes('суп')), 3)
+
+    def test_api_filters(self):
+        response = APIClient().get(
+            '/api/recipes/', {'search': 'суп', 'author': self.author.pk}
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [recipe['id'] for recipe in response.data['results']],
+            [self.by_name.pk, self.by_ingredient.pk]
+        )
+
+    def test_cache_key(self):
+        versions.get_version(versions.RECIPES)
+        with self.assertNumQueries(1):
+            ranked = search.search_recipes('  Томатный   СУП ')
+        self.assertEqual(ranked, [self.by_name.pk])
+        with self.assertNumQueries(0):
+            self.assertEqual(search.search_recipes('томатный суп'), ranked)
+        self.assertEqual(search.search_recipes('   '), [])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.by_name.name = 'Томатный суп с гренками'
+            self.by_name.save()
+        versions.get_version(versions.RECIPES)
+        with self.assertNumQueries(1):
+            self.assertEqual(
+                search.search_recipes('томатный суп'), [self.by_name.pk]
+            )
+
+    @skipUnless(connection.vendor == 'sqlite', 'FTS5 используется на SQLite')
+    def test_sqlite_fallback(self):
+        # Префиксный поиск заменяет морфологию: «томатн» находит
+        # «Томатный», однобуквенные слова ищутся целиком.
+        self.assertEqual(search.rank_recipes('томатн'), [self.by_name.pk])
+        self.assertEqual(search.rank_recipes('с'), [])
+        self.assertEqual(search.rank_recipes('"*:()'), [])
+        with connection.cursor() as cursor:
+            cursor.execute(f'SELECT rowid FROM {search.FTS_TABLE}')
+            self.assertEqual(
+                sorted(row[0] for row in cursor.fetchall()),
+                sorted(CulinaryRecipe.objects.values_list('id', flat=True))
+            )
+
+
+@override_settings(CACHES=TEST_CACHES)
+class TrendingTests(TestCase):
+    """trending_score равен сумме активности за окно и не уходит в минус."""
+
+    def setUp(self):
+        cache.clear()
+        self.reader = create_user('reader')
+        self.recipe = create_recipe(create_user('author'), 'Суп')
+
+    def assertScore(self, expected):
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.trending_score, expected)
+        self.assertFalse(
+            RecipeActivity.objects.filter(favorites__lt=0).exists()
+        )
+        self.assertEqual(
+            CulinaryRecipe.objects.filter(pk=self.recipe.pk).annotate(
+                actual=trending.window_score()
+            ).get().actual,
+            expected
+        )
+
+    def add_favorite(self, ago):
+        return UserFavoriteRecipe.objects.create(
+            user=self.reader, recipe=self.recipe,
+            created=timezone.now() - ago
+        )
+
+    def test_relations(self):
+        relations.add('favorites', self.reader.pk, [self.recipe.pk])
+        self.assertScore(1)
+        relations.remove('favorites', self.reader.pk, [self.recipe.pk])
+        self.assertScore(0)
+
+    def test_batch(self):
+        # Интервал одного рецепта уже есть, остальные создаются, число
+        # запросов от размера пачки не зависит.
+        recipes = [self.recipe] + [
+            create_recipe(self.recipe.author, f'Рецепт {number}')
+            for number in range(4)
+        ]
+        relations.add('favorites', self.reader.pk, [self.recipe.pk])
+        queries = []
+        for user, batch in (
+            (create_user('first'), recipes[:2]),
+            (create_user('second'), recipes),
+        ):
+            with CaptureQueriesContext(connection) as context:
+                relations.add(
+                    'favorites', user.pk, [recipe.pk for recipe in batch]
+                )
+            queries.append(len(context))
+        self.assertEqual(queries[0], queries[1])
+        self.assertEqual(
+            dict(RecipeActivity.objects.values_list('recipe_id', 'favorites')),
+            {
+                recipe.pk: count
+                for recipe, count in zip(recipes, (3, 2, 1, 1, 1))
+            }
+        )
+        self.assertScore(3)
+
+    def test_orm(self):
+        cart = UserShoppingCart.objects.create(
+            user=self.reader, recipe=self.recipe
+        )
+        self.assertEqual(RecipeActivity.objects.get().carts, 1)
+        self.assertScore(1)
+        cart.delete()
+        self.assertEqual(RecipeActivity.objects.get().carts, 0)
+        self.assertScore(0)
+
+    def test_removal_in_later_hour(self):
+        # Удаление вычитается из часа добавления, а не из текущего.
+        self.add_favorite(timedelta(hours=3))
+        relations.remove('favorites', self.reader.pk, [self.recipe.pk])
+        self.assertEqual(
+            list(RecipeActivity.objects.values_list('favorites', flat=True)),
+            [0]
+        )
+        self.assertScore(0)
+
+    def test_removal_after_compaction(self):
+        self.add_favorite(timedelta(days=2))
+        trending.compact_activity()
+        bucket = RecipeActivity.objects.get()
+        self.assertEqual(bucket.hour, trending.start_of_day(bucket.hour))
+        self.assertScore(1)
+        UserFavoriteRecipe.objects.get().delete()
+        self.assertScore(0)
+
+    def test_removal_after_expiry(self):
+        self.add_favorite(timedelta(days=10))
+        self.assertEqual(
+            trending.compact_activity(),
+            {'expired': 1, 'merged': 0, 'rescored': 1}
+        )
+        self.assertScore(0)
+        relations.remove('favorites', self.reader.pk, [self.recipe.pk])
+        self.assertScore(0)
+
+    def test_removal_without_activity(self):
+        # Связь без учтённого добавления (до появления created).
+        UserFavoriteRecipe.objects.bulk_create([
+            UserFavoriteRecipe(user=self.reader, recipe=self.recipe)
+        ])
+        repair_counters()
+        relations.remove('favorites', self.reader.pk, [self.recipe.pk])
+        self.assertScore(0)
+
+    def test_window(self):
+        start = trending.window_start()
+        self.assertEqual(start, trending.start_of_day(start))
+        RecipeActivity.objects.bulk_create([
+            RecipeActivity(recipe=self.recipe, hour=hour, favorites=1)
+            for hour in (
+                start - timedelta(hours=1),
+                start,
+                start + timedelta(hours=5),
+                trending.current_hour() - timedelta(days=3),
+                trending.current_hour() - timedelta(days=3, hours=1),
+                trending.current_hour(),
+            )
+        ])
+        report = trending.compact_activity()
+        self.assertEqual(report['expired'], 1)
+        self.assertEqual(report['rescored'], 1)
+        self.assertScore(5)
+        # Свёрнутые интервалы лежат на границах суток и не меняют оценку.
+        for hour in RecipeActivity.objects.filter(
+            hour__lt=trending.current_hour() - timedelta(days=1)
+        ).values_list('hour', flat=True):
+            self.assertEqual(hour, trending.start_of_day(hour))
+        self.assertEqual(
+            trending.compact_activity(),
+            {'expired': 0, 'merged': 0, 'rescored': 0}
+        )
+        self.assertScore(5)
+
+
+@override_settings(CACHES=TEST_CACHES)
+class LoadIngredientsTests(TestCase):
+    ROWS = [
+        {'name': 'Соль', 'measurement_unit': 'г'},
+        {'name': 'Соль', 'measurement_unit': 'кг'},
+        {'name': ' Соль ', 'measurement_unit': 'г'},
+        {'name': 'Мука, пшеничная', 'measurement_unit': 'г'},
+        {'name': '', 'measurement_unit': 'г'},
+        {'name': 'Я' * 201, 'measurement_unit': 'г'},
+        {'name': 'Вода'},
+        ['Сахар', 'г'],
+    ]
+
+    def setUp(self):
+        cache.clear()
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+
+    def write(self, filename, content):
+        path = os.path.join(self.directory, filename)
+        with open(path, 'w', encoding='utf-8', newline='') as file:
+            file.write(content)
+        return path
+
+    def load(self, path, *args):
+        stdout = io.StringIO()
+        call_command('load_ingredients', path, *args, stdout=stdout)
+        return stdout.getvalue()
+
+    def assertLoaded(self, path, *args):
+        version = versions.get_version(versions.INGREDIENTS)
+        output = self.load(path, *args)
+        self.assertIn('добавлено 3', output)
+        self.assertIn('отклонено 4', output)
+        self.assertEqual(
+            set(Ingredient.objects.values_list('name', 'measurement_unit')),
+            {('Соль', 'г'), ('Соль', 'кг'), ('Мука, пшеничная', 'г')}
+        )
+        self.assertNotEqual(
+            versions.get_version(versions.INGREDIENTS), version
+        )
+        # Повторная загрузка ничего не добавляет и не меняет версию.
+        version = versions.get_version(versions.INGREDIENTS)
+        self.assertIn('добавлено 0', self.load(path, *args))
+        self.assertEqual(Ingredient.objects.count(), 3)
+        self.assertEqual(versions.get_version(versions.INGREDIENTS), version)
+
+    def test_csv(self):
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(['name', 'measurement_unit'])
+        for row in self.ROWS[:-1]:
+            writer.writerow(row.values())
+        writer.writerow([])
+        self.assertLoaded(
+            self.write('ingredients.csv', buffer.getvalue()),
+            '--batch-size', '2'
+        )
+
+    def test_json(self):
+        # Маленький буфер: элементы массива разрезаются между чтениями.
+        with mock.patch.object(load_ingredients, 'CHUNK_SIZE', 7):
+            self.assertLoaded(self.write(
+                'ingredients.json',
+                json.dumps(self.ROWS, ensure_ascii=False, indent=2)
+            ))
+
+    def test_jsonl(self):
+        self.assertLoaded(self.write(
+            'ingredients.txt',
+            '\n'.join(
+                json.dumps(row, ensure_ascii=False) for row in self.ROWS
+            ) + '\n\n'
+        ), '--format', 'jsonl')
+
+    def test_errors(self):
+        Ingredient.objects.create(name='Соль', measurement_unit='г')
+        for filename, content, message in (
+            ('ingredients.txt', '', 'формат'),
+            ('ingredients.json', '{"name": "Сахар"}', 'JSON-массив'),
+            (
+                'ingredients.json',
+                '[{"name": "Сахар", "measurement_unit": "г"}, {"name"',
+                'обрезанный'
+            ),
+        ):
+            with self.subTest(content=content):
+                path = self.write(filename, content)
+                with self.assertRaisesMessage(CommandError, message):
+                    self.load(path)
+                self.assertEqual(Ingredient.objects.count(), 1)
+        with self.assertRaises(FileNotFoundError):
+            self.load(os.path.join(self.directory, 'missing.csv'))
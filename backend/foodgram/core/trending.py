@@ -0,0 +1,160 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce, TruncDay
+from django.utils import timezone
+
+from .counters import change_counters
+from .models import CulinaryRecipe, RecipeActivity
+
+FAVORITES = 'favorites'
+CARTS = 'carts'
+
+
+def current_hour():
+    return timezone.now().replace(minute=0, second=0, microsecond=0)
+
+
+def start_of_day(moment):
+    """Начало суток, как у TruncDay в текущем часовом поясе."""
+    return timezone.localtime(moment).replace(
+        hour=0, minute=0, second=0, microsecond=0
+    )
+
+
+def window_start():
+    """
+    Начало окна трендов.
+
+    Окно начинается с начала суток, поэтому суточный интервал после
+    свёртки целиком входит в окно или целиком выходит из него.
+    """
+    return start_of_day(
+        current_hour() - timedelta(days=settings.TRENDING_WINDOW_DAYS)
+    )
+
+
+def record_added(recipe_ids, field, added_at):
+    """
+    Учёт добавления рецептов в избранное или корзину в момент added_at.
+
+    Недостающие часовые интервалы создаются одной вставкой с пропуском
+    существующих, затем счётчики интервалов и trending_score меняются
+    через F() одним UPDATE на всю пачку, поэтому число запросов не
+    зависит от её размера, а параллельные запросы не теряют изменений.
+    Вызывается внутри транзакции, которая меняет избранное или корзину.
+    """
+    hour = added_at.replace(minute=0, second=0, microsecond=0)
+    RecipeActivity.objects.bulk_create(
+        (
+            RecipeActivity(recipe_id=recipe_id, hour=hour)
+            for recipe_id in recipe_ids
+        ),
+        ignore_conflicts=True
+    )
+    RecipeActivity.objects.filter(
+        hour=hour, recipe_id__in=recipe_ids
+    ).update(**{field: F(field) + 1})
+    change_counters(CulinaryRecipe, recipe_ids, 'trending_score', 1)
+
+
+def record_removed(removed, field):
+    """
+    Учёт удаления рецептов из избранного или корзины.
+
+    removed - пары (id рецепта, время добавления). Удаление вычитается
+    из интервала, где было учтено добавление: часового или суточного
+    после свёртки. Добавления до начала окна уже не входят в
+    trending_score, а счётчик интервала не опускается ниже нуля,
+    поэтому оценка не становится отрицательной.
+    """
+    start = window_start()
+    decremented = []
+    for recipe_id, added_at in removed:
+        if added_at < start:
+            continue
+        hour = added_at.replace(minute=0, second=0, microsecond=0)
+        bucket = (
+            RecipeActivity.objects
+            .filter(
+                recipe_id=recipe_id,
+                hour__in=[hour, start_of_day(added_at)],
+                **{f'{field}__gt': 0}
+            )
+            .order_by('-hour')
+            .values_list('pk', flat=True)
+            .first()
+        )
+        if bucket is not None and RecipeActivity.objects.filter(
+            pk=bucket, **{f'{field}__gt': 0}
+        ).update(**{field: F(field) - 1}):
+            decremented.append(recipe_id)
+    if decremented:
+        CulinaryRecipe.objects.filter(
+            pk__in=decremented, trending_score__gt=0
+        ).update(trending_score=F('trending_score') - 1)
+
+
+def window_score():
+    """Подзапрос с суммой активности рецепта за окно трендов."""
+    return Coalesce(
+        Subquery(
+            RecipeActivity.objects
+            .filter(recipe=OuterRef('pk'), hour__gte=window_start())
+            .order_by()
+            .values('recipe')
+            .annotate(total=Sum(F('favorites') + F('carts')))
+            .values('total')
+        ),
+        0
+    )
+
+
+@transaction.atomic
+def compact_activity():
+    """
+    Свёртка таблицы активности и пересчёт trending_score.
+
+    Интервалы старше окна удаляются, часовые интервалы старше
+    TRENDING_HOURLY_BUCKETS_HOURS сворачиваются в один интервал
+    на сутки. trending_score обновляется только у рецептов,
+    где он разошёлся с суммой за окно.
+    """
+    start = window_start()
+    expired, _ = RecipeActivity.objects.filter(hour__lt=start).delete()
+    border = current_hour() - timedelta(
+        hours=settings.TRENDING_HOURLY_BUCKETS_HOURS
+    )
+    stale = RecipeActivity.objects.filter(hour__lt=border).exclude(
+        hour=TruncDay('hour')
+    )
+    days = list(
+        stale.annotate(day=TruncDay('hour'))
+        .values('recipe_id', 'day')
+        .annotate(favorites_sum=Sum('favorites'), carts_sum=Sum('carts'))
+        .order_by()
+    )
+    merged, _ = stale.delete()
+    for day in days:
+        bucket, created = RecipeActivity.objects.get_or_create(
+            recipe_id=day['recipe_id'],
+            hour=day['day'],
+            defaults={
+                'favorites': day['favorites_sum'],
+                'carts': day['carts_sum']
+            }
+        )
+        if not created:
+            RecipeActivity.objects.filter(pk=bucket.pk).update(
+                favorites=F('favorites') + day['favorites_sum'],
+                carts=F('carts') + day['carts_sum']
+            )
+    drifted = CulinaryRecipe.objects.annotate(
+        actual=window_score()
+    ).exclude(trending_score=F('actual'))
+    rescored = CulinaryRecipe.objects.filter(
+        pk__in=list(drifted.values_list('pk', flat=True))
+    ).update(trending_score=window_score())
+    return {'expired': expired, 'merged': merged, 'rescored': rescored}
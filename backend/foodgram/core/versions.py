@@ -0,0 +1,117 @@
+import time
+
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.db.models import F
+
+from .models import DataVersion
+
+INGREDIENTS = 'ingredients'
+RECIPES = 'recipes'
+RECIPE_INGREDIENTS = 'recipe_ingredients'
+RECIPE_IDS = 'recipe_ids'
+USERS = 'users'
+
+
+def _initial_version():
+    """Начальная версия, не совпадающая с ранее выданными."""
+    return int(time.time() * 1000)
+
+
+def _key(namespace):
+    return f'version:{namespace}'
+
+
+def _stored_version(namespace):
+    return DataVersion.objects.filter(namespace=namespace).values_list(
+        'version', flat=True
+    ).first()
+
+
+def _publish(namespace, version):
+    """
+    Запись версии в общий кэш.
+
+    Запись в кэш не атомарна: параллельный процесс может записать
+    меньшую версию поверх большей. Поэтому после записи версия сверяется
+    с БД, и последним в кэше остаётся наибольший выданный номер.
+    """
+    while True:
+        cache.set(_key(namespace), version, timeout=None)
+        stored = _stored_version(namespace)
+        if stored is None or stored <= version:
+            return version
+        version = stored
+
+
+def get_version(namespace):
+    """
+    Текущая версия данных пространства имён.
+
+    Читается из общего кэша; после вытеснения ключа - из БД.
+    """
+    version = cache.get(_key(namespace))
+    if version is None:
+        version = _stored_version(namespace)
+        if version is None:
+            version = allocate_version(namespace)
+        version = _publish(namespace, version)
+    return version
+
+
+def allocate_version(namespace):
+    """
+    Новый номер версии без публикации в кэше.
+
+    Номер выдаёт UPDATE строки пространства имён: строка блокируется до
+    конца транзакции, поэтому номера уникальны при любом бэкенде кэша.
+    Номер больше и опубликованного в кэше: при откате транзакции
+    счётчик в БД откатывается, а опубликованный в ней номер остаётся
+    в кэше вместе с построенными под ним данными. Выдать его повторно
+    значило бы отдавать эти данные как актуальные.
+    """
+    with transaction.atomic():
+        rows = DataVersion.objects.filter(namespace=namespace)
+        if not rows.update(version=F('version') + 1):
+            try:
+                with transaction.atomic():
+                    DataVersion.objects.create(
+                        namespace=namespace, version=_initial_version()
+                    )
+            except IntegrityError:
+                # Строку создал параллельный процесс.
+                return allocate_version(namespace)
+        version = _stored_version(namespace)
+        # Кэш читается под блокировкой строки: откаченная транзакция
+        # успела опубликовать свой номер до того, как сняла блокировку.
+        published = cache.get(_key(namespace))
+        if published is not None and published >= version:
+            version = published + 1
+            rows.update(version=version)
+        return version
+
+
+def publish_version(namespace, version):
+    """Публикация номера, выданного allocate_version."""
+    return _publish(namespace, version)
+
+
+def bump_version(namespace):
+    """
+    Инвалидация всех данных пространства имён во всех процессах.
+
+    Номер публикуется сразу. При изменении данных в транзакции нужен
+    bump_version_on_commit, иначе до фиксации другие процессы успеют
+    закэшировать под новым номером старые данные.
+    """
+    return publish_version(namespace, allocate_version(namespace))
+
+
+def bump_version_on_commit(namespace):
+    """
+    Инвалидация после фиксации текущей транзакции.
+
+    Если увеличить версию до фиксации, параллельный запрос может успеть
+    закэшировать старые данные уже под новой версией.
+    """
+    transaction.on_commit(lambda: bump_version(namespace))
@@ -32,6 +32,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'api.middleware.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -61,7 +62,44 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'foodgram.wsgi.application'
 
-if os.getenv('IS_SQLITE3', '0') == 1:
+# wsgi или asgi: под ASGI часть представлений на чтение асинхронные,
+# см. api/async_views.py.
+SERVER_MODE = os.getenv('SERVER_MODE', 'wsgi')
+ASYNC_VIEW_THREADS = int(os.getenv('ASYNC_VIEW_THREADS', 8))
+
+GUNICORN_WORKER_CLASS = os.getenv(
+    'GUNICORN_WORKER_CLASS',
+    'uvicorn.workers.UvicornWorker' if SERVER_MODE == 'asgi' else 'gthread'
+)
+GUNICORN_WORKERS = int(
+    os.getenv('GUNICORN_WORKERS', 2 * (os.cpu_count() or 1) + 1)
+)
+GUNICORN_THREADS = int(os.getenv('GUNICORN_THREADS', 4))
+GUNICORN_WORKER_CONNECTIONS = int(
+    os.getenv('GUNICORN_WORKER_CONNECTIONS', 100)
+)
+
+DB_CONN_MAX_AGE = (
+    None if os.getenv('DB_CONN_MAX_AGE') == 'None'
+    else int(os.getenv('DB_CONN_MAX_AGE', 60))
+)
+DB_CONN_HEALTH_CHECKS = os.getenv('DB_CONN_HEALTH_CHECKS', 'True') == 'True'
+# Под gevent каждый гринлет открывает своё соединение, без пула они
+# остаются открытыми после завершения гринлетов.
+DB_POOL = os.getenv(
+    'DB_POOL', str(GUNICORN_WORKER_CLASS == 'gevent')
+) == 'True'
+if GUNICORN_WORKER_CLASS == 'gevent':
+    DB_POOL_MAX_SIZE = GUNICORN_WORKER_CONNECTIONS
+elif SERVER_MODE == 'asgi':
+    # Пул асинхронных представлений и поток синхронного кода Django.
+    DB_POOL_MAX_SIZE = ASYNC_VIEW_THREADS + 1
+else:
+    DB_POOL_MAX_SIZE = GUNICORN_THREADS
+DB_POOL_MAX_SIZE = int(os.getenv('DB_POOL_MAX_SIZE', DB_POOL_MAX_SIZE))
+DB_POOL_TIMEOUT = int(os.getenv('DB_POOL_TIMEOUT', 10))
+
+if os.getenv('IS_SQLITE3', 'False') in ('1', 'True'):
     DATABASES = {
         'default': {
             'ENGINE': 'django.db.backends.sqlite3',
@@ -71,12 +109,18 @@ if os.getenv('IS_SQLITE3', '0') == 1:
 else:
     DATABASES = {
         'default': {
-            'ENGINE': 'django.db.backends.postgresql',
+            'ENGINE': 'core.db',
             'NAME': os.getenv('POSTGRES_DB'),
             'USER': os.getenv('POSTGRES_USER'),
             'PASSWORD': os.getenv('POSTGRES_PASSWORD'),
             'HOST': 'foodgram-postgres',
             'PORT': '',
+            'CONN_MAX_AGE': 0 if DB_POOL else DB_CONN_MAX_AGE,
+            'CONN_HEALTH_CHECKS': DB_CONN_HEALTH_CHECKS,
+            'POOL': {
+                'MAX_SIZE': DB_POOL_MAX_SIZE,
+                'TIMEOUT': DB_POOL_TIMEOUT,
+            } if DB_POOL else None,
         }
     }
 
@@ -121,7 +165,7 @@ REST_FRAMEWORK = {
         'rest_framework.permissions.IsAuthenticated'
     ],
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication'
+        'api.authentication.CachedTokenAuthentication'
     ]
 }
 
@@ -143,14 +187,57 @@ DJOSER = {
 AUTH_USER_MODEL = 'core.User'
 
 AUTH_TOKEN_EXPIRES_AFTER = 60 * 60 * 24 * 7
+AUTH_TOKEN_LOCAL_SIZE = int(os.getenv('AUTH_TOKEN_LOCAL_SIZE', 10000))
+# Токены кэшируются в памяти каждого процесса. Выход, удаление токена,
+# смена пароля и блокировка пользователя действуют в обработавшем их
+# процессе сразу, а в остальных процессах - не позже, чем через
+# AUTH_TOKEN_LOCAL_TIMEOUT секунд. 0 отключает кэш в памяти процесса.
+AUTH_TOKEN_LOCAL_TIMEOUT = int(os.getenv('AUTH_TOKEN_LOCAL_TIMEOUT', 10))
 
 MAX_IMAGE_SIZE = 1024 * 1024 * 5
 ALLOWED_IMAGE_TYPES = ['image/jpeg', 'image/png']
+IMAGE_VARIANTS = {
+    'thumb': (160, 160),
+    'card': (480, 480),
+    'full': (1280, 1280),
+}
+IMAGE_VARIANT_QUALITY = 80
+IMAGE_WORKERS = int(os.getenv('IMAGE_WORKERS', 2))
 
 CACHES = {
     'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
-        'LOCATION': 'unique-snowflake',
+        'BACKEND': os.getenv(
+            'CACHE_BACKEND',
+            'django.core.cache.backends.filebased.FileBasedCache'
+        ),
+        'LOCATION': os.getenv('CACHE_LOCATION', str(BASE_DIR / 'cache')),
+        'OPTIONS': {
+            'MAX_ENTRIES': int(os.getenv('CACHE_MAX_ENTRIES', 10000)),
+        },
     }
 }
 CACHE_TIMEOUT = 60 * 15
+PAGINATION_COUNT_TIMEOUT = 60 * 5
+# Сколько секунд браузеры и nginx могут отдавать справочник ингредиентов
+# без перепроверки ETag.
+INGREDIENTS_MAX_AGE = int(os.getenv('INGREDIENTS_MAX_AGE', 60))
+
+INGREDIENT_AUTOCOMPLETE_LIMIT = 20
+
+RECIPE_SEARCH_LIMIT = 1000
+
+BULK_ACTION_LIMIT = 100
+
+QUERY_COUNT_HEADER = os.getenv('QUERY_COUNT_HEADER', 'False') == 'True'
+METRICS_ENABLED = os.getenv('METRICS_ENABLED', 'True') == 'True'
+METRICS_TOKEN = os.getenv('METRICS_TOKEN')
+METRICS_FLUSH_INTERVAL = 10
+METRICS_WORKER_TIMEOUT = 60 * 60 * 24
+SLOW_QUERY_MS = (
+    float(os.getenv('SLOW_QUERY_MS')) if os.getenv('SLOW_QUERY_MS') else None
+)
+
+TRENDING_WINDOW_DAYS = 7
+TRENDING_HOURLY_BUCKETS_HOURS = 24
+
+SHOPPING_LIST_PDF_FONT = os.getenv('SHOPPING_LIST_PDF_FONT')
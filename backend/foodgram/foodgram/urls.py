@@ -1,13 +1,23 @@
 from django.contrib import admin
 from django.urls import path, include
 
+from api.async_views import async_view
 from api.views import ShortRedirectView
 from foodgram import settings
 
+short_redirect = ShortRedirectView.as_view()
+legacy_short_redirect = ShortRedirectView.as_view(legacy=True)
+if settings.SERVER_MODE == 'asgi':
+    short_redirect = async_view(short_redirect)
+    legacy_short_redirect = async_view(legacy_short_redirect)
+
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/', include('api.urls')),
-    path('s/<str:short_link>', ShortRedirectView.as_view(), name='short-link')
+    path('r/<str:short_link>', short_redirect, name='short-link'),
+    path(
+        's/<str:short_link>', legacy_short_redirect, name='legacy-short-link'
+    )
 ]
 
 if settings.DEBUG:
@@ -0,0 +1,22 @@
+"""
+Настройки gunicorn, значения задаются переменными окружения в
+foodgram/settings.py: SERVER_MODE (wsgi или asgi), GUNICORN_WORKER_CLASS
+(gthread, gevent или uvicorn.workers.UvicornWorker для ASGI),
+GUNICORN_WORKERS, GUNICORN_THREADS, GUNICORN_WORKER_CONNECTIONS.
+"""
+
+from foodgram import settings
+
+wsgi_app = f'foodgram.{settings.SERVER_MODE}:application'
+bind = '0.0.0.0:8000'
+worker_class = settings.GUNICORN_WORKER_CLASS
+workers = settings.GUNICORN_WORKERS
+threads = settings.GUNICORN_THREADS
+worker_connections = settings.GUNICORN_WORKER_CONNECTIONS
+
+
+def post_fork(server, worker):
+    if worker_class == 'gevent':
+        # Без этого psycopg2 блокирует весь процесс на время запроса к БД.
+        from psycogreen.gevent import patch_psycopg
+        patch_psycopg()